@@ -0,0 +1,233 @@
+"""End-to-end Book benchmark against the local mock LLM server.
+
+Measures the overhead of the Book pipeline itself (prompt handling, structure
+parsing, markdown rendering, logging and the HTTP client) with the model
+replaced by ``mock_server.py``, which runs in a separate process so its CPU
+time is not counted. Results are written as JSON; pass ``--compare`` with an
+earlier result to flag regressions.
+
+    python benchmarks/bench_book.py --books 3 --chapters 5 --workers 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'src'))
+
+from book import Book  # noqa: E402
+from mock_server import canned_structure  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from ollama_client import OllamaClient  # noqa: E402
+from request_log import RequestLog  # noqa: E402
+
+# Metrics where a larger value is a regression, compared by --compare
+LOWER_IS_BETTER = ('latency_p50', 'latency_p95', 'latency_p99', 'cpu_ms_per_paragraph', 'peak_rss_mb', 'calls_per_paragraph')
+
+
+class LatencyRecorder:
+    """Request-log stand-in that keeps per-call durations and forwards to a real log."""
+
+    def __init__(self, inner: Optional[RequestLog] = None):
+        self.inner = inner
+        self.durations: List[float] = []
+
+    def log(self, prompt, response, **metadata) -> None:
+        self.durations.append(metadata.get('duration', 0.0))
+        if self.inner is not None:
+            self.inner.log(prompt, response, **metadata)
+
+    def close(self) -> None:
+        if self.inner is not None:
+            self.inner.close()
+
+
+def start_mock_server(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, 'mock_server.py'),
+        '--port', '0',
+        '--latency', str(args.latency),
+        '--tokens-per-second', str(args.tokens_per_second),
+        '--error-rate', str(args.error_rate),
+        '--paragraph-words', str(args.paragraph_words),
+        '--length-accuracy', str(args.length_accuracy),
+        '--prefill-tokens-per-second', str(args.prefill_tokens_per_second),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline().strip()
+    return process, line.rsplit(' ', 1)[-1]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_book(args: argparse.Namespace, base_url: str, recorder: LatencyRecorder, metrics: Metrics) -> int:
+    kwargs = dict(
+        chapters=args.chapters,
+        words_per_chapter=args.words,
+        category='Benchmark',
+        topic='Benchmarking the book pipeline',
+        language='English',
+        llm_backend=args.backend,
+        max_workers=args.workers,
+        paragraph_workers=args.paragraph_workers,
+        request_log=recorder,
+        metrics=metrics,
+        length_control=not args.no_length_control,
+        outline_format=args.outline_format,
+    )
+    if args.backend == 'ollama':
+        kwargs['ollama_client'] = OllamaClient(base_url, 'mock-model', pool_size=max(10, args.workers))
+    if args.stream:
+        kwargs['on_token'] = lambda step, token: None
+
+    book = Book(**kwargs)
+    book.get_title()
+    book.get_structure()
+    book.finish_base()
+    book.get_content()
+    book.to_markdown()
+    return book.calculate_max_status()
+
+
+def micro_benchmarks(chapters: int) -> Dict[str, float]:
+    """Time the pure-Python helpers on a large book, in milliseconds per call."""
+
+    structure = canned_structure(f'chapters: {chapters}; words_per_chapter: 2000', paragraphs_per_chapter=8)
+    started = time.perf_counter()
+    for _ in range(50):
+        parsed = Book.convert_structure(structure)
+    convert_ms = (time.perf_counter() - started) * 1000 / 50
+
+    book = Book.__new__(Book)
+    book.title = 'Benchmark'
+    book.chapters = parsed
+    book.partial_content = False
+    book.retain_content = True
+    book.writer = None
+    book.content = [['word ' * 250 for _ in chapter['paragraphs']] for chapter in parsed]
+    started = time.perf_counter()
+    for _ in range(20):
+        book.to_markdown()
+    markdown_ms = (time.perf_counter() - started) * 1000 / 20
+
+    return {'convert_structure_ms': round(convert_ms, 3), 'to_markdown_ms': round(markdown_ms, 3)}
+
+
+def compare(result: Dict, baseline_path: str, threshold: float) -> bool:
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)
+
+    ok = True
+    for name in LOWER_IS_BETTER:
+        old, new = baseline['metrics'].get(name), result['metrics'].get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        flag = 'REGRESSION' if change > threshold else 'ok'
+        ok = ok and flag == 'ok'
+        print(f'{name:>22}: {old:10.3f} -> {new:10.3f} ({change:+.1%}) {flag}')
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the Book pipeline against a mock LLM server.')
+    parser.add_argument('--backend', choices=('ollama', 'openai'), default='ollama')
+    parser.add_argument('--books', type=int, default=2)
+    parser.add_argument('--concurrent-books', type=int, default=1)
+    parser.add_argument('--chapters', type=int, default=4)
+    parser.add_argument('--words', type=int, default=1200)
+    parser.add_argument('--workers', type=int, default=1, help='chapter workers per book')
+    parser.add_argument('--paragraph-workers', type=int, default=1, help='paragraphs drafted at once per chapter')
+    parser.add_argument('--stream', action='store_true', help='request streamed responses')
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--tokens-per-second', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--paragraph-words', type=int, default=300)
+    parser.add_argument('--outline-format', choices=('json', 'schema', 'text'), default='json')
+    parser.add_argument('--length-accuracy', type=float, default=1.2, help='mock reply words per requested word')
+    parser.add_argument('--no-length-control', action='store_true', help='use the plain !c continuation loop')
+    parser.add_argument('--prefill-tokens-per-second', type=float, default=0.0, help='mock prompt evaluation speed')
+    parser.add_argument('--log-level', choices=('off', 'metadata', 'full'), default='off')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', metavar='BASELINE', help='earlier result to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed relative regression')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(BENCH_DIR, 'results'), exist_ok=True)
+    process, base_url = start_mock_server(args)
+    inner_log = None
+    if args.log_level != 'off':
+        inner_log = RequestLog(os.path.join(BENCH_DIR, 'results', 'bench-log.jsonl'), level=args.log_level)
+    recorder = LatencyRecorder(inner_log)
+    metrics = Metrics()
+
+    if args.backend == 'openai':
+        import openai  # type: ignore
+        openai.api_key = 'mock'
+        openai.api_base = f'{base_url}/v1'
+
+    try:
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrent_books) as executor:
+            paragraphs = sum(executor.map(lambda _: run_book(args, base_url, recorder, metrics), range(args.books)))
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+    finally:
+        recorder.close()
+        process.terminate()
+
+    durations = recorder.durations
+    result = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': vars(args),
+        'metrics': {
+            'books': args.books,
+            'paragraphs': paragraphs,
+            'calls': len(durations),
+            'calls_per_paragraph': round(metrics.progress()['calls_per_paragraph'], 3),
+            'prefill_seconds': round(metrics.progress()['prefill_seconds'], 3),
+            'elapsed_seconds': round(elapsed, 3),
+            'books_per_minute': round(args.books / elapsed * 60, 3),
+            'latency_mean': round(statistics.mean(durations), 4) if durations else 0.0,
+            'latency_p50': round(percentile(durations, 0.50), 4),
+            'latency_p95': round(percentile(durations, 0.95), 4),
+            'latency_p99': round(percentile(durations, 0.99), 4),
+            'cpu_ms_per_paragraph': round(cpu * 1000 / max(1, paragraphs), 3),
+            # ru_maxrss is reported in kilobytes on Linux
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            **micro_benchmarks(args.chapters * 10),
+        },
+    }
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f'{datetime.now():%Y%m%d-%H%M%S}.json')
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(result, file, indent=2)
+
+    print(json.dumps(result['metrics'], indent=2))
+    print(f'Results written to {output}')
+
+    if args.compare:
+        return 0 if compare(result, args.compare, args.threshold) else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
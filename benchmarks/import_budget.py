@@ -0,0 +1,76 @@
+"""Startup budget for the CLI: ``python src/run.py --help`` must stay fast.
+
+Runs ``--help`` several times in fresh interpreters and compares the best time,
+minus the cost of a bare interpreter, with the budget. It also fails when one of
+the modules that backends and exporters import on first use is loaded at
+startup. Exits non-zero when the budget is exceeded, so it can run in CI.
+
+    python benchmarks/import_budget.py --budget 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RUN_PY = os.path.join(os.path.dirname(BENCH_DIR), 'src', 'run.py')
+
+# Imported by providers and exporters when they are first used, never at startup
+LAZY_MODULES = ('openai', 'requests', 'aiohttp', 'tqdm', 'markdown', 'gtts', 'asyncio', 'ollama_client')
+
+_PROBE = """
+import contextlib, io, json, runpy, sys
+sys.argv = [{run_py!r}, '--help']
+sys.path.insert(0, {src!r})
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        runpy.run_path({run_py!r}, run_name='__main__')
+    except SystemExit:
+        pass
+print(json.dumps(sorted(name for name in {modules!r} if name in sys.modules)))
+"""
+
+
+def best_time(command: List[str], runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=0.25, help='allowed seconds on top of a bare interpreter')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    interpreter = best_time([sys.executable, '-c', 'pass'], args.runs)
+    cli = best_time([sys.executable, RUN_PY, '--help'], args.runs)
+    probe = _PROBE.format(run_py=RUN_PY, src=os.path.dirname(RUN_PY), modules=LAZY_MODULES)
+    loaded = json.loads(subprocess.run(
+        [sys.executable, '-c', probe], capture_output=True, text=True, check=True,
+    ).stdout)
+
+    startup = cli - interpreter
+    print(f'run.py --help: {cli:.3f}s, bare interpreter {interpreter:.3f}s, startup {startup:.3f}s '
+          f'(budget {args.budget:.3f}s)')
+    failed = False
+    if startup > args.budget:
+        print('FAIL: startup is over budget; run `python -X importtime src/run.py --help` to see why.')
+        failed = True
+    if loaded:
+        print(f'FAIL: imported at startup although only needed on first use: {", ".join(loaded)}')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
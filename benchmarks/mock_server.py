@@ -0,0 +1,306 @@
+"""Local stand-in for the Ollama and OpenAI HTTP APIs used by the benchmarks.
+
+Implements ``GET /api/tags``, ``POST /api/chat`` (streaming and not) and
+``POST /v1/chat/completions``. Latency, tokens per
+second and error rate are configurable, and replies are canned: a title, a
+structure table matching the requested book, a summary or a paragraph of
+filler text. With ``--prefill-tokens-per-second`` the Ollama endpoint also
+charges for prompt evaluation, skipping the prefix shared with one of the last
+few prompts like a server-side prompt cache would.
+
+Run standalone with ``python benchmarks/mock_server.py --port 11434``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterator, List, Optional
+
+_FILLER = (
+    'The morning light settled over the harbour as the crew prepared for another long day of work. '
+    'Nobody spoke much, but everyone understood what was at stake and what had to be done before nightfall. '
+)
+
+
+@dataclass
+class MockConfig:
+    model: str = 'mock-model'
+    latency: float = 0.05
+    tokens_per_second: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    paragraph_words: int = 120
+    # Words written per requested word when a paragraph command names a length; 0 ignores it
+    length_accuracy: float = 1.2
+    # Prompt evaluation speed; 0 makes prefill free
+    prefill_tokens_per_second: float = 0.0
+    seed: Optional[int] = None
+
+
+def _argument(arguments: str, name: str, default: int) -> int:
+    match = re.search(rf'{name}: (\d+)', arguments)
+    return int(match.group(1)) if match else default
+
+
+def canned_structure(arguments: str, paragraphs_per_chapter: int = 4, json_mode: bool = False) -> str:
+    chapters = _argument(arguments, 'chapters', 3)
+    words = _argument(arguments, 'words_per_chapter', 1200)
+    per_paragraph = max(1, words // paragraphs_per_chapter)
+    if json_mode:
+        return json.dumps({'chapters': [
+            {
+                'title': f'Opening moves {chapter}',
+                'paragraphs': [
+                    {'title': f'Scene {chapter}.{paragraph}', 'words': per_paragraph}
+                    for paragraph in range(1, paragraphs_per_chapter + 1)
+                ],
+            }
+            for chapter in range(1, chapters + 1)
+        ]})
+    lines = []
+    for chapter in range(1, chapters + 1):
+        lines.append(f'Chapter {chapter} ({paragraphs_per_chapter} paragraphs): Opening moves {chapter}')
+        for paragraph in range(1, paragraphs_per_chapter + 1):
+            lines.append(f'\tParagraph {paragraph} ({per_paragraph} words): Scene {chapter}.{paragraph}')
+    return '\n'.join(lines)
+
+
+def canned_reply(messages: List[Dict[str, str]], config: MockConfig, json_mode: bool = False) -> str:
+    system = messages[0]['content'] if messages else ''
+    user_messages = [message['content'] for message in messages if message['role'] == 'user']
+    if system.startswith('You are a title'):
+        return '"A Benchmark Title"'
+    if system.startswith('You are a book structure'):
+        return canned_structure(user_messages[-1] if user_messages else '', json_mode=json_mode)
+    if system.startswith('You are a summarizing'):
+        return 'A short summary of what happened in this paragraph.'
+
+    count = config.paragraph_words
+    targets = re.findall(r'\((\d+) (?:more )?words\)', user_messages[-1] if user_messages else '')
+    if targets and config.length_accuracy:
+        count = max(1, round(int(targets[-1]) * config.length_accuracy))
+    # Shuffled per prompt, so continuations are not dropped as repeats of the previous reply
+    words = _FILLER.split()
+    choose = random.Random(zlib.crc32(json.dumps(messages).encode('utf-8'))).choice
+    return ' '.join(choose(words) for _ in range(count))
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: 'MockServer'
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        if self.path == '/api/tags':
+            self._send_json(200, {'models': [{'name': self.server.config.model}]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        config = self.server.config
+        self.server.record_request()
+
+        time.sleep(config.latency)
+        if self.server.should_fail():
+            self._send_json(config.error_status, {'error': 'injected failure'}, {'Retry-After': '0'})
+            return
+
+        json_mode = bool(request.get('format') or request.get('response_format'))
+        messages = request.get('messages', [])
+        reply = canned_reply(messages, config, json_mode)
+        if self.path == '/api/chat':
+            self._ollama_chat(request, messages, reply)
+        elif self.path == '/v1/chat/completions':
+            self._openai_chat(request, reply)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _token_delay(self) -> float:
+        tokens_per_second = self.server.config.tokens_per_second
+        return 1 / tokens_per_second if tokens_per_second else 0.0
+
+    @staticmethod
+    def _tokens(reply: str, limit: Optional[int]) -> List[str]:
+        # One word per token keeps the arithmetic simple; num_predict/max_tokens truncate like a real server
+        tokens = [token + ' ' for token in reply.split(' ')]
+        return tokens[:limit] if limit else tokens
+
+    def _stream(self, chunks: List[bytes]) -> None:
+        try:
+            for chunk in chunks:
+                self._send_chunk(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. because it had enough words
+            self.close_connection = True
+
+    def _ollama_chat(self, request: Dict, messages: List[Dict[str, str]], reply: str) -> None:
+        config = self.server.config
+        tokens = self._tokens(reply, (request.get('options') or {}).get('num_predict'))
+        text = ''.join(f"{message['role']}: {message['content']}\n" for message in messages)
+        prompt_tokens = self.server.uncached_tokens(text)
+        self.server.remember(f"{text}assistant: {''.join(tokens)}")
+        prefill = prompt_tokens / config.prefill_tokens_per_second if config.prefill_tokens_per_second else 0.0
+        time.sleep(prefill)
+        stats = {
+            'done': True,
+            'prompt_eval_count': prompt_tokens,
+            'eval_count': len(tokens),
+            'prompt_eval_duration': int((config.latency + prefill) * 1e9),
+            'eval_duration': int(len(tokens) * self._token_delay() * 1e9),
+            'load_duration': 0,
+        }
+        if not request.get('stream'):
+            time.sleep(len(tokens) * self._token_delay())
+            content = ''.join(tokens).rstrip()
+            self._send_json(200, {'message': {'role': 'assistant', 'content': content}, **stats})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._stream(self._ollama_chunks(tokens, stats))
+
+    def _ollama_chunks(self, tokens: List[str], stats: Dict) -> Iterator[bytes]:
+        def chunk(content: str) -> Dict:
+            return {'message': {'role': 'assistant', 'content': content}}
+
+        for token in tokens:
+            time.sleep(self._token_delay())
+            yield json.dumps({**chunk(token), 'done': False}).encode('utf-8') + b'\n'
+        yield json.dumps({**chunk(''), **stats}).encode('utf-8') + b'\n'
+        yield b''
+
+    def _openai_chat(self, request: Dict, reply: str) -> None:
+        tokens = self._tokens(reply, request.get('max_tokens'))
+        if not request.get('stream'):
+            # n samples are generated side by side, so they take as long as one
+            samples = max(1, int(request.get('n') or 1))
+            time.sleep(len(tokens) * self._token_delay())
+            content = ''.join(tokens).rstrip()
+            self._send_json(200, {
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion',
+                'model': request.get('model', self.server.config.model),
+                'choices': [
+                    {'index': index, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}
+                    for index in range(samples)
+                ],
+                'usage': {
+                    'prompt_tokens': 0, 'completion_tokens': len(tokens) * samples,
+                    'total_tokens': len(tokens) * samples,
+                },
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._stream(self._openai_chunks(tokens))
+
+    def _openai_chunks(self, tokens: List[str]) -> Iterator[bytes]:
+        for token in tokens:
+            time.sleep(self._token_delay())
+            chunk = {'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {'content': token}}]}
+            yield b'data: ' + json.dumps(chunk).encode('utf-8') + b'\n\n'
+        yield b'data: [DONE]\n\n'
+        yield b''
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: MockConfig, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), MockHandler)
+        self.config = config
+        self.requests = 0
+        # Recent prompts and replies, like the slots of a server-side prompt cache
+        self.prompt_cache: Deque[str] = deque(maxlen=4)
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def uncached_tokens(self, text: str) -> int:
+        with self._lock:
+            shared = max((len(os.path.commonprefix([text, cached])) for cached in self.prompt_cache), default=0)
+        return (len(text) - shared) // 4
+
+    def remember(self, text: str) -> None:
+        with self._lock:
+            self.prompt_cache.append(text)
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.config.error_rate
+
+    def start(self) -> 'MockServer':
+        threading.Thread(target=self.serve_forever, name='mock-server', daemon=True).start()
+        return self
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serve canned Ollama/OpenAI responses.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds before each reply starts')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='0 sends replies at once')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--paragraph-words', type=int, default=120)
+    parser.add_argument('--length-accuracy', type=float, default=1.2, help='reply length per requested word; 0 ignores targets')
+    parser.add_argument('--prefill-tokens-per-second', type=float, default=0.0, help='0 makes prompt evaluation free')
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        paragraph_words=args.paragraph_words,
+        length_accuracy=args.length_accuracy,
+        prefill_tokens_per_second=args.prefill_tokens_per_second,
+    )
+    server = MockServer(config, args.host, args.port)
+    print(f'Mock LLM server listening on {server.base_url}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
-from typing import Optional
+import os
+import time
 
 import streamlit as st
-from book import Book
-from utils import *
+from book_store import BookStore
+from concurrency import limiter_from_env
+from estimator import ThroughputHistory, format_errors
+from jobs import GenerationJob, JobManager
+from response_cache import ResponseCache
+from utils import get_categories
 
 from ollama_client import check_connection, OLLAMA_BASE_URL, OLLAMA_MODEL
 
@@ -15,6 +20,42 @@ BACKEND_OPTIONS = ('Ollama', 'OpenAI')
 valid = False
 backend_choice = BACKEND_OPTIONS[0]
 
+# Seconds between redraws while a job is running
+POLL_INTERVAL = 0.5
+
+
+@st.experimental_singleton
+def get_job_manager() -> JobManager:
+    # One pool and one request limiter for every session, so several tabs cannot overload the backend
+    return JobManager(
+        max_jobs=int(os.getenv('BOOKGPT_APP_JOBS', 2)),
+        limiter=limiter_from_env(default=int(os.getenv('BOOKGPT_APP_REQUESTS', 4))),
+        cache=ResponseCache.from_env(),
+        history=ThroughputHistory.from_env(),
+        store=BookStore.from_env(),
+    )
+
+
+@st.experimental_memo(ttl=30, show_spinner=False)
+def ollama_available() -> bool:
+    return check_connection()
+
+
+@st.experimental_memo(ttl=600, show_spinner=False)
+def openai_key_valid(api_key: str) -> bool:
+    # Other errors propagate, and exceptions are not memoized, so the next rerun checks again
+    openai.api_key = api_key
+    try:
+        openai.Model.list()
+    except openai.error.AuthenticationError:  # type: ignore[attr-defined]
+        return False
+    return True
+
+
+@st.experimental_memo(ttl=600, show_spinner=False)
+def cached_categories():
+    return get_categories()
+
 # Center the title
 st.title('BookGPT')
 st.markdown('---')
@@ -36,19 +77,18 @@ def initialize():
         if api_key:
             openai.api_key = api_key
             try:
-                openai.Model.list()
-                valid = True
-                st.success('API key is valid!')
-            except openai.error.AuthenticationError:  # type: ignore[attr-defined]
-                valid = False
-                st.error('API key is not valid!')
+                valid = openai_key_valid(api_key)
+                if valid:
+                    st.success('API key is valid!')
+                else:
+                    st.error('API key is not valid!')
             except Exception:
                 valid = False
                 st.warning('Unable to validate the API key right now. Please try again later.')
         else:
             valid = False
     else:
-        if check_connection():
+        if ollama_available():
             valid = True
             st.success(f'Connected to {OLLAMA_MODEL} at {OLLAMA_BASE_URL}.')
         else:
@@ -56,7 +96,18 @@ def initialize():
             st.error('Unable to connect to the Ollama server.')
 
 
-def generate_book(chapters, words, category, topic, language):
+def step_label(step) -> str:
+    if step == 'title':
+        return 'Writing the title...'
+    if step == 'structure':
+        return 'Writing the structure...'
+    if step:
+        chapter, paragraph = step.split('.')
+        return f'Writing chapter {chapter}, paragraph {paragraph}...'
+    return 'Starting...'
+
+
+def submit_book(chapters, words, category, topic, language):
     backend = backend_choice.lower()
     kwargs = dict(
         chapters=chapters,
@@ -70,25 +121,81 @@ def generate_book(chapters, words, category, topic, language):
     if backend == 'openai':
         kwargs['openai_model'] = st.session_state.get('openai_model_input', 'gpt-3.5-turbo')
 
-    book: Optional[Book] = None
-    try:
-        with st.spinner('Generating book...'):
-            book = Book(**kwargs)
-            book.get_title()
-            book.get_structure()
-            book.finish_base()
-            book.get_content()
-            st.markdown(book.to_markdown())
-    except Exception as exc:
-        st.error(f'Failed to generate the book: {exc}')
-        if book and hasattr(book, 'content'):
-            try:
-                st.info('Partial content generated before the error:')
-                st.markdown(book.to_markdown())
-            except Exception:
-                pass
-        if book and getattr(book, 'last_saved_path', None):
-            st.caption(f"Partial book saved to {book.last_saved_path}.")
+    job = get_job_manager().submit(kwargs)
+    st.session_state['job_id'] = job.job_id
+    st.session_state.pop('result', None)
+
+
+def finish_job(job: GenerationJob) -> None:
+    """Copy what the page shows into session state, so it survives reruns and the job being pruned."""
+
+    captions = []
+    book = job.book
+    if book is not None and book.first_token_latencies:
+        latencies = book.first_token_latencies
+        captions.append(f'Average time to first token: {sum(latencies) / len(latencies):.2f}s over {len(latencies)} calls.')
+    progress = job.metrics.progress()
+    captions.append(
+        f"{progress['completion_tokens']:.0f} tokens generated at {progress['tokens_per_second']:.0f} tok/s, "
+        f"{progress['calls_per_paragraph']:.2f} calls per paragraph, {progress['retries']:.0f} retries."
+    )
+    if job.estimate is not None:
+        captions.append(job.estimate.summary())
+    if job.estimate_errors:
+        captions.append(format_errors(job.estimate_errors))
+    if job.saved_path:
+        captions.append(f'Partial book saved to {job.saved_path}.')
+    st.session_state['result'] = {'markdown': job.markdown, 'error': job.error, 'captions': captions}
+    del st.session_state['job_id']
+
+
+def show_result() -> None:
+    result = st.session_state.get('result')
+    if not result:
+        return
+    if result['error']:
+        st.error(f"Failed to generate the book: {result['error']}")
+        if result['markdown']:
+            st.info('Partial content generated before the error:')
+    if result['markdown']:
+        st.markdown(result['markdown'])
+    for caption in result['captions']:
+        st.caption(caption)
+
+
+def show_job() -> None:
+    job_id = st.session_state.get('job_id')
+    if job_id is None:
+        return
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        # The server restarted or pruned the job before this session saw it finish
+        del st.session_state['job_id']
+        st.warning('The generation job is no longer available. Please start it again.')
+        return
+    if job.done:
+        finish_job(job)
+        return
+
+    if job.status == 'queued':
+        st.info(f'Waiting for a free worker ({manager.queue_position(job)} jobs ahead).')
+    else:
+        written, total = job.progress
+        st.progress(written / total if total else 0.0)
+        label = step_label(job.step)
+        if total:
+            label += f' {written}/{total} paragraphs'
+        # Same numbers as the tqdm postfix in the terminal
+        progress = job.metrics.progress()
+        st.caption(f"{label} {progress['tokens_per_second']:.0f} tok/s, {progress['calls']:.0f} calls")
+        if job.estimate is not None:
+            st.caption(job.estimate.summary())
+        st.markdown(job.text)
+
+    # Poll: widgets stay responsive because the book is written on the shared pool, not in this script run
+    time.sleep(POLL_INTERVAL)
+    st.experimental_rerun()
 
 
 def show_form():
@@ -104,7 +211,7 @@ def show_form():
 
         # Get the category of the book
         category = st.selectbox('What is the category of the book?',
-                                get_categories())
+                                cached_categories())
 
         # Get the topic of the book
         topic = st.text_input('What is the topic of the book?', placeholder='e.g. "Finance"')
@@ -122,15 +229,20 @@ def show_form():
             else:
                 st.error('Unable to reach the Ollama server. Please try again later.')
 
+        elif submit and 'job_id' in st.session_state:
+            st.warning('A book is already being written in this session. Please wait for it to finish.')
+
         # Check if all fields are filled
         elif submit and not (chapters and words and category and topic and language):
             st.error('Please fill in all fields!')
 
         # Generate the book
         elif submit:
-            # Generate the book outside the form
-            generate_book(chapters, words, category, topic, language)
+            # The book is written by the shared job manager; this session only polls it
+            submit_book(chapters, words, category, topic, language)
 
 
 initialize()
 show_form()
+show_job()
+show_result()
@@ -0,0 +1,322 @@
+"""Registry of LLM backends that :class:`book.Book` dispatches to.
+
+Each backend is a :class:`Provider`; its client library (``requests`` for
+Ollama, ``openai``) is only imported when a Book first uses it, so the CLI
+starts without paying for backends it does not need.
+"""
+
+from __future__ import annotations
+
+import importlib
+import json
+import random
+import re
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Union
+
+from retry import PermanentError
+
+if TYPE_CHECKING:  # pragma: no cover - imports for annotations only
+    from book import Book
+
+Messages = List[Dict[str, str]]
+OutputFormat = Optional[Union[str, Dict]]
+
+
+def import_openai():
+    """Return the ``openai`` module, or None when it is not installed."""
+
+    try:
+        import openai  # type: ignore
+    except ImportError:  # pragma: no cover - optional dependency
+        return None
+    return openai
+
+
+class Provider(ABC):
+    """One LLM backend.
+
+    Methods receive the calling Book, which owns the clients, options and
+    caches, so one provider instance serves every Book in the process.
+    Subclasses implement :meth:`model_name` and :meth:`request`; the other
+    methods have working defaults built on them.
+    """
+
+    name = ''
+    # Whether request_samples returns several replies from a single call
+    supports_samples = False
+
+    @abstractmethod
+    def model_name(self, book: 'Book') -> str:
+        """The model name recorded in cache keys, logs and metrics."""
+
+    def backend_key(self, book: 'Book') -> str:
+        # Circuit breakers are tracked per key
+        return self.name
+
+    def limiter_key(self, book: 'Book', asynchronous: bool = False) -> Optional[str]:
+        # Concurrency limiter slots are taken per key; None leaves the slot to the client
+        return self.backend_key(book)
+
+    def cache_options(self, book: 'Book') -> Optional[Dict]:
+        # Generation options that change the reply, and therefore belong in the cache key
+        return None
+
+    @abstractmethod
+    def request(
+        self,
+        book: 'Book',
+        prompt: Messages,
+        usage: Dict[str, Any],
+        max_tokens: Optional[int] = None,
+        output_format: OutputFormat = None,
+    ) -> str:
+        """Return the reply to ``prompt`` and put the reported token counts into ``usage``."""
+
+    def request_samples(
+        self,
+        book: 'Book',
+        prompt: Messages,
+        usage: Dict[str, Any],
+        n: int,
+        output_format: OutputFormat = None,
+    ) -> List[str]:
+        # Without native sampling, one request per reply; their token counts add up in usage
+        replies = []
+        for _ in range(n):
+            call_usage: Dict[str, Any] = {}
+            replies.append(self.request(book, prompt, call_usage, output_format=output_format))
+            for key, value in call_usage.items():
+                usage[key] = usage.get(key, 0) + value if isinstance(value, (int, float)) else value
+        return replies
+
+    def stream(
+        self,
+        book: 'Book',
+        prompt: Messages,
+        usage: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Iterator[str]:
+        yield self.request(book, prompt, usage if usage is not None else {}, max_tokens)
+
+    async def arequest(
+        self,
+        book: 'Book',
+        prompt: Messages,
+        usage: Dict[str, Any],
+        max_tokens: Optional[int] = None,
+        output_format: OutputFormat = None,
+    ) -> str:
+        import asyncio
+
+        return await asyncio.to_thread(self.request, book, prompt, usage, max_tokens, output_format)
+
+
+class OllamaProvider(Provider):
+    name = 'ollama'
+
+    def model_name(self, book: 'Book') -> str:
+        return book.ollama_client.model
+
+    def backend_key(self, book: 'Book') -> str:
+        return f'ollama:{book.ollama_client.base_url}'
+
+    def limiter_key(self, book: 'Book', asynchronous: bool = False) -> Optional[str]:
+        from ollama_router import OllamaRouter
+
+        if not isinstance(book.ollama_client, OllamaRouter):
+            return self.backend_key(book)
+        # A router takes the slot of the host it picks; async calls go to one host directly
+        return f'ollama:{book.async_ollama_client.base_url}' if asynchronous else None
+
+    def cache_options(self, book: 'Book') -> Optional[Dict]:
+        return book.ollama_options
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        return book.ollama_client.chat(
+            prompt, options=book._ollama_options(max_tokens), usage=usage, format=output_format,
+        )
+
+    def stream(self, book, prompt, usage=None, max_tokens=None):
+        yield from book.ollama_client.chat_stream(prompt, options=book._ollama_options(max_tokens), usage=usage)
+
+    async def arequest(self, book, prompt, usage, max_tokens=None, output_format=None):
+        return await book.async_ollama_client.chat(
+            prompt, options=book._ollama_options(max_tokens), usage=usage, format=output_format,
+        )
+
+
+class OpenAIProvider(Provider):
+    """The ``openai<1`` ChatCompletion API; the key is set on the module (``openai.api_key``)."""
+
+    name = 'openai'
+    supports_samples = True
+
+    def __init__(self):
+        self.openai = import_openai()
+        if self.openai is None:  # pragma: no cover - dependency guard
+            raise PermanentError('openai package is not installed')
+
+    def model_name(self, book: 'Book') -> str:
+        return book.openai_model
+
+    @staticmethod
+    def _limits(max_tokens: Optional[int]) -> Dict[str, int]:
+        return {} if max_tokens is None else {'max_tokens': max_tokens}
+
+    @staticmethod
+    def _usage(completion) -> Dict[str, float]:
+        usage = completion.get("usage") or {}
+        return {key: usage[key] for key in ("prompt_tokens", "completion_tokens") if key in usage}
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        completion = self.openai.ChatCompletion.create(  # type: ignore[attr-defined]
+            model=book.openai_model,
+            messages=prompt,
+            **self._limits(max_tokens),
+            # OpenAI's JSON mode has no schema; the prompt describes the shape
+            **({'response_format': {'type': 'json_object'}} if output_format else {}),
+        )
+        usage.update(self._usage(completion))
+        return completion["choices"][0]["message"]["content"]
+
+    def request_samples(self, book, prompt, usage, n, output_format=None):
+        # One request with n choices; the prompt is paid for once
+        completion = self.openai.ChatCompletion.create(  # type: ignore[attr-defined]
+            model=book.openai_model,
+            messages=prompt,
+            n=n,
+            **({'response_format': {'type': 'json_object'}} if output_format else {}),
+        )
+        usage.update(self._usage(completion))
+        return [choice["message"]["content"] for choice in completion["choices"]]
+
+    def stream(self, book, prompt, usage=None, max_tokens=None):
+        # OpenAI streams do not report usage; Book estimates it
+        for chunk in self.openai.ChatCompletion.create(  # type: ignore[attr-defined]
+            model=book.openai_model,
+            messages=prompt,
+            stream=True,
+            **self._limits(max_tokens),
+        ):
+            token = chunk["choices"][0].get("delta", {}).get("content")
+            if token:
+                yield token
+
+    async def arequest(self, book, prompt, usage, max_tokens=None, output_format=None):
+        completion = await self.openai.ChatCompletion.acreate(  # type: ignore[attr-defined]
+            model=book.openai_model,
+            messages=prompt,
+            **self._limits(max_tokens),
+            **({'response_format': {'type': 'json_object'}} if output_format else {}),
+        )
+        usage.update(self._usage(completion))
+        return completion["choices"][0]["message"]["content"]
+
+
+class FakeProvider(Provider):
+    """Offline backend with canned replies, for trying the CLI and pipeline without a model.
+
+    Titles, outlines and summaries are fixed; paragraphs are filler text of
+    the length their ``(N words)`` command asks for.
+    """
+
+    name = 'fake'
+    _FILLER = 'The quick brown fox jumps over the lazy dog while the story slowly moves on.'.split()
+
+    def model_name(self, book: 'Book') -> str:
+        return 'fake'
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        system = prompt[0]['content'] if prompt and prompt[0]['role'] == 'system' else ''
+        if system.startswith('You are a title'):
+            reply = '"A Book Without A Model"'
+        elif system.startswith('You are a book structure'):
+            reply = self._structure(book, output_format is not None)
+        elif system.startswith('You are a summarizing'):
+            reply = 'A short summary of what happened in this paragraph.'
+        else:
+            users = [message['content'] for message in prompt if message['role'] == 'user']
+            targets = re.findall(r'\((\d+) (?:more )?words\)', users[-1] if users else '')
+            count = int(targets[-1]) if targets else 100
+            if max_tokens is not None:
+                count = min(count, max_tokens)
+            # Shuffled per prompt, so continuations add new text instead of repeating the last reply
+            words = random.Random(zlib.crc32(json.dumps(prompt).encode('utf-8')))
+            reply = ' '.join(words.choice(self._FILLER) for _ in range(max(1, count))) + '.'
+        usage.update({'prompt_tokens': sum(len(message['content']) // 4 for message in prompt),
+                      'completion_tokens': len(reply.split())})
+        return reply
+
+    def stream(self, book, prompt, usage=None, max_tokens=None):
+        reply = self.request(book, prompt, usage if usage is not None else {}, max_tokens)
+        for index, word in enumerate(reply.split(' ')):
+            yield word if index == 0 else ' ' + word
+
+    @staticmethod
+    def _structure(book: 'Book', as_json: bool) -> str:
+        chapters = book._spec_int('chapters') or 3
+        words = book._spec_int('words_per_chapter') or 1200
+        paragraphs = 4
+        outline = [
+            {
+                'title': f'Chapter title {chapter}',
+                'paragraphs': [
+                    {'title': f'Scene {chapter}.{paragraph}', 'words': max(1, words // paragraphs)}
+                    for paragraph in range(1, paragraphs + 1)
+                ],
+            }
+            for chapter in range(1, chapters + 1)
+        ]
+        if as_json:
+            return json.dumps({'chapters': outline})
+        lines = []
+        for index, chapter in enumerate(outline, start=1):
+            lines.append(f"Chapter {index} ({len(chapter['paragraphs'])} paragraphs): {chapter['title']}")
+            for number, paragraph in enumerate(chapter['paragraphs'], start=1):
+                lines.append(f"\tParagraph {number} ({paragraph['words']} words): {paragraph['title']}")
+        return '\n'.join(lines)
+
+
+# Name -> provider class, factory, or 'module:attribute' string resolved on first use
+_FACTORIES: Dict[str, Union[str, Callable[[], Provider]]] = {
+    'ollama': OllamaProvider,
+    'openai': OpenAIProvider,
+    'fake': FakeProvider,
+}
+_providers: Dict[str, Provider] = {}
+_lock = threading.Lock()
+
+
+def register(name: str, factory: Union[str, Callable[[], Provider]]) -> None:
+    """Make a backend available as ``Book(llm_backend=name)``.
+
+    ``factory`` is called (or, given as ``'package.module:Factory'``,
+    imported and called) the first time a Book uses the backend.
+    """
+
+    with _lock:
+        _FACTORIES[name.lower()] = factory
+        _providers.pop(name.lower(), None)
+
+
+def available() -> List[str]:
+    return sorted(_FACTORIES)
+
+
+def get_provider(name: str) -> Provider:
+    name = name.lower()
+    with _lock:
+        provider = _providers.get(name)
+        if provider is not None:
+            return provider
+        factory = _FACTORIES.get(name)
+        if factory is None:
+            raise PermanentError(f"Unsupported LLM backend: {name}")
+        if isinstance(factory, str):
+            module, _, attribute = factory.partition(':')
+            factory = getattr(importlib.import_module(module), attribute)
+        provider = _providers[name] = factory()
+        return provider
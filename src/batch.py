@@ -0,0 +1,216 @@
+"""Non-interactive generation of many books from a JSON-lines spec file."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import queue
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from book import Book
+from book_store import BookStore
+from book_writer import BookWriter
+from concurrency import ConcurrencyLimiter
+from journal import GenerationJournal
+from metrics import Metrics
+from response_cache import ResponseCache
+
+# Spec keys that steer the scheduler instead of being passed to Book
+SCHEDULER_KEYS = {'priority'}
+
+
+@dataclass
+class BatchJob:
+    index: int
+    spec: Dict
+    output_path: str
+    priority: int = 0
+    status: str = 'pending'
+    error: Optional[str] = None
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    words: int = 0
+    title: Optional[str] = None
+
+    @property
+    def journal_path(self) -> str:
+        return f'{os.path.splitext(self.output_path)[0]}.journal.jsonl'
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def to_dict(self) -> Dict:
+        return {
+            'index': self.index,
+            'priority': self.priority,
+            'status': self.status,
+            'output_path': self.output_path,
+            'title': self.title,
+            'words': self.words,
+            'duration': self.duration,
+            'error': self.error,
+        }
+
+
+def slugify(text: str, max_length: int = 40) -> str:
+    slug = re.sub(r'[^a-z0-9]+', '-', str(text).lower()).strip('-')
+    return slug[:max_length].rstrip('-') or 'book'
+
+
+def spec_to_book_kwargs(spec: Dict) -> Dict:
+    kwargs = {key: value for key, value in spec.items() if key not in SCHEDULER_KEYS}
+    if 'backend' in kwargs:
+        kwargs['llm_backend'] = kwargs.pop('backend')
+    return kwargs
+
+
+def output_path_for(spec: Dict, index: int, output_dir: str) -> str:
+    """Deterministic path: the same spec on the same line always maps to the same file."""
+
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(output_dir, f'{index:04d}-{slugify(spec.get("topic", ""))}-{digest}.md')
+
+
+def load_jobs(path: str, output_dir: str) -> List[BatchJob]:
+    jobs = []
+    with open(path, encoding='utf-8') as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                spec = json.loads(line)
+            except ValueError as exc:
+                raise ValueError(f'{path}:{line_number}: invalid JSON ({exc})') from exc
+            index = len(jobs)
+            jobs.append(BatchJob(
+                index=index,
+                spec=spec,
+                output_path=output_path_for(spec, index, output_dir),
+                priority=int(spec.get('priority', 0)),
+            ))
+    return jobs
+
+
+@dataclass
+class BatchRunner:
+    """Run book jobs concurrently, highest priority first.
+
+    ``max_books`` bounds how many books are in progress at once, while
+    ``limiter`` caps the LLM requests in flight per backend across all of
+    them, and ``metrics`` aggregates their spans and token counts. With a
+    ``store``, every book is also recorded in the SQLite book store. Finished
+    outputs are skipped and interrupted books are resumed from their journal,
+    so re-running a batch only does the missing work.
+    """
+
+    jobs: List[BatchJob]
+    max_books: int = 4
+    limiter: ConcurrencyLimiter = field(default_factory=ConcurrencyLimiter)
+    cache: Optional[ResponseCache] = None
+    metrics: Metrics = field(default_factory=Metrics)
+    store: Optional[BookStore] = None
+    structure_attempts: int = 3
+
+    def __post_init__(self):
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        for job in self.jobs:
+            self._queue.put((-job.priority, job.index, job))
+
+    def run(self) -> Dict:
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_books, thread_name_prefix='book') as executor:
+            for _ in range(self.max_books):
+                executor.submit(self._worker)
+        return self.summary(time.time() - started)
+
+    def _worker(self) -> None:
+        while True:
+            try:
+                _, _, job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self.run_job(job)
+
+    def run_job(self, job: BatchJob) -> None:
+        if os.path.exists(job.output_path):
+            job.status = 'skipped'
+            return
+
+        os.makedirs(os.path.dirname(job.output_path) or '.', exist_ok=True)
+        job.status = 'running'
+        job.started = time.time()
+        book: Optional[Book] = None
+        try:
+            book = self._make_book(job)
+            if not hasattr(book, 'title'):
+                book.get_title()
+            book.ensure_structure(self.structure_attempts)
+            book.finish_base()
+            content = book.get_content()
+            book.save_book(job.output_path)
+        except Exception as exc:  # pragma: no cover - network/runtime failure
+            job.status = 'failed'
+            job.error = str(exc)
+        else:
+            job.status = 'done'
+            job.title = book.title
+            job.words = sum(len(paragraph.split()) for chapter in content for paragraph in chapter)
+        finally:
+            # A long batch would otherwise keep a journal and a .part file open for every book it ran
+            if book is not None:
+                book.close()
+            job.finished = time.time()
+            print(f'[{job.status}] {job.output_path}' + (f': {job.error}' if job.error else ''))
+
+    def _make_book(self, job: BatchJob) -> Book:
+        # Streaming to the output path means it only appears, by rename, once the book is complete
+        runtime = {
+            'cache': self.cache, 'limiter': self.limiter, 'metrics': self.metrics, 'store': self.store,
+            'writer': BookWriter(job.output_path),
+        }
+        if os.path.exists(job.journal_path):
+            return Book.resume(job.journal_path, **runtime)
+        journal = GenerationJournal(job.journal_path)
+        try:
+            return Book(**spec_to_book_kwargs(job.spec), **runtime, journal=journal)
+        except BaseException:
+            journal.close()
+            raise
+
+    def summary(self, elapsed: float) -> Dict:
+        done = [job for job in self.jobs if job.status == 'done']
+        words = sum(job.words for job in done)
+        hours = elapsed / 3600
+        minutes = elapsed / 60
+        return {
+            'elapsed_seconds': round(elapsed, 1),
+            'jobs': len(self.jobs),
+            'done': len(done),
+            'failed': sum(job.status == 'failed' for job in self.jobs),
+            'skipped': sum(job.status == 'skipped' for job in self.jobs),
+            'words': words,
+            'books_per_hour': round(len(done) / hours, 2) if hours else 0.0,
+            'words_per_minute': round(words / minutes, 1) if minutes else 0.0,
+            'results': [job.to_dict() for job in self.jobs],
+        }
+
+
+def parse_limits(values: Optional[List[str]]) -> Dict[str, int]:
+    """Turn ['ollama=4', 'openai=8'] into {'ollama': 4, 'openai': 8}."""
+
+    limits = {}
+    for value in values or []:
+        backend, _, limit = value.partition('=')
+        if not limit:
+            raise ValueError(f'Invalid limit {value!r}; expected BACKEND=N')
+        limits[backend.strip().lower()] = int(limit)
+    return limits
@@ -1,9 +1,9 @@
-from tqdm import tqdm
 import prompts
-import random
-from datetime import datetime, timezone, timedelta
+import json
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 import time
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Union
 
 
 class GenerationInterrupted(RuntimeError):
@@ -13,29 +13,56 @@ class GenerationInterrupted(RuntimeError):
         super().__init__(message)
         self.partial_chapter = partial_chapter
 
-try:
-    import openai  # type: ignore
-except ImportError:  # pragma: no cover - optional dependency
-    openai = None
+from backends import Provider, get_provider
+from book_store import BookStore, ParagraphRow
+from book_writer import BookWriter, book_filename, write_atomically
+from journal import GenerationJournal
+from length_control import LengthController, RepetitionFilter, count_words, get_default_controller
+from concurrency import ConcurrencyLimiter
+from context_window import ContextWindow, count_prompt_tokens, estimate_tokens, extractive_summary, split_sentences
+from metrics import Metrics
+from outline import OUTLINE_SCHEMA, Outline, OutlineError, parse_outline
+from request_log import RequestLog, get_default_log
+from response_cache import ResponseCache
+from retry import CircuitBreaker, CircuitOpenError, RetryPolicy, get_default_policy
+
+if TYPE_CHECKING:  # pragma: no cover - the Ollama clients are imported when the backend is first used
+    from ollama_client import AsyncOllamaClient, OllamaClient
+    from ollama_router import OllamaRouter
+
+# A continuation adding fewer novel words than this share of what is missing stalls the paragraph
+_STALL_FRACTION = 0.2
+# Paragraphs collected before they are written to the book store in one transaction
+_STORE_BATCH = 32
+
+
+# Keyword arguments holding runtime objects rather than book settings; never journaled
+RUNTIME_KEYS = {'ollama_client', 'on_token', 'cache', 'journal', 'request_log', 'retry_policy', 'limiter', 'metrics',
+                'length_controller', 'writer', 'store'}
 
-from ollama_client import chat, OllamaError
 
 class Book:
     def __str__(self):
-        book_structure = "Structure of the book:\n"
+        lines = ["Structure of the book:"]
         for chapter_index, chapter_info in enumerate(self.chapters, start=1):
             chapter_title = chapter_info['title']
             chapter_paragraphs = chapter_info['paragraphs']
-            book_structure += f"Chapter {chapter_index} ({len(chapter_paragraphs)} paragraphs): {chapter_title}\n"
+            lines.append(f"Chapter {chapter_index} ({len(chapter_paragraphs)} paragraphs): {chapter_title}")
             for paragraph_index, paragraph_info in enumerate(chapter_paragraphs, start=1):
                 paragraph_title = paragraph_info['title']
                 paragraph_words = paragraph_info['words']
-                book_structure += f"\tParagraph {paragraph_index} ({paragraph_words} words): {paragraph_title}\n"
+                lines.append(f"\tParagraph {paragraph_index} ({paragraph_words} words): {paragraph_title}")
 
-        return book_structure
+        return '\n'.join(lines) + '\n'
       
     def __init__(self, **kwargs):
-        excluded_keys = {'tolerance', 'llm_backend', 'openai_model', 'ollama_options'}
+        excluded_keys = RUNTIME_KEYS | {
+            'tolerance', 'llm_backend', 'openai_model', 'ollama_options', 'max_workers', 'context_budget',
+            'context_summaries', 'length_control', 'outline_format', 'paragraph_workers', 'smoothing',
+            'retain_content', 'max_continuations', 'repetition_ngram',
+            # No longer used, but still in the spec of older journals
+            'ollama_context',
+        }
         # Joining the keyword arguments into a single string
         self.arguments = '; '.join([
             f'{key}: {value}' for key, value in kwargs.items() if key not in excluded_keys
@@ -49,12 +76,94 @@ class Book:
         self.openai_model = kwargs.get('openai_model', 'gpt-3.5-turbo')
         self.ollama_options = kwargs.get('ollama_options')
 
+        # Number of chapters generated concurrently (1 keeps the sequential behaviour)
+        self.max_workers = max(1, int(kwargs.get('max_workers') or 1))
+
+        # Opt-in draft mode: paragraphs of a chapter are written concurrently from the outline and
+        # handoff notes instead of the full chapter so far, then a smoothing pass fixes the transitions
+        self.paragraph_workers = max(1, int(kwargs.get('paragraph_workers') or 1))
+        self.smoothing = kwargs.get('smoothing', True)
+
+        # Without an explicit client, Ollama requests use the process-wide one, opened on first use so
+        # the OpenAI backend never opens a session. Sharing it lets every Book in a batch or job pool
+        # reuse connections and be balanced together when OLLAMA_BASE_URL lists several hosts
+        self._ollama_client: Optional[Union['OllamaClient', 'OllamaRouter']] = kwargs.get('ollama_client')
+        self._async_ollama_client: Optional['AsyncOllamaClient'] = None
+        # Reentrant, because the async client is built from the sync one while holding it
+        self._client_lock = threading.RLock()
+
+        # Optional token streaming: on_token(step, token) receives every chunk as it arrives,
+        # where step is 'title', 'structure' or '<chapter>.<paragraph>'
+        self.on_token: Optional[Callable[[str, str], None]] = kwargs.get('on_token')
+        self.first_token_latencies: List[float] = []
+
+        # Structured request log; defaults to the process-wide one configured through BOOKGPT_LOG_*
+        self.request_log: RequestLog = kwargs.get('request_log') or get_default_log()
+
+        # Retry/backoff behaviour and circuit breakers; the default policy is shared process-wide
+        self.retry_policy: RetryPolicy = kwargs.get('retry_policy') or get_default_policy()
+
+        # Optional limiter shared between books to cap in-flight requests per backend endpoint
+        self.limiter: Optional[ConcurrencyLimiter] = kwargs.get('limiter')
+
+        # Per-stage spans and token counters; pass a shared Metrics to aggregate several books
+        self.metrics: Metrics = kwargs.get('metrics') or Metrics()
+
+        # Paragraph calls get a max-token limit and a stop condition derived from their word target,
+        # so continuations ('!c') are only needed when the model really stops short
+        self.length_control = kwargs.get('length_control', True)
+        self.length_controller: LengthController = kwargs.get('length_controller') or get_default_controller()
+
+        # '!c' continuations per paragraph are capped, and text repeating an earlier span of
+        # repetition_ngram words is dropped (0 keeps everything); stalled paragraphs are flagged here
+        self.max_continuations = int(kwargs.get('max_continuations', 4))
+        self.repetition_ngram = int(kwargs.get('repetition_ngram', 8))
+        self.stalled_paragraphs: Dict[tuple, str] = {}
+
+        # How the outline is requested: 'json' (JSON mode), 'schema' (Ollama JSON schema) or 'text' (the table)
+        self.outline_format = kwargs.get('outline_format', 'json')
+        self.outline: Optional[Outline] = None
+
+        # Optional persistent response cache shared across runs, workers and processes
+        self.cache: Optional[ResponseCache] = kwargs.get('cache')
+
+        # Token budget for paragraph prompts; None keeps every earlier paragraph verbatim.
+        # Evicted paragraphs are summarized by the LLM ('llm') or by sentence extraction ('extractive').
+        self.context_budget: Optional[int] = kwargs.get('context_budget', 4096)
+        self.context_summaries = kwargs.get('context_summaries', 'llm')
+
+        # Optional crash-safe journal of completed steps; see Book.resume
+        self.spec = {key: value for key, value in kwargs.items() if key not in RUNTIME_KEYS}
+        self.journal: Optional[GenerationJournal] = kwargs.get('journal')
+        if self.journal is not None:
+            self.journal.record('spec', kwargs=self.spec)
+        self._journaled_paragraphs: Dict[tuple, str] = {}
+        self._journaled_parts: Dict[tuple, List[str]] = {}
+        self._journaled_summaries: Dict[tuple, str] = {}
+        self._journaled_smoothed: set = set()
+
         # Track whether only partial content is available
         self.partial_content = False
         self.last_saved_path: Optional[str] = None
 
-        # Assign a status variable
+        # Optional writer that streams paragraphs to disk as they finish; with retain_content=False
+        # finished chapters are dropped from memory and the book only exists in the writer's file
+        self.writer: Optional[BookWriter] = kwargs.get('writer')
+        self.retain_content = kwargs.get('retain_content', True)
+        if not self.retain_content and self.writer is None:
+            raise ValueError('retain_content=False needs a writer to hold the book.')
+
+        # Optional SQLite store; paragraphs reach it in batches, and the book's status when it ends
+        self.store: Optional[BookStore] = kwargs.get('store')
+        self.store_book_id: Optional[int] = None
+        self._store_rows: List[ParagraphRow] = []
+        self._store_lock = threading.Lock()
+        self._paragraph_calls: Dict[tuple, int] = {}
+
+        # Assign a status variable, guarded by a lock since chapter workers update it concurrently
         self.status = 0
+        self._status_lock = threading.Lock()
+        self._base_finished = False
 
         # Setting up the base prompt
         self.base_prompt = [
@@ -71,34 +180,149 @@ class Book:
         ]
 
         # Setting up the structure prompt
+        structure_instructions = (
+            prompts.STRUCTURE_INSTRUCTIONS if self.outline_format == 'text' else prompts.STRUCTURE_JSON_INSTRUCTIONS
+        )
         self.structure_prompt = [
-            self.get_message('system', prompts.STRUCTURE_INSTRUCTIONS),
+            self.get_message('system', structure_instructions),
             self.get_message('assistant', 'Ready'),
         ]
 
         self.output('Prompts set up. Ready to generate book.')
 
-    def get_title(self):
-        self.title = self.get_response(self.title_prompt)
+    def get_title(self, fresh: bool = False):
+        # fresh=True skips the cache lookup so a regeneration yields a new sample
+        with self.metrics.span('title'):
+            title = self.get_response(self.title_prompt, step='title', use_cache=not fresh)
+        return self.use_title(title)
+
+    def title_candidates(self, n: int = 3, fresh: bool = False) -> List[str]:
+        """Request ``n`` titles at once and return the distinct ones; pick one with :meth:`use_title`."""
+
+        with self.metrics.span('title'):
+            titles = self.get_responses(self.title_prompt, n, step='title', fresh=fresh)
+        return list(dict.fromkeys(title.strip() for title in titles))
+
+    def use_title(self, title: str) -> str:
+        self.title = title
+        self._journal('title', title=self.title)
         return self.title
 
-    def get_structure(self):
+    def _structure_messages(self) -> List[Dict[str, str]]:
+        # Built fresh on every call, so a regeneration sends the same prompt as the first attempt
+        return self.structure_prompt + [self.get_message('user', self.arguments + f'; title: {self.title}')]
+
+    def get_structure(self, fresh: bool = False):
         if not hasattr(self, 'title'):
             self.output('Title not generated. Please generate title first.')
             return
         else:
-            structure_arguments = self.arguments + f'; title: {self.title}'
-            self.structure_prompt.append(self.get_message('user', structure_arguments))
-            self.structure = self.get_response(self.structure_prompt)
-            self.chapters = self.convert_structure(self.structure)
-
-            # Ensure self.chapters contains the actual chapter information before assigning paragraph amounts and words.
-            if isinstance(self.chapters, list):
-                self.paragraph_amounts = self.get_paragraph_amounts(self.chapters)  # updated line
-                self.paragraph_words = self.get_paragraph_words(self.chapters)  # updated line
+            with self.metrics.span('structure'):
+                reply = self.get_response(
+                    self._structure_messages(),
+                    step='structure',
+                    use_cache=not fresh,
+                    output_format=self._outline_output_format(),
+                )
+
+            # Raises OutlineError when the reply has no chapters at all; smaller defects are fixed locally
+            structure = self.use_structure(self._read_outline(reply))
+            if self.on_token is not None and self.outline_format != 'text':
+                # JSON replies are not streamed; show the rendered table instead
+                self.on_token('structure', self.structure)
+            return structure
+
+    def structure_candidates(self, n: int = 2, fresh: bool = False) -> List[Outline]:
+        """Request ``n`` outlines at once and return the usable ones; pick one with :meth:`use_structure`.
+
+        Raises OutlineError when none of the replies contains chapters.
+        """
+
+        if not hasattr(self, 'title'):
+            raise ValueError('Title not generated yet.')
+        with self.metrics.span('structure'):
+            replies = self.get_responses(
+                self._structure_messages(), n, step='structure', fresh=fresh,
+                output_format=self._outline_output_format(),
+            )
+        outlines: List[Outline] = []
+        errors: List[str] = []
+        for reply in replies:
+            try:
+                outlines.append(self._read_outline(reply))
+            except OutlineError as exc:
+                errors.append(str(exc))
+        if not outlines:
+            raise OutlineError(f'None of the {len(replies)} outlines was usable: {"; ".join(errors)}')
+        return outlines
+
+    def ensure_structure(
+        self,
+        attempts: int = 3,
+        candidates: int = 1,
+        choose: Optional[Callable[[List[Outline]], Optional[Outline]]] = None,
+    ) -> str:
+        """Request outlines until one is in use and return the structure.
+
+        A book resumed with a structure keeps it. Without ``choose`` a single
+        outline is requested per round and used; with it, ``candidates``
+        outlines are requested and ``choose`` picks one, or None for a new
+        round. Raises RuntimeError after ``attempts`` unreadable replies.
+        """
+
+        if hasattr(self, 'structure') and self.chapters:
+            return str(self.structure)
+        if not hasattr(self, 'title'):
+            raise ValueError('Title not generated yet.')
+
+        failures = 0
+        fresh = False
+        while failures < attempts:
+            try:
+                if choose is None:
+                    self.get_structure(fresh=fresh)
+                else:
+                    outline = choose(self.structure_candidates(candidates, fresh=fresh))
+                    if outline is not None:
+                        self.use_structure(outline)
+            except OutlineError as exc:
+                # The reply had no recognisable chapters at all; smaller defects are repaired by the parser
+                self.output(f'Could not read the outline ({exc}); asking again...')
+                failures += 1
+            if hasattr(self, 'structure') and self.chapters:
                 return str(self.structure)
-            else:
-                self.output('Error in converting the book structure.')
+            fresh = True
+        raise RuntimeError('The model did not return a usable book structure.')
+
+    def _read_outline(self, reply: str) -> Outline:
+        outline = parse_outline(reply)
+        fixes = outline.repair(self._spec_int('words_per_chapter'), self._spec_int('chapters'))
+        if fixes:
+            self.output(f'Repaired the outline: {"; ".join(fixes)}.')
+        return outline
+
+    def use_structure(self, outline: Outline) -> str:
+        # The structure is kept in the table format, so prompts and journals look the same in every mode
+        self.outline = outline
+        self.structure = outline.to_text()
+        self._journal('structure', structure=self.structure)
+        self.chapters = outline.to_chapters()
+        self.paragraph_amounts = self.get_paragraph_amounts(self.chapters)
+        self.paragraph_words = self.get_paragraph_words(self.chapters)
+        return str(self.structure)
+
+    def _outline_output_format(self):
+        if self.outline_format == 'schema':
+            return OUTLINE_SCHEMA
+        if self.outline_format == 'json':
+            return 'json'
+        return None
+
+    def _spec_int(self, key: str) -> Optional[int]:
+        try:
+            return int(self.spec[key])
+        except (KeyError, TypeError, ValueError):
+            return None
 
     def finish_base(self):
         if not hasattr(self, 'title'):
@@ -113,6 +337,7 @@ class Book:
 
             self.base_prompt.append(self.get_message('user', '!s'))
             self.base_prompt.append(self.get_message('assistant', self.structure))
+            self._base_finished = True
             return self.base_prompt
 
     def calculate_max_status(self):
@@ -127,12 +352,31 @@ class Book:
         if not hasattr(self, 'chapters'):
             raise ValueError('Structure not generated yet.')
 
+        if not self._base_finished:
+            self.finish_base()
+
+        if self.writer is not None:
+            self.writer.open(getattr(self, 'title', 'Untitled Book'), self.chapters)
+        if self.store is not None:
+            self.store_book_id = self.store.start_book(
+                self.spec, getattr(self, 'title', 'Untitled Book'), getattr(self, 'structure', None), self.chapters,
+                backend=self.llm_backend, model=self.model_name,
+            )
+
+        if self.max_workers > 1:
+            return self._get_content_concurrently()
+
+        from tqdm import tqdm
+
         chapters: List[List[str]] = []
         try:
-            for i in tqdm(range(len(self.chapters))):
+            # Streamed tokens are rendered by the caller, so keep the bar out of their way
+            progress = tqdm(range(len(self.chapters)), disable=self.on_token is not None)
+            for i in progress:
                 prompt = self.base_prompt.copy()
                 chapter = self.get_chapter(i, prompt.copy())
-                chapters.append(chapter)
+                chapters.append(chapter if self.retain_content else [])
+                progress.set_postfix(self.metrics.progress_postfix())
         except GenerationInterrupted as interrupted:
             chapters.append(interrupted.partial_chapter)
             self._persist_partial_content(chapters, interrupted)
@@ -140,86 +384,400 @@ class Book:
         except Exception:
             if chapters:
                 self._persist_partial_content(chapters)
+            else:
+                self._finish_store('failed')
             raise
         else:
-            self.content = chapters
-            self.partial_content = False
-            return self.content
+            return self._finish_content(chapters)
+
+    def _get_content_concurrently(self):
+        """Generate chapters on a bounded thread pool while keeping chapter order."""
+
+        from tqdm import tqdm
+
+        chapters: List[Optional[List[str]]] = [None] * len(self.chapters)
+        progress = tqdm(total=len(self.chapters))
+        progress_lock = threading.Lock()
+
+        def run_chapter(index: int) -> List[str]:
+            chapter = self.get_chapter(index, self.base_prompt.copy())
+            chapters[index] = chapter if self.retain_content else []
+            with progress_lock:
+                progress.update(1)
+                progress.set_postfix(self.metrics.progress_postfix())
+            return chapter
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='chapter') as executor:
+            futures = [executor.submit(run_chapter, i) for i in range(len(self.chapters))]
+            _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            # Chapters that are already running finish on shutdown so their text is not lost
+            for future in pending:
+                future.cancel()
+        progress.close()
+
+        error: Optional[BaseException] = None
+        for index, future in enumerate(futures):
+            if future.cancelled() or future.exception() is None:
+                continue
+            failure = future.exception()
+            if isinstance(failure, GenerationInterrupted):
+                chapters[index] = failure.partial_chapter
+            if error is None:
+                error = failure
+
+        if error is None:
+            return self._finish_content(chapters)
+
+        partial = [chapter or [] for chapter in chapters]
+        while partial and not partial[-1]:
+            partial.pop()
+
+        if isinstance(error, GenerationInterrupted):
+            self._persist_partial_content(partial, error)
+            raise RuntimeError(str(error)) from error.__cause__
+        if partial:
+            self._persist_partial_content(partial)
+        else:
+            self._finish_store('failed')
+        raise error
+
+    def _finish_content(self, chapters: List[List[str]]) -> List[List[str]]:
+        self.content = chapters
+        self.partial_content = False
+        if self.writer is not None:
+            self.last_saved_path = self.writer.finish()
+        self._finish_store('done')
+        return self.content
 
     def save_book(self, filename: Optional[str] = None) -> str:
-        # Save the book in md format
-        # Corrected saving the book with the specified time
-        desired_time = datetime.now(timezone(timedelta(hours=-5)))  # EST timezone
-        # Use the desired time as a seed for the random number generator
-        random.seed(desired_time)
-        # Generate a random 4-digit number
-        random_number = random.randint(1000009, 9999999)
-        # Ensure it's 4 digits long
-        random_number = str(random_number).zfill(random.randint(7, 10))
-        suffix = '_partial' if self.partial_content else ''
-        path = filename or f'book{random_number}{suffix}.md'
-        with open(path, 'w') as file:
-            file.write(self.to_markdown())
+        # A streamed book is already on disk under its final name
+        streamed = self.writer.finished_path if self.writer is not None else None
+        if streamed is not None and filename in (None, streamed):
+            self.last_saved_path = streamed
+            return streamed
+
+        path = filename or book_filename(getattr(self, 'title', 'Untitled Book'), partial=self.partial_content)
+        write_atomically(path, self.to_markdown())
         self.last_saved_path = path
         return path
 
+    def close(self) -> None:
+        """Close the journal and a writer that did not finish; the shared Ollama client stays open."""
+
+        if self.journal is not None:
+            self.journal.close()
+        if self.writer is not None:
+            self.writer.close()
+
     def get_chapter(self, chapter_index, prompt):
-        if len(self.base_prompt) <= 9:
+        with self.metrics.span('chapter', chapter=chapter_index + 1):
+            return self._get_chapter(chapter_index, prompt)
+
+    def _get_chapter(self, chapter_index, prompt):
+        if not self._base_finished:
             self.finish_base()
+            prompt = self.base_prompt.copy()
 
+        if self.paragraph_workers > 1:
+            return self._get_chapter_concurrently(chapter_index)
+
+        window = ContextWindow(prompt, self.context_budget, self.summarize_paragraph, command=self.paragraph_command)
         paragraphs = []
         for i in range(self.paragraph_amounts[chapter_index]):
+            # Paragraphs restored from a journal only rebuild the prompt state
+            journaled = self._journaled_paragraphs.get((chapter_index, i))
+            if journaled is not None:
+                window.add(chapter_index, i, journaled)
+                self._write_paragraph(chapter_index, i, journaled)
+                paragraphs.append(journaled)
+                continue
+
             try:
-                paragraph = self.get_paragraph(prompt.copy(), chapter_index, i)
+                paragraph = self.get_paragraph(window.messages(), chapter_index, i)
             except Exception as exc:  # pragma: no cover - network/runtime failure
                 raise GenerationInterrupted(
                     f'Failed to generate paragraph {i + 1} of chapter {chapter_index + 1}',
                     paragraphs,
                 ) from exc
 
-            prompt.append(self.get_message('user', f'!w {chapter_index + 1} {i + 1}'))
-            prompt.append(self.get_message('assistant', paragraph))
-            self.status += 1
+            self._journal('paragraph', chapter=chapter_index, paragraph=i, text=paragraph)
+            self.metrics.inc('paragraphs_total')
+            window.add(chapter_index, i, paragraph)
+            self._write_paragraph(chapter_index, i, paragraph)
+            with self._status_lock:
+                self.status += 1
             paragraphs.append(paragraph)
         return paragraphs
 
+    def _get_chapter_concurrently(self, chapter_index):
+        """Write every paragraph of a chapter at once, then smooth the transitions in order."""
+
+        amount = self.paragraph_amounts[chapter_index]
+        paragraphs: List[Optional[str]] = [self._journaled_paragraphs.get((chapter_index, i)) for i in range(amount)]
+
+        def run_paragraph(index: int) -> None:
+            prompt = self.base_prompt.copy()
+            prompt.append(self.get_message('system', self.handoff_note(chapter_index, index)))
+            paragraph = self.get_paragraph(prompt, chapter_index, index)
+            self._journal('paragraph', chapter=chapter_index, paragraph=index, text=paragraph)
+            self.metrics.inc('paragraphs_total')
+            paragraphs[index] = paragraph
+            with self._status_lock:
+                self.status += 1
+
+        missing = [index for index, paragraph in enumerate(paragraphs) if paragraph is None]
+        with ThreadPoolExecutor(max_workers=self.paragraph_workers, thread_name_prefix='paragraph') as executor:
+            futures = [executor.submit(run_paragraph, index) for index in missing]
+            _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in pending:
+                future.cancel()
+
+        failures = [future.exception() for future in futures if not future.cancelled() and future.exception()]
+        if failures:
+            # Only the unbroken run of finished paragraphs can be kept as the start of the chapter
+            finished = []
+            for paragraph in paragraphs:
+                if paragraph is None:
+                    break
+                finished.append(paragraph)
+            for index, paragraph in enumerate(finished):
+                self._write_paragraph(chapter_index, index, paragraph)
+            raise GenerationInterrupted(
+                f'Failed to generate paragraph {len(finished) + 1} of chapter {chapter_index + 1}',
+                finished,
+            ) from failures[0]
+
+        if self.smoothing:
+            self.smooth_transitions(chapter_index, paragraphs)
+        # Smoothing rewrites openings, so drafts only reach the writer once the chapter is final
+        for index, paragraph in enumerate(paragraphs):
+            self._write_paragraph(chapter_index, index, paragraph)
+        return paragraphs
+
+    def _write_paragraph(self, chapter_index, paragraph_index, paragraph):
+        if self.writer is not None:
+            self.writer.add(chapter_index, paragraph_index, paragraph)
+        if self.store_book_id is not None:
+            key = (chapter_index, paragraph_index)
+            row = (
+                chapter_index, paragraph_index, self.chapters[chapter_index]['paragraphs'][paragraph_index]['title'],
+                paragraph, self.paragraph_words[chapter_index][paragraph_index], self._paragraph_calls.get(key, 0),
+            )
+            with self._store_lock:
+                self._store_rows.append(row)
+                if len(self._store_rows) >= _STORE_BATCH:
+                    self._flush_store()
+
+    def _flush_store(self) -> None:
+        # Called with _store_lock held
+        rows, self._store_rows = self._store_rows, []
+        self.store.add_paragraphs(self.store_book_id, rows)
+
+    def _finish_store(self, status: str) -> None:
+        if self.store_book_id is None:
+            return
+        with self._store_lock:
+            self._flush_store()
+            self.store.finish_book(self.store_book_id, status)
+
+    def handoff_note(self, chapter_index, paragraph_index):
+        """Tell a paragraph written without its neighbours where it sits in the chapter."""
+
+        chapter = self.chapters[chapter_index]
+        titles = [paragraph['title'] for paragraph in chapter['paragraphs']]
+        note = (
+            f'Handoff: you are writing paragraph {paragraph_index + 1} of {len(titles)} in chapter '
+            f'{chapter_index + 1}, "{chapter["title"]}". This paragraph is "{titles[paragraph_index]}".'
+        )
+        if paragraph_index > 0:
+            note += f' The previous paragraph, "{titles[paragraph_index - 1]}", is written separately and ends just before it.'
+        if paragraph_index + 1 < len(titles):
+            note += f' The next paragraph, "{titles[paragraph_index + 1]}", picks up right after it.'
+        return note + ' Do not cover the content of the other paragraphs.'
+
+    def smooth_transitions(self, chapter_index, paragraphs):
+        """Rewrite the opening sentences of each paragraph to follow on from the one before."""
+
+        for index in range(1, len(paragraphs)):
+            key = (chapter_index, index)
+            sentences = split_sentences(paragraphs[index])
+            if key in self._journaled_smoothed or len(sentences) < 2:
+                continue
+
+            opening_sentences = sentences[:min(2, len(sentences) - 1)]
+            opening = ' '.join(opening_sentences)
+            end = paragraphs[index].find(opening_sentences[-1]) + len(opening_sentences[-1])
+            rest = paragraphs[index][end:].lstrip()
+            previous_end = ' '.join(split_sentences(paragraphs[index - 1])[-2:])
+
+            prompt = [
+                self.get_message('system', prompts.SMOOTHING_INSTRUCTIONS),
+                self.get_message('user', f'End of the previous paragraph:\n{previous_end}\n\nOpening to rewrite:\n{opening}'),
+            ]
+            try:
+                with self.metrics.span('smoothing', chapter=chapter_index + 1, paragraph=index + 1):
+                    rewritten = self.get_response(prompt, max_retries=2, target_words=count_words(opening)).strip()
+            except RuntimeError:
+                # Smoothing is cosmetic; keep the draft transition rather than failing the chapter
+                continue
+            if not rewritten or count_words(rewritten) > 3 * count_words(opening):
+                continue
+
+            paragraphs[index] = f'{rewritten} {rest}' if rest else rewritten
+            self._journal('paragraph', chapter=chapter_index, paragraph=index, text=paragraphs[index], smoothed=True)
+
     def get_paragraph(self, prompt, chapter_index, paragraph_index):
-        prompt.append(self.get_message('user', f'!w {chapter_index + 1} {paragraph_index + 1}'))
-        paragraph = self.get_response(prompt)
+        step = f'{chapter_index + 1}.{paragraph_index + 1}'
+        with self.metrics.span('paragraph', step=step):
+            return self._get_paragraph(prompt, chapter_index, paragraph_index, step)
+
+    def paragraph_command(self, chapter_index, paragraph_index):
+        # Also used to replay earlier paragraphs, so the prompt prefix stays byte-identical to what was sent
+        command = f'!w {chapter_index + 1} {paragraph_index + 1}'
+        if self.length_control:
+            command += f' ({self.paragraph_words[chapter_index][paragraph_index]} words)'
+        return command
+
+    def _get_paragraph(self, prompt, chapter_index, paragraph_index, step):
+        key = (chapter_index, paragraph_index)
+        words = self.paragraph_words[chapter_index][paragraph_index]
+        prompt.append(self.get_message('user', self.paragraph_command(chapter_index, paragraph_index)))
+
+        # Responses journaled before a crash are replayed instead of requested again
+        parts = self._journaled_parts.pop(key, [])
+        calls = 0
+        if parts:
+            response = parts[0]
+        else:
+            calls += 1
+            response = self.get_response(prompt, step=step, target_words=self._target(words))
+            self._journal('part', chapter=chapter_index, paragraph=paragraph_index, text=response)
+        # Only novel text is kept and sent back, so repeats neither pad the book nor count toward the target
+        repetition = RepetitionFilter(self.repetition_ngram)
+        paragraph, _ = repetition.add(response)
         prompt.append(self.get_message('assistant', paragraph))
 
-        while len(paragraph.split(' ')) < int(self.paragraph_words[chapter_index][paragraph_index] * self.tolerance):
+        continuations = 0
+        stalled = None
+        while LengthController.is_underrun(paragraph, words, self.tolerance):
+            if continuations >= self.max_continuations:
+                stalled = 'cap'
+                break
+            missing = words - count_words(paragraph)
             prompt.append(self.get_message('system', '!c'))
-            response = self.get_response(prompt)
-            paragraph += response
-            prompt.append(self.get_message('assistant', response))
+            continuations += 1
+            if continuations < len(parts):
+                response = parts[continuations]
+            else:
+                calls += 1
+                with self.metrics.span('continuation', step=step):
+                    response = self.get_response(prompt, step=step, target_words=self._target(missing))
+                self._journal('part', chapter=chapter_index, paragraph=paragraph_index, text=response)
+            novel, novel_words = repetition.add(response)
+            paragraph += novel
+            prompt.append(self.get_message('assistant', novel))
+            # A model that mostly repeats itself will not do better on the next '!c'
+            if novel_words < max(1, missing * _STALL_FRACTION):
+                stalled = 'stall'
+                break
 
+        if repetition.repeated_words:
+            self.metrics.inc('repeated_words_total', repetition.repeated_words)
+        if stalled is not None:
+            self.stalled_paragraphs[key] = stalled
+            self.metrics.inc('paragraph_stalls_total', reason=stalled)
+            self._journal('stall', chapter=chapter_index, paragraph=paragraph_index, reason=stalled)
+        self._paragraph_calls[key] = calls
         return paragraph
 
+    def _target(self, words: int) -> Optional[int]:
+        return max(1, words) if self.length_control else None
+
+    def summarize_paragraph(self, chapter_index, paragraph_index, paragraph):
+        journaled = self._journaled_summaries.get((chapter_index, paragraph_index))
+        if journaled is not None:
+            return journaled
+
+        if self.context_summaries != 'llm':
+            return extractive_summary(paragraph)
+
+        prompt = [
+            self.get_message('system', prompts.SUMMARY_INSTRUCTIONS),
+            self.get_message('user', paragraph),
+        ]
+        try:
+            with self.metrics.span('summary', chapter=chapter_index + 1, paragraph=paragraph_index + 1):
+                summary = self.get_response(prompt, max_retries=2)
+        except RuntimeError:
+            # A missing summary must not stop the chapter; fall back to the extractive one
+            return extractive_summary(paragraph)
+
+        self._journal('summary', chapter=chapter_index, paragraph=paragraph_index, text=summary)
+        return summary
+
+    def _journal(self, kind: str, **fields) -> None:
+        if self.journal is not None:
+            self.journal.record(kind, **fields)
+
+    @classmethod
+    def resume(cls, journal_path: str, **overrides) -> 'Book':
+        """Rebuild a book from its journal and keep journaling to the same file.
+
+        ``overrides`` supplies runtime objects such as ``cache`` or ``on_token``
+        and may change settings like ``max_workers``. Generation continues from
+        the first paragraph the journal does not contain.
+        """
+
+        records = GenerationJournal.read(journal_path)
+        specs = [record for record in records if record['type'] == 'spec']
+        if not specs:
+            raise ValueError(f'{journal_path} does not contain a book specification.')
+
+        book = cls(**{**specs[0]['kwargs'], **overrides, 'journal': None})
+        for record in records:
+            kind = record['type']
+            key = (record.get('chapter'), record.get('paragraph'))
+            if kind == 'title':
+                book.title = record['title']
+            elif kind == 'structure':
+                book.structure = record['structure']
+                book._journaled_paragraphs.clear()
+                book._journaled_parts.clear()
+                book._journaled_summaries.clear()
+                book._journaled_smoothed.clear()
+                book.stalled_paragraphs.clear()
+            elif kind == 'part':
+                book._journaled_parts.setdefault(key, []).append(record['text'])
+            elif kind == 'paragraph':
+                book._journaled_paragraphs[key] = record['text']
+                book._journaled_parts.pop(key, None)
+                if record.get('smoothed'):
+                    book._journaled_smoothed.add(key)
+            elif kind == 'summary':
+                book._journaled_summaries[key] = record['text']
+            elif kind == 'stall':
+                book.stalled_paragraphs[key] = record['reason']
+
+        if hasattr(book, 'structure'):
+            book.chapters = book.convert_structure(book.structure)
+            book.paragraph_amounts = book.get_paragraph_amounts(book.chapters)
+            book.paragraph_words = book.get_paragraph_words(book.chapters)
+            book.status = len(book._journaled_paragraphs)
+
+        book.journal = GenerationJournal(journal_path)
+        book.output(f'Resumed from {journal_path}: {book.status} paragraphs already written.')
+        return book
+
     @staticmethod
     def get_message(role, content):
         return {"role": role, "content": content}
       
     @staticmethod
     def convert_structure(structure):
-        chapters = structure.split("Chapter")
-        chapters = [x for x in chapters if x != '']
-        chapter_information = []
-        for chapter in chapters:
-            chapter_lines = chapter.split("\n")
-            if len(chapter_lines) > 1:
-                chapter_title_line = chapter_lines[0]
-                if 'paragraphs' in chapter_title_line.lower():
-                    chapter_info = {'title': chapter_title_line.split('): ')[1], 'paragraphs': []}
-                    for line in chapter_lines[1:]:
-                        if 'paragraph' in line.lower():
-                            words_info = line.split('(')[1].split(')')[0].split(' ')
-                            if len(words_info) >= 2:
-                                paragraph_title = line.split('): ')[1]
-                                paragraph_words = words_info[0]
-                                chapter_info['paragraphs'].append({'title': paragraph_title, 'words': paragraph_words})
-                    chapter_information.append(chapter_info)
-        return chapter_information
+        try:
+            return parse_outline(structure).to_chapters()
+        except OutlineError:
+            return []
 
 
     @staticmethod
@@ -236,43 +794,477 @@ class Book:
             words.append([int(x['words']) for x in chapter['paragraphs']])
         return words
 
-    def get_response(self, prompt: List[Dict[str, str]], max_retries: int = 5) -> str:
-        retries = 0
+    @property
+    def provider(self) -> Provider:
+        # Looked up per call, so a backend registered after the Book was created is picked up
+        return get_provider(self.llm_backend)
+
+    @property
+    def ollama_client(self) -> Union['OllamaClient', 'OllamaRouter']:
+        with self._client_lock:
+            if self._ollama_client is None:
+                from ollama_client import get_default_client
+
+                self._ollama_client = get_default_client(pool_size=max(10, self.max_workers * self.paragraph_workers))
+            if self.limiter is not None and getattr(self._ollama_client, 'limiter', False) is None:
+                # A router takes the limiter slot itself, once it knows which host the request goes to
+                self._ollama_client.limiter = self.limiter
+            return self._ollama_client
+
+    @property
+    def async_ollama_client(self) -> 'AsyncOllamaClient':
+        with self._client_lock:
+            if self._async_ollama_client is None:
+                from ollama_client import AsyncOllamaClient
+                from ollama_router import OllamaRouter
+
+                client = self.ollama_client
+                if isinstance(client, OllamaRouter):
+                    # Async calls are not routed; they go to the first endpoint that is currently healthy
+                    client = next((endpoint.client for endpoint in client.endpoints if endpoint.healthy), client.endpoints[0].client)
+                self._async_ollama_client = AsyncOllamaClient(
+                    client.base_url,
+                    client.model,
+                    pool_size=client.pool_size,
+                    connect_timeout=client.connect_timeout,
+                    read_timeout=client.read_timeout,
+                    keep_alive=client.keep_alive,
+                )
+            return self._async_ollama_client
+
+    def get_response(
+        self,
+        prompt: List[Dict[str, str]],
+        max_retries: Optional[int] = None,
+        step: str = '',
+        use_cache: bool = True,
+        target_words: Optional[int] = None,
+        output_format: Optional[Union[str, Dict]] = None,
+        stream: bool = True,
+    ) -> str:
+        # The token limit is left out of the cache key: it only trims what the same prompt would produce
+        cache_key = self._cache_key(prompt)
+        if cache_key is not None and use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.metrics.inc('llm_cache_hits_total', backend=self.llm_backend)
+                if self.on_token is not None and step and output_format is None:
+                    self.on_token(step, cached)
+                return cached
+
+        policy = self.retry_policy
+        breaker = policy.breaker(self.backend_key)
+        attempts = max_retries if max_retries is not None else policy.max_retries
+        kind = self._call_kind()
+        max_tokens = self.length_controller.max_tokens(self.model_name, target_words) if target_words else None
         last_error: Optional[Exception] = None
-        backend = self.llm_backend
-        while retries < max_retries:
+        for attempt in range(attempts):
+            usage: Dict[str, float] = {}
+            queue_wait = 0.0
+            started = time.perf_counter()
             try:
-                if backend == 'ollama':
-                    response = chat(prompt, options=self.ollama_options)
-                elif backend == 'openai':
-                    if openai is None:  # pragma: no cover - dependency guard
-                        raise RuntimeError('openai package is not installed')
-                    response = openai.ChatCompletion.create(  # type: ignore[attr-defined]
-                        model=self.openai_model,
-                        messages=prompt
-                    )["choices"][0]["message"]["content"]
-                else:
-                    raise RuntimeError(f"Unsupported LLM backend: {backend}")
-
-                with open("log.txt", "a") as f:
-                    f.write(f"Prompt: {prompt}\nResponse: {response}\n\n")
-                return response
-            except OllamaError as exc:
+                with self.metrics.span('llm_call', kind=kind, step=step, attempt=attempt) as span:
+                    breaker.before_call()
+                    limiter_key = self._limiter_key()
+                    if limiter_key is None:
+                        response = self._request(prompt, step, usage, max_tokens, target_words, output_format, stream)
+                    else:
+                        with self.limiter.slot(limiter_key) as outcome:
+                            queue_wait = time.perf_counter() - started
+                            response = self._request(
+                                prompt, step, usage, max_tokens, target_words, output_format, stream,
+                            )
+                            outcome.tokens = usage.get('completion_tokens') or estimate_tokens(response)
+            except Exception as exc:  # pragma: no cover - runtime/network failure
                 last_error = exc
+                delay = self._handle_failure(exc, attempt, attempts, breaker)
+                if delay is None:
+                    break
+                with self.metrics.span('retry', step=step, attempt=attempt + 1, error=type(exc).__name__):
+                    time.sleep(delay)
+                continue
+
+            breaker.record_success()
+            duration = time.perf_counter() - started
+            if target_words and 'completion_tokens' in usage:
+                self.length_controller.observe(self.model_name, response, usage['completion_tokens'])
+            self._record_usage(span, prompt, response, kind, usage, duration, queue_wait)
+            self._log_response(prompt, response, step, duration, attempt, usage)
+            if cache_key is not None:
+                self.cache.put(cache_key, response)
+            return response
+
+        raise self._exhausted_error(last_error, attempts)
+
+    def _request(
+        self,
+        prompt: List[Dict[str, str]],
+        step: str,
+        usage: Dict[str, float],
+        max_tokens: Optional[int] = None,
+        target_words: Optional[int] = None,
+        output_format: Optional[Union[str, Dict]] = None,
+        stream: bool = True,
+    ) -> str:
+        # Only named steps are streamed to on_token; length-controlled calls stream so they can stop early.
+        # JSON replies are only useful once complete, so they are never streamed.
+        if stream and output_format is None and ((self.on_token is not None and step) or target_words is not None):
+            return self._stream_to_callback(prompt, step, usage, max_tokens, target_words)
+        return self.provider.request(self, prompt, usage, max_tokens, output_format)
+
+    def get_responses(
+        self,
+        prompt: List[Dict[str, str]],
+        n: int,
+        step: str = '',
+        fresh: bool = False,
+        output_format: Optional[Union[str, Dict]] = None,
+    ) -> List[str]:
+        """Return ``n`` independent replies to ``prompt``, requested at the same time.
+
+        Backends with a multi-sample option (OpenAI's ``n``) answer in one
+        call; the others get ``n`` concurrent requests, of which the failed
+        ones are left out. Replies are not streamed to ``on_token``. The set
+        is cached as a whole; ``fresh=True`` asks for a new one.
+        """
+
+        if n <= 1:
+            return [self.get_response(prompt, step=step, use_cache=not fresh, output_format=output_format, stream=False)]
+
+        cache_key = self._cache_key(prompt, samples=n)
+        if cache_key is not None and not fresh:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.metrics.inc('llm_cache_hits_total', backend=self.llm_backend)
+                return json.loads(cached)
+
+        if self.provider.supports_samples:
+            replies = self._get_samples(prompt, n, step, output_format)
+        else:
+            with ThreadPoolExecutor(max_workers=n, thread_name_prefix='candidate') as executor:
+                futures = [
+                    executor.submit(
+                        self.get_response, prompt, step=step, use_cache=not fresh and index == 0,
+                        output_format=output_format, stream=False,
+                    )
+                    for index in range(n)
+                ]
+                replies = []
+                last_error: Optional[Exception] = None
+                for future in futures:
+                    try:
+                        replies.append(future.result())
+                    except RuntimeError as exc:
+                        last_error = exc
+            if not replies:
+                raise last_error  # type: ignore[misc]
+
+        if cache_key is not None:
+            self.cache.put(cache_key, json.dumps(replies))
+        return replies
+
+    def _get_samples(
+        self,
+        prompt: List[Dict[str, str]],
+        n: int,
+        step: str,
+        output_format: Optional[Union[str, Dict]],
+    ) -> List[str]:
+        # Same retry, breaker and limiter handling as get_response, for one call that returns n replies
+        policy = self.retry_policy
+        breaker = policy.breaker(self.backend_key)
+        attempts = policy.max_retries
+        kind = self._call_kind()
+        last_error: Optional[Exception] = None
+        for attempt in range(attempts):
+            usage: Dict[str, float] = {}
+            queue_wait = 0.0
+            started = time.perf_counter()
+            try:
+                with self.metrics.span('llm_call', kind=kind, step=step, attempt=attempt, samples=n) as span:
+                    breaker.before_call()
+                    limiter_key = self._limiter_key()
+                    if limiter_key is None:
+                        replies = self.provider.request_samples(self, prompt, usage, n, output_format)
+                    else:
+                        with self.limiter.slot(limiter_key) as outcome:
+                            queue_wait = time.perf_counter() - started
+                            replies = self.provider.request_samples(self, prompt, usage, n, output_format)
+                            # The samples are generated side by side, so one of them stands for the call
+                            outcome.tokens = (usage.get('completion_tokens') or estimate_tokens(''.join(replies))) / n
             except Exception as exc:  # pragma: no cover - runtime/network failure
                 last_error = exc
+                delay = self._handle_failure(exc, attempt, attempts, breaker)
+                if delay is None:
+                    break
+                with self.metrics.span('retry', step=step, attempt=attempt + 1, error=type(exc).__name__):
+                    time.sleep(delay)
+                continue
+
+            breaker.record_success()
+            duration = time.perf_counter() - started
+            joined = '\n\n'.join(replies)
+            self._record_usage(span, prompt, joined, kind, usage, duration, queue_wait)
+            self._log_response(prompt, joined, step, duration, attempt, usage)
+            return replies
 
-            retries += 1
-            print(f"An error occurred: {last_error}. Retrying ({retries}/{max_retries})...")
-            time.sleep(20)
+        raise self._exhausted_error(last_error, attempts)
 
+    def _handle_failure(self, exc: Exception, attempt: int, attempts: int, breaker: CircuitBreaker) -> Optional[float]:
+        """Update the circuit breaker and return the delay before the next attempt, or None to give up."""
+
+        if not self.retry_policy.is_retryable(exc):
+            # The backend answered (or was never reached because of our configuration), so it is not down
+            breaker.record_success()
+            raise RuntimeError(f"Request failed with a non-retryable error: {exc}") from exc
+
+        if not isinstance(exc, CircuitOpenError):
+            breaker.record_failure()
+        if attempt + 1 >= attempts:
+            return None
+
+        delay = self.retry_policy.delay(attempt, exc)
+        self.metrics.inc('llm_retries_total', backend=self.llm_backend, error=type(exc).__name__)
+        print(f"An error occurred: {exc}. Retrying in {delay:.1f}s ({attempt + 1}/{attempts})...")
+        return delay
+
+    @staticmethod
+    def _exhausted_error(last_error: Optional[Exception], attempts: int) -> RuntimeError:
         if last_error is None:
-            raise RuntimeError("Unknown error while requesting a response")
-        raise RuntimeError(f"Failed to get a response after {max_retries} retries.") from last_error
+            return RuntimeError("Unknown error while requesting a response")
+        error = RuntimeError(f"Failed to get a response after {attempts} retries.")
+        error.__cause__ = last_error
+        return error
+
+    def stream_response(
+        self,
+        prompt: List[Dict[str, str]],
+        usage: Optional[Dict[str, float]] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Iterator[str]:
+        """Yield response tokens from the configured backend as they arrive (no retries).
+
+        Ollama fills ``usage`` once the stream is exhausted; OpenAI streams do not report usage.
+        """
+
+        yield from self.provider.stream(self, prompt, usage, max_tokens)
+
+    def _stream_to_callback(
+        self,
+        prompt: List[Dict[str, str]],
+        step: str,
+        usage: Dict[str, float],
+        max_tokens: Optional[int] = None,
+        target_words: Optional[int] = None,
+    ) -> str:
+        started = time.perf_counter()
+        tokens: List[str] = []
+        cutoff = self.length_controller.cutoff(target_words) if target_words is not None else None
+        stream = self.stream_response(prompt, usage, max_tokens)
+        try:
+            for token in stream:
+                if not tokens:
+                    latency = time.perf_counter() - started
+                    self.first_token_latencies.append(latency)
+                    usage['first_token_seconds'] = latency
+                tokens.append(token)
+                if self.on_token is not None and step:
+                    self.on_token(step, token)
+                if cutoff is not None and cutoff.feed(token):
+                    break
+        finally:
+            # Closing the stream drops the connection, which makes the server stop generating
+            stream.close()
+        # A stream cut off early never sees the final stats; each streamed chunk is one token
+        usage.setdefault('completion_tokens', len(tokens))
+        return ''.join(tokens)
+
+    def _ollama_options(self, max_tokens: Optional[int]) -> Optional[Dict]:
+        if max_tokens is None:
+            return self.ollama_options
+        return {**(self.ollama_options or {}), 'num_predict': max_tokens}
+
+    async def aget_response(
+        self,
+        prompt: List[Dict[str, str]],
+        max_retries: Optional[int] = None,
+        use_cache: bool = True,
+        target_words: Optional[int] = None,
+        output_format: Optional[Union[str, Dict]] = None,
+    ) -> str:
+        """Async variant of :meth:`get_response` that does not hold a thread per request.
+
+        ``target_words`` limits the reply's tokens as for :meth:`get_response`,
+        but the reply is not streamed, so it is not cut at the target.
+        """
+
+        import asyncio
+
+        cache_key = self._cache_key(prompt)
+        if cache_key is not None and use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        policy = self.retry_policy
+        breaker = policy.breaker(self.backend_key)
+        attempts = max_retries if max_retries is not None else policy.max_retries
+        max_tokens = self.length_controller.max_tokens(self.model_name, target_words) if target_words else None
+        last_error: Optional[Exception] = None
+        for attempt in range(attempts):
+            usage: Dict[str, float] = {}
+            queue_wait = 0.0
+            started = time.perf_counter()
+            try:
+                # A half-open breaker blocks until its trial call resolves, so wait off the event loop
+                await asyncio.to_thread(breaker.before_call)
+                limiter_key = self._limiter_key(asynchronous=True)
+                if limiter_key is None:
+                    response = await self._arequest(prompt, usage, max_tokens, output_format)
+                else:
+                    # The limiter blocks, so wait for a slot off the event loop
+                    await asyncio.to_thread(self.limiter.acquire, limiter_key)
+                    queue_wait = time.perf_counter() - started
+                    try:
+                        response = await self._arequest(prompt, usage, max_tokens, output_format)
+                    except BaseException as exc:
+                        self.limiter.release(limiter_key, time.perf_counter() - started - queue_wait, error=exc)
+                        raise
+                    self.limiter.release(
+                        limiter_key, time.perf_counter() - started - queue_wait,
+                        usage.get('completion_tokens') or estimate_tokens(response),
+                    )
+            except Exception as exc:  # pragma: no cover - runtime/network failure
+                last_error = exc
+                delay = self._handle_failure(exc, attempt, attempts, breaker)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+                continue
+
+            breaker.record_success()
+            duration = time.perf_counter() - started
+            if target_words and 'completion_tokens' in usage:
+                self.length_controller.observe(self.model_name, response, usage['completion_tokens'])
+            # Coroutines interleave on one thread, so async calls are counted but not traced as spans
+            self._record_usage(None, prompt, response, 'async', usage, duration, queue_wait)
+            self._log_response(prompt, response, '', duration, attempt, usage)
+            if cache_key is not None:
+                self.cache.put(cache_key, response)
+            return response
+
+        raise self._exhausted_error(last_error, attempts)
+
+    async def _arequest(
+        self,
+        prompt: List[Dict[str, str]],
+        usage: Dict[str, float],
+        max_tokens: Optional[int] = None,
+        output_format: Optional[Union[str, Dict]] = None,
+    ) -> str:
+        return await self.provider.arequest(self, prompt, usage, max_tokens, output_format)
+
+    @property
+    def backend_key(self) -> str:
+        # Circuit breakers are tracked per server, not per Book
+        return self.provider.backend_key(self)
+
+    def _limiter_key(self, asynchronous: bool = False) -> Optional[str]:
+        # None when there is no limiter or the client takes a slot per routed host itself
+        if self.limiter is None:
+            return None
+        return self.provider.limiter_key(self, asynchronous)
+
+    def request_limit(self) -> Optional[int]:
+        """Requests the limiter currently allows in flight for this book's backend (None: unlimited)."""
+
+        if self.limiter is None:
+            return None
+        key = self._limiter_key()
+        return self.limiter.limit(key) if key is not None else self.ollama_client.limit()
+
+    @property
+    def model_name(self) -> str:
+        return self.provider.model_name(self)
+
+    def _cache_key(self, prompt: List[Dict[str, str]], samples: int = 1) -> Optional[str]:
+        if self.cache is None:
+            return None
+        options = self.provider.cache_options(self)
+        if samples > 1:
+            # A set of candidates is cached apart from the single reply to the same prompt
+            options = {**(options or {}), 'samples': samples}
+        return self.cache.make_key(self.llm_backend, self.model_name, options, prompt)
+
+    def _call_kind(self) -> str:
+        # Calls are attributed to the innermost stage, e.g. 'paragraph', 'continuation' or 'summary'
+        span = self.metrics.current_span()
+        return span.name if span is not None else 'other'
+
+    def _record_usage(
+        self,
+        span,
+        prompt: List[Dict[str, str]],
+        response: str,
+        kind: str,
+        usage: Dict[str, float],
+        duration: float,
+        queue_wait: float,
+    ) -> None:
+        # OpenAI streams and other backends without usage data fall back to estimates
+        if 'prompt_tokens' not in usage or 'completion_tokens' not in usage:
+            usage.setdefault('prompt_tokens', count_prompt_tokens(prompt))
+            usage.setdefault('completion_tokens', estimate_tokens(response))
+            usage['estimated'] = True
+        # A router waits for its host's slot itself and reports that wait in usage
+        queue_wait = max(queue_wait, usage.get('queue_wait_seconds', 0.0))
+        usage['queue_wait_seconds'] = round(queue_wait, 6)
+        if span is not None:
+            span.attributes.update(usage)
+
+        labels = {'backend': self.llm_backend, 'model': self.model_name}
+        metrics = self.metrics
+        # Routed Ollama calls also count per host, to show which one is the bottleneck
+        endpoint = {'endpoint': usage['endpoint']} if 'endpoint' in usage else {}
+        metrics.inc('llm_calls_total', kind=kind, **labels, **endpoint)
+        metrics.inc('llm_prompt_tokens', usage['prompt_tokens'], **labels)
+        metrics.inc('llm_completion_tokens', usage['completion_tokens'], **labels)
+        metrics.observe('llm_call_seconds', duration, **labels, **endpoint)
+        metrics.observe('llm_queue_wait_seconds', queue_wait, **labels)
+        metrics.observe('llm_generation_seconds', usage.get('eval_seconds', duration - queue_wait), **labels)
+        # Streams cut off early never get the server's timings; the first token's latency is the closest measure
+        prefill = usage.get('prompt_eval_seconds', usage.get('first_token_seconds'))
+        if prefill is not None:
+            # Per kind, so a warm prompt cache shows up as cheap paragraph prefills
+            metrics.observe('llm_prefill_seconds', prefill, kind=kind, **labels)
+        if 'load_seconds' in usage:
+            metrics.observe('llm_load_seconds', usage['load_seconds'], **labels)
+
+    def _log_response(
+        self,
+        prompt: List[Dict[str, str]],
+        response: str,
+        step: str,
+        duration: float,
+        retries: int,
+        usage: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.request_log.log(
+            prompt,
+            response,
+            backend=self.llm_backend,
+            model=self.model_name,
+            step=step,
+            duration=round(duration, 3),
+            retries=retries,
+            usage=usage or {},
+        )
 
     def to_markdown(self) -> str:
         if not hasattr(self, 'content'):
             raise ValueError('Content not generated yet.')
+        if not self.retain_content:
+            raise ValueError(f'Content was not kept in memory; read the book from {self.last_saved_path}.')
 
         lines = [f'# {getattr(self, "title", "Untitled Book")}']
         if self.partial_content:
@@ -301,7 +1293,12 @@ class Book:
 
         self.content = chapters
         self.partial_content = True
-        path = self.save_book()
+        self._finish_store('partial')
+        if self.writer is not None and self.writer.is_open:
+            path = self.writer.finish(partial=True)
+            self.last_saved_path = path
+        else:
+            path = self.save_book()
         message = f'Partial book saved to {path}.'
         if error is not None:
             message = f'{message} Reason: {error}'
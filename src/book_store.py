@@ -0,0 +1,398 @@
+"""SQLite store of generated and imported books, with a full-text index over their paragraphs."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from book_writer import PARTIAL_NOTE
+
+_DEFAULT_PATH = '.bookgpt_books.sqlite3'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    spec_hash TEXT NOT NULL,
+    outline TEXT,
+    status TEXT NOT NULL,
+    backend TEXT,
+    model TEXT,
+    source TEXT,
+    digest TEXT,
+    started REAL,
+    finished REAL,
+    seconds REAL
+);
+CREATE INDEX IF NOT EXISTS books_spec_hash ON books (spec_hash);
+CREATE INDEX IF NOT EXISTS books_digest ON books (digest);
+CREATE TABLE IF NOT EXISTS chapters (
+    id INTEGER PRIMARY KEY,
+    book_id INTEGER NOT NULL REFERENCES books (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    UNIQUE (book_id, position)
+);
+CREATE TABLE IF NOT EXISTS paragraphs (
+    id INTEGER PRIMARY KEY,
+    book_id INTEGER NOT NULL REFERENCES books (id) ON DELETE CASCADE,
+    chapter_id INTEGER NOT NULL REFERENCES chapters (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    text TEXT NOT NULL,
+    words INTEGER NOT NULL,
+    target_words INTEGER,
+    calls INTEGER,
+    UNIQUE (chapter_id, position)
+);
+CREATE INDEX IF NOT EXISTS paragraphs_book ON paragraphs (book_id);
+"""
+
+# External-content index: the text lives once, in paragraphs, and triggers keep the index in step
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS paragraphs_fts USING fts5 (
+    title, text, content='paragraphs', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS paragraphs_ai AFTER INSERT ON paragraphs BEGIN
+    INSERT INTO paragraphs_fts (rowid, title, text) VALUES (new.id, new.title, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS paragraphs_ad AFTER DELETE ON paragraphs BEGIN
+    INSERT INTO paragraphs_fts (paragraphs_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS paragraphs_au AFTER UPDATE ON paragraphs BEGIN
+    INSERT INTO paragraphs_fts (paragraphs_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+    INSERT INTO paragraphs_fts (rowid, title, text) VALUES (new.id, new.title, new.text);
+END;
+"""
+
+# (chapter position, paragraph position, title, text, target words, calls)
+ParagraphRow = Tuple[int, int, str, str, Optional[int], Optional[int]]
+
+_CHAPTER_HEADING = re.compile(r'^##\s+(?:Chapter\s+)?(\d+)\s*[.:]\s*(.*?)\s*$', re.IGNORECASE)
+_INFO_LINE = re.compile(r'^[-*]\s*([^:]+):\s*(.*?)\s*$')
+
+
+def spec_hash(spec: Dict) -> str:
+    # Books generated from the same settings share a hash, so repeated specs are easy to find
+    payload = json.dumps(spec, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def read_markdown(path: str) -> str:
+    # Older books were saved with the platform encoding, which was cp1252 on Windows
+    with open(path, 'rb') as file:
+        data = file.read()
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        text = data.decode('cp1252', errors='replace')
+    return text.replace('\r\n', '\n').lstrip('﻿')
+
+
+def parse_book_markdown(text: str) -> Dict:
+    """Split a book's markdown into its title, information list and chapters.
+
+    Both layouts are understood: this project's ``## Chapter N: Title`` with
+    ``### Paragraph title`` sections, and the older ``## N. Title`` chapters
+    of plain, blank-line separated paragraphs (as in ``examples/``).
+    """
+
+    title = ''
+    info: Dict[str, str] = {}
+    chapters: List[Dict] = []
+    section: Optional[str] = None
+    blocks: List[str] = []
+    block: List[str] = []
+
+    def end_block() -> None:
+        if block:
+            blocks.append('\n'.join(block).strip())
+            block.clear()
+
+    def end_chapter() -> None:
+        end_block()
+        if chapters:
+            chapters[-1]['paragraphs'].extend(_paragraphs(blocks))
+        blocks.clear()
+
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if stripped.startswith('# ') and not title:
+            title = stripped[2:].strip()
+            continue
+        chapter = _CHAPTER_HEADING.match(stripped)
+        if chapter:
+            end_chapter()
+            section = 'chapter'
+            chapters.append({'title': chapter.group(2), 'paragraphs': []})
+            continue
+        if stripped.startswith('## '):
+            end_chapter()
+            section = 'info' if stripped[3:].strip().rstrip(':').lower() == 'information' else None
+            continue
+        if section == 'info':
+            item = _INFO_LINE.match(stripped)
+            if item:
+                info[item.group(1).strip().lower()] = item.group(2).strip().strip('"')
+            continue
+        if section != 'chapter':
+            continue
+        if stripped.startswith('### '):
+            end_block()
+            blocks.append(line)
+            continue
+        if stripped:
+            block.append(line.rstrip())
+        else:
+            end_block()
+    end_chapter()
+    return {'title': title, 'info': info, 'chapters': chapters, 'partial': PARTIAL_NOTE in text}
+
+
+def _paragraphs(blocks: Sequence[str]) -> List[Dict]:
+    # A '### title' line starts a paragraph that runs until the next one; without titles, every block is one
+    paragraphs: List[Dict] = []
+    titled = any(block.lstrip().startswith('### ') for block in blocks)
+    for block in blocks:
+        if block.lstrip().startswith('### '):
+            paragraphs.append({'title': block.strip()[4:].strip(), 'text': ''})
+        elif titled and paragraphs:
+            paragraph = paragraphs[-1]
+            paragraph['text'] = f"{paragraph['text']}\n\n{block}" if paragraph['text'] else block
+        elif block:
+            paragraphs.append({'title': '', 'text': block})
+    return [paragraph for paragraph in paragraphs if paragraph['text'] or paragraph['title']]
+
+
+def _runtime_seconds(value: Optional[str]) -> Optional[float]:
+    # The examples record the runtime in minutes, e.g. 'Runtime: 5.45 min'
+    number = re.match(r'\s*(\d+(?:\.\d+)?)', value or '')
+    return float(number.group(1)) * 60 if number else None
+
+
+class BookStore:
+    """Books, chapters and paragraphs in one SQLite file, searchable with FTS5.
+
+    A generating Book registers itself with :meth:`start_book`, adds its
+    paragraphs in batches with :meth:`add_paragraphs` (one transaction per
+    batch) and sets the final status with :meth:`finish_book`. Markdown books
+    written by earlier versions are added with :meth:`import_markdown`.
+    Like :class:`response_cache.ResponseCache`, each thread uses its own
+    connection and SQLite's locking makes the file safe to share between
+    processes. Without FTS5 in the SQLite build, :meth:`search` falls back to
+    a substring match.
+    """
+
+    def __init__(self, path: str = _DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+        try:
+            connection.executescript(_FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError:  # pragma: no cover - SQLite built without FTS5
+            self.full_text = False
+
+    @classmethod
+    def from_env(cls) -> Optional['BookStore']:
+        """Open the store configured by BOOKGPT_STORE, or None when it is disabled."""
+
+        path = os.getenv('BOOKGPT_STORE', _DEFAULT_PATH)
+        if path.lower() in {'', '0', 'off', 'none'}:
+            return None
+        return cls(path)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            self._local.connection = connection
+        return connection
+
+    def _transaction(self, statements) -> None:
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            statements(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def start_book(
+        self,
+        spec: Dict,
+        title: str,
+        outline: Optional[str],
+        chapters: Sequence[Dict],
+        status: str = 'running',
+        backend: Optional[str] = None,
+        model: Optional[str] = None,
+        source: Optional[str] = None,
+        digest: Optional[str] = None,
+        started: Optional[float] = None,
+    ) -> int:
+        """Add a book and its chapters, and return the book's id."""
+
+        book_id = 0
+
+        def insert(connection: sqlite3.Connection) -> None:
+            nonlocal book_id
+            book_id = connection.execute(
+                'INSERT INTO books (title, spec, spec_hash, outline, status, backend, model, source, digest, started) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    title, json.dumps(spec, ensure_ascii=False, default=str), spec_hash(spec), outline, status,
+                    backend, model, source, digest, time.time() if started is None else started,
+                ),
+            ).lastrowid
+            connection.executemany(
+                'INSERT INTO chapters (book_id, position, title) VALUES (?, ?, ?)',
+                [(book_id, position, chapter['title']) for position, chapter in enumerate(chapters)],
+            )
+
+        self._transaction(insert)
+        return book_id
+
+    def add_paragraphs(self, book_id: int, rows: Iterable[ParagraphRow]) -> None:
+        """Insert or replace paragraphs in one transaction; positions are zero-based."""
+
+        values = [
+            (book_id, book_id, chapter, position, title, text, len(text.split()), target_words, calls)
+            for chapter, position, title, text, target_words, calls in rows
+        ]
+        if not values:
+            return
+        self._transaction(lambda connection: connection.executemany(
+            'INSERT INTO paragraphs (book_id, chapter_id, position, title, text, words, target_words, calls) '
+            'VALUES (?, (SELECT id FROM chapters WHERE book_id = ? AND position = ?), ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (chapter_id, position) DO UPDATE SET '
+            'title = excluded.title, text = excluded.text, words = excluded.words, '
+            'target_words = excluded.target_words, calls = excluded.calls',
+            values,
+        ))
+
+    def finish_book(self, book_id: int, status: str, finished: Optional[float] = None) -> None:
+        finished = time.time() if finished is None else finished
+        self._connection().execute(
+            'UPDATE books SET status = ?, finished = ?, seconds = ? - started WHERE id = ?',
+            (status, finished, finished, book_id),
+        )
+
+    def book(self, book_id: int) -> Optional[Dict]:
+        row = self._connection().execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def books(self, status: Optional[str] = None, spec: Optional[Dict] = None) -> List[Dict]:
+        """Books with their paragraph and word counts, newest first, optionally filtered."""
+
+        query = (
+            'SELECT b.id, b.title, b.status, b.backend, b.model, b.source, b.started, b.seconds, b.spec_hash, '
+            'COUNT(p.id) AS paragraphs, COALESCE(SUM(p.words), 0) AS words, COALESCE(SUM(p.calls), 0) AS calls '
+            'FROM books b LEFT JOIN paragraphs p ON p.book_id = b.id'
+        )
+        conditions, parameters = [], []
+        if status is not None:
+            conditions.append('b.status = ?')
+            parameters.append(status)
+        if spec is not None:
+            conditions.append('b.spec_hash = ?')
+            parameters.append(spec_hash(spec))
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' GROUP BY b.id ORDER BY b.id DESC'
+        return [dict(row) for row in self._connection().execute(query, parameters)]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """Paragraphs matching an FTS5 ``query``, best match first, with a highlighted snippet."""
+
+        if self.full_text:
+            sql = (
+                "SELECT b.id AS book_id, b.title AS book, c.position + 1 AS chapter, p.position + 1 AS paragraph, "
+                "p.title, snippet(paragraphs_fts, 1, '[', ']', '...', 16) AS snippet "
+                'FROM paragraphs_fts JOIN paragraphs p ON p.id = paragraphs_fts.rowid '
+                'JOIN chapters c ON c.id = p.chapter_id JOIN books b ON b.id = p.book_id '
+                'WHERE paragraphs_fts MATCH ? ORDER BY bm25(paragraphs_fts) LIMIT ?'
+            )
+            parameters: Tuple = (query, limit)
+        else:  # pragma: no cover - SQLite built without FTS5
+            sql = (
+                'SELECT b.id AS book_id, b.title AS book, c.position + 1 AS chapter, p.position + 1 AS paragraph, '
+                'p.title, substr(p.text, 1, 160) AS snippet '
+                'FROM paragraphs p JOIN chapters c ON c.id = p.chapter_id JOIN books b ON b.id = p.book_id '
+                'WHERE p.text LIKE ? LIMIT ?'
+            )
+            parameters = (f'%{query}%', limit)
+        return [dict(row) for row in self._connection().execute(sql, parameters)]
+
+    def to_markdown(self, book_id: int) -> str:
+        """The book in the layout of :meth:`book.Book.to_markdown`."""
+
+        connection = self._connection()
+        book = self.book(book_id)
+        if book is None:
+            raise KeyError(f'No book with id {book_id}.')
+        lines = [f"# {book['title']}"]
+        if book['status'] == 'partial':
+            lines.extend(['', PARTIAL_NOTE])
+        chapters = connection.execute(
+            'SELECT id, position, title FROM chapters WHERE book_id = ? ORDER BY position', (book_id,),
+        ).fetchall()
+        for chapter in chapters:
+            lines.extend(['', f"## Chapter {chapter['position'] + 1}: {chapter['title']}", ''])
+            for paragraph in connection.execute(
+                'SELECT title, text FROM paragraphs WHERE chapter_id = ? ORDER BY position', (chapter['id'],),
+            ):
+                # Paragraphs imported from the older layout have no titles
+                if paragraph['title']:
+                    lines.extend([f"### {paragraph['title']}", ''])
+                lines.extend([paragraph['text'], ''])
+        return '\n'.join(lines).strip() + '\n'
+
+    def import_markdown(self, path: str) -> Tuple[int, bool]:
+        """Add a markdown book file and return its id and whether it was new.
+
+        A file whose content was imported before is not added again.
+        """
+
+        text = read_markdown(path)
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        existing = self._connection().execute('SELECT id FROM books WHERE digest = ?', (digest,)).fetchone()
+        if existing is not None:
+            return existing['id'], False
+
+        parsed = parse_book_markdown(text)
+        chapters = parsed['chapters']
+        modified = os.path.getmtime(path)
+        book_id = self.start_book(
+            parsed['info'],
+            parsed['title'] or os.path.splitext(os.path.basename(path))[0],
+            None,
+            chapters,
+            status='partial' if parsed['partial'] else 'imported',
+            source=os.path.abspath(path),
+            digest=digest,
+            started=modified,
+        )
+        self.add_paragraphs(book_id, [
+            (chapter_index, paragraph_index, paragraph['title'], paragraph['text'], None, None)
+            for chapter_index, chapter in enumerate(chapters)
+            for paragraph_index, paragraph in enumerate(chapter['paragraphs'])
+        ])
+        seconds = _runtime_seconds(parsed['info'].get('runtime'))
+        self._connection().execute(
+            'UPDATE books SET finished = ?, seconds = ? WHERE id = ?', (modified, seconds, book_id),
+        )
+        return book_id, True
@@ -0,0 +1,212 @@
+"""Write a book's markdown to disk paragraph by paragraph while it is generated."""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+PARTIAL_NOTE = '> **Note:** Generation stopped early; the content below is partial.'
+
+
+def book_filename(title: str, directory: str = '.', partial: bool = False, when: Optional[datetime] = None) -> str:
+    """Return ``book_<timestamp>_<title-slug>[_partial].md`` in ``directory`` that no file uses yet.
+
+    The name only depends on the time and the title; a ``-2``, ``-3`` ...
+    counter is added when a book with the same name (or its in-progress
+    ``.part`` file) already exists.
+    """
+
+    stamp = f'{when or datetime.now():%Y%m%d-%H%M%S}'
+    slug = re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')[:60] or 'untitled'
+    suffix = '_partial' if partial else ''
+    counter = 1
+    while True:
+        name = f'book_{stamp}_{slug}' + (f'-{counter}' if counter > 1 else '') + f'{suffix}.md'
+        path = os.path.join(directory, name)
+        if not os.path.exists(path) and not os.path.exists(path + '.part'):
+            return path
+        counter += 1
+
+
+def partial_path(path: str) -> str:
+    base, extension = os.path.splitext(path)
+    return f'{base}_partial{extension or ".md"}'
+
+
+def write_atomically(path: str, text: str) -> None:
+    # Write-then-rename, so readers never see a half-written book
+    temporary = f'{path}.part'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(temporary, path)
+
+
+class BookWriter:
+    """Append a book's markdown to ``<path>.part`` as paragraphs are finished.
+
+    :meth:`open` writes the title once the structure is known; :meth:`add`
+    takes finished paragraphs in any order and writes every paragraph that
+    continues the document, keeping the others until the gap is filled (this
+    only happens when chapters are generated concurrently). The file is
+    flushed at most every ``flush_interval`` seconds, so other processes see
+    the book grow, and :meth:`finish` renames it to its final name.
+
+    Without an explicit ``path`` the name comes from :func:`book_filename`.
+    A partial book is finished as ``<name>_partial.md`` with a note under the
+    title, so a batch never mistakes it for a finished output.
+    """
+
+    def __init__(self, path: Optional[str] = None, directory: str = '.', flush_interval: float = 1.0):
+        self.path = path
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.chapters: List[Dict] = []
+        self._file = None
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[int, int], str] = {}
+        # Next paragraph to write: (chapter, paragraph)
+        self._next = (0, 0)
+        self._title_bytes = 0
+        self._flushed = 0.0
+        self.finished_path: Optional[str] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def open(self, title: str, chapters: List[Dict]) -> str:
+        """Start the ``.part`` file with the book title and return the final path."""
+
+        with self._lock:
+            if self.path is None:
+                self.path = book_filename(title, self.directory)
+                mode = 'x'
+            else:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                # A .part left by a crash is rewritten from the start
+                mode = 'w'
+            self.chapters = chapters
+            self._pending.clear()
+            self._next = (0, 0)
+            self.finished_path = None
+            # Binary mode so the title offset is exact when a partial book is finished
+            self._file = open(f'{self.path}.part', mode + 'b+')
+            self._write(f'# {title}\n')
+            self._title_bytes = self._file.tell()
+            self._skip_empty_chapters()
+            return self.path
+
+    def add(self, chapter_index: int, paragraph_index: int, text: str) -> None:
+        with self._lock:
+            if self._file is None:
+                raise ValueError('BookWriter.open must be called before adding paragraphs.')
+            if (chapter_index, paragraph_index) < self._next:
+                return
+            self._pending[(chapter_index, paragraph_index)] = text
+            self._drain()
+            if time.monotonic() - self._flushed >= self.flush_interval:
+                self._file.flush()
+                self._flushed = time.monotonic()
+
+    def finish(self, partial: bool = False) -> str:
+        """Close the ``.part`` file and rename it into place, returning the final path.
+
+        A partial book also gets the unbroken run of paragraphs that each
+        chapter started, which concurrent chapters may still hold back.
+        """
+
+        with self._lock:
+            if self._file is None:
+                raise ValueError('BookWriter is not open.')
+            temporary = f'{self.path}.part'
+            if not partial:
+                self._close()
+                os.replace(temporary, self.path)
+                self.finished_path = self.path
+                return self.path
+
+            self._write_started_chapters()
+            self._close()
+            target = partial_path(self.path)
+            # The note belongs under the title, so the streamed body is copied after it
+            with open(temporary, 'rb') as source, open(f'{target}.part', 'wb') as file:
+                file.write(source.read(self._title_bytes))
+                file.write(f'\n{PARTIAL_NOTE}\n'.encode('utf-8'))
+                shutil.copyfileobj(source, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(f'{target}.part', target)
+            os.remove(temporary)
+            self.finished_path = target
+            return target
+
+    def _drain(self) -> None:
+        while self._next in self._pending:
+            chapter_index, paragraph_index = self._next
+            chapter = self.chapters[chapter_index]
+            if paragraph_index == 0:
+                self._write_chapter_title(chapter_index)
+            title = chapter['paragraphs'][paragraph_index]['title']
+            self._write(f'\n### {title}\n\n{self._pending.pop(self._next)}\n')
+            if paragraph_index + 1 < len(chapter['paragraphs']):
+                self._next = (chapter_index, paragraph_index + 1)
+            else:
+                self._next = (chapter_index + 1, 0)
+                self._skip_empty_chapters()
+
+    def _skip_empty_chapters(self) -> None:
+        chapter_index = self._next[0]
+        while chapter_index < len(self.chapters) and not self.chapters[chapter_index]['paragraphs']:
+            self._write_chapter_title(chapter_index)
+            chapter_index += 1
+        self._next = (chapter_index, 0)
+
+    def _write_started_chapters(self) -> None:
+        # Paragraphs held back behind a gap, in the order a finished book would have them
+        chapters = sorted({chapter_index for chapter_index, _ in self._pending})
+        for chapter_index in chapters:
+            start = self._next[1] if chapter_index == self._next[0] else 0
+            if start == 0:
+                self._write_chapter_title(chapter_index)
+            paragraph_index = start
+            while (chapter_index, paragraph_index) in self._pending:
+                title = self.chapters[chapter_index]['paragraphs'][paragraph_index]['title']
+                self._write(f'\n### {title}\n\n{self._pending.pop((chapter_index, paragraph_index))}\n')
+                paragraph_index += 1
+        self._pending.clear()
+
+    def _write_chapter_title(self, chapter_index: int) -> None:
+        # Same spacing as Book.to_markdown: chapters after the first follow an extra blank line
+        spacing = '\n' if chapter_index == 0 else '\n\n'
+        self._write(f'{spacing}## Chapter {chapter_index + 1}: {self.chapters[chapter_index]["title"]}\n')
+
+    def _write(self, text: str) -> None:
+        self._file.write(text.encode('utf-8'))
+
+    def _close(self) -> None:
+        # Like Book.to_markdown, end with exactly one newline even if the last paragraph had trailing space
+        self._file.flush()
+        size = self._file.tell()
+        tail_size = min(size - self._title_bytes, 4096)
+        if tail_size > 0:
+            self._file.seek(size - tail_size)
+            tail = self._file.read(tail_size)
+            self._file.seek(size - tail_size)
+            self._file.truncate()
+            self._file.write(tail.rstrip() + b'\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def close(self) -> None:
+        """Stop writing without renaming; the ``.part`` file stays for inspection."""
+
+        with self._lock:
+            if self._file is not None:
+                self._close()
@@ -0,0 +1,256 @@
+"""Limits on the number of LLM requests in flight per backend."""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterator, Optional
+
+from retry import CircuitOpenError, RetryPolicy
+
+if TYPE_CHECKING:  # pragma: no cover - imports for annotations only
+    from metrics import Metrics
+
+# Per-call cost in tokens on top of the reply (prefill, network), so short and long replies compare
+_OVERHEAD_TOKENS = 50
+# Calls faster than this are healthy whatever their jitter (caches, local fakes)
+_MIN_SECONDS = 0.05
+
+
+@dataclass
+class CallOutcome:
+    """Yielded by :meth:`ConcurrencyLimiter.slot`; set ``tokens`` to the size of the reply once known."""
+
+    tokens: Optional[float] = None
+
+
+class ConcurrencyLimiter:
+    """Cap concurrent backend calls per key (e.g. 'ollama' or 'openai').
+
+    One limiter is meant to be shared by every Book in a process, so the cap is
+    global no matter how many books or chapter workers are running. Keys
+    without an explicit limit use ``default``; ``None`` means unlimited. A key
+    such as ``'ollama:http://gpu1:11434'`` falls back to the limit of its
+    backend, ``'ollama'``, which then applies to each endpoint separately.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default: Optional[int] = None):
+        self.limits = dict(limits or {})
+        self.default = default
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def configured(self, key: str) -> Optional[int]:
+        # The limit given for the key, else for its backend, else the default
+        backend = key.partition(':')[0]
+        return self.limits.get(key, self.limits.get(backend, self.default))
+
+    def limit(self, key: str) -> Optional[int]:
+        """Requests currently allowed in flight for ``key`` (None: unlimited)."""
+
+        return self.configured(key)
+
+    def _semaphore(self, key: str) -> Optional[threading.BoundedSemaphore]:
+        limit = self.configured(key)
+        if limit is None:
+            return None
+        with self._lock:
+            if key not in self._semaphores:
+                self._semaphores[key] = threading.BoundedSemaphore(limit)
+            return self._semaphores[key]
+
+    def acquire(self, key: str) -> None:
+        semaphore = self._semaphore(key)
+        if semaphore is not None:
+            semaphore.acquire()
+
+    def release(
+        self,
+        key: str,
+        seconds: Optional[float] = None,
+        tokens: Optional[float] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        # The outcome of the call is only used by adaptive limiters
+        semaphore = self._semaphore(key)
+        if semaphore is not None:
+            semaphore.release()
+
+    @contextmanager
+    def slot(self, key: str) -> Iterator[CallOutcome]:
+        self.acquire(key)
+        outcome = CallOutcome()
+        started = time.perf_counter()
+        try:
+            yield outcome
+        except BaseException as exc:
+            self.release(key, time.perf_counter() - started, outcome.tokens, exc)
+            raise
+        self.release(key, time.perf_counter() - started, outcome.tokens)
+
+
+@dataclass
+class _KeyState:
+    limit: float
+    ceiling: int
+    in_flight: int = 0
+    waiting: int = 0
+    # Seconds per token: a slowly rising floor of healthy latency, and a short moving average
+    baseline: Optional[float] = None
+    recent: Optional[float] = None
+    # Completions to wait before the limit may be lowered again
+    hold: int = 0
+    observed_at: float = 0.0
+
+
+class AdaptiveLimiter(ConcurrencyLimiter):
+    """Tune the requests in flight per key from the latency and errors of finished calls.
+
+    The limit grows by about one per window of calls (additive increase)
+    while the backend is saturated and healthy, and shrinks by ``backoff``
+    on timeouts, rate limits and server errors (multiplicative decrease).
+    Latency is compared per token of reply: when the recent average exceeds
+    ``tolerance`` times the healthy baseline, the limit shrinks by their
+    ratio, as the backend is queueing requests. After a decrease the limit
+    holds for one window, so a single slow batch only counts once. The
+    baseline follows a lasting slowdown within ``drift_seconds``.
+
+    Explicit ``limits`` and ``default`` are ceilings (``max_limit`` without
+    them); every key starts at ``initial``. The current limit, requests in
+    flight and queue depth are reported as gauges when ``metrics`` is given.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        default: Optional[int] = None,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        tolerance: float = 1.5,
+        backoff: float = 0.7,
+        smoothing: float = 0.3,
+        drift_seconds: float = 300.0,
+        metrics: Optional['Metrics'] = None,
+    ):
+        super().__init__(limits, default)
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.drift_seconds = drift_seconds
+        self.metrics = metrics
+        self._states: Dict[str, _KeyState] = {}
+        self._changed = threading.Condition(self._lock)
+
+    def _state(self, key: str) -> _KeyState:
+        # Called with the lock held
+        state = self._states.get(key)
+        if state is None:
+            ceiling = max(self.min_limit, self.configured(key) or self.max_limit)
+            state = self._states[key] = _KeyState(limit=float(min(self.initial, ceiling)), ceiling=ceiling)
+        return state
+
+    def limit(self, key: str) -> Optional[int]:
+        with self._lock:
+            return int(self._state(key).limit)
+
+    def acquire(self, key: str) -> None:
+        with self._changed:
+            state = self._state(key)
+            state.waiting += 1
+            self._report(key, state)
+            while state.in_flight >= int(state.limit):
+                self._changed.wait()
+            state.waiting -= 1
+            state.in_flight += 1
+            self._report(key, state)
+
+    def release(self, key, seconds=None, tokens=None, error=None):
+        with self._changed:
+            state = self._state(key)
+            saturated = state.in_flight >= int(state.limit) or state.waiting > 0
+            state.in_flight -= 1
+            state.hold = max(0, state.hold - 1)
+            if error is not None:
+                if self._is_overload(error):
+                    self._decrease(key, state, self.backoff, 'error')
+            elif seconds is not None:
+                self._observe(key, state, seconds, tokens, saturated)
+            self._report(key, state)
+            self._changed.notify_all()
+
+    @staticmethod
+    def _is_overload(error: BaseException) -> bool:
+        # Timeouts, 429s, 5xx and dropped connections; bad requests say nothing about load
+        return (
+            isinstance(error, Exception) and RetryPolicy.is_retryable(error)
+            and not isinstance(error, CircuitOpenError)
+        )
+
+    def _observe(self, key: str, state: _KeyState, seconds: float, tokens: Optional[float], saturated: bool) -> None:
+        if seconds < _MIN_SECONDS:
+            self._increase(state, saturated)
+            return
+        sample = seconds / ((tokens or 0) + _OVERHEAD_TOKENS)
+        now = time.monotonic()
+        elapsed, state.observed_at = now - state.observed_at, now
+        state.recent = sample if state.recent is None else state.recent + self.smoothing * (sample - state.recent)
+        if state.baseline is None or state.recent < state.baseline or state.limit <= self.min_limit:
+            # Nothing queues behind a single request, so latency at the minimum limit is the healthy one
+            state.baseline = state.recent
+        else:
+            # Drift up over drift_seconds, so a backend that got slower for good is not treated as overloaded forever
+            state.baseline += min(1.0, elapsed / self.drift_seconds) * (state.recent - state.baseline)
+
+        ratio = state.recent / state.baseline if state.baseline > 0 else 1.0
+        if ratio > self.tolerance:
+            self._decrease(key, state, max(0.5, self.tolerance / ratio), 'latency')
+        else:
+            self._increase(state, saturated)
+
+    @staticmethod
+    def _increase(state: _KeyState, saturated: bool) -> None:
+        # Only grow while the current limit is in use; an idle limit proves nothing
+        if saturated and state.limit < state.ceiling:
+            state.limit = min(float(state.ceiling), state.limit + 1 / state.limit)
+
+    def _decrease(self, key: str, state: _KeyState, factor: float, reason: str) -> None:
+        if state.hold:
+            return
+        state.limit = max(float(self.min_limit), state.limit * factor)
+        state.hold = math.ceil(state.limit)
+        if self.metrics is not None:
+            self.metrics.inc('llm_concurrency_decreases_total', key=key, reason=reason)
+
+    def _report(self, key: str, state: _KeyState) -> None:
+        if self.metrics is None:
+            return
+        self.metrics.set_gauge('llm_concurrency_limit', int(state.limit), key=key)
+        self.metrics.set_gauge('llm_requests_in_flight', state.in_flight, key=key)
+        self.metrics.set_gauge('llm_queue_depth', state.waiting, key=key)
+
+
+def limiter_from_env(
+    limits: Optional[Dict[str, int]] = None,
+    default: Optional[int] = None,
+    metrics: Optional['Metrics'] = None,
+) -> ConcurrencyLimiter:
+    """An :class:`AdaptiveLimiter` below ``limits``, or fixed limits with ``BOOKGPT_CONCURRENCY=fixed``."""
+
+    if os.getenv('BOOKGPT_CONCURRENCY', 'adaptive').lower() == 'fixed':
+        # Without a default, fixed limits keep the former cap of 4 per backend
+        return ConcurrencyLimiter(limits, 4 if default is None else default)
+    return AdaptiveLimiter(
+        limits,
+        default,
+        initial=int(os.getenv('BOOKGPT_CONCURRENCY_INITIAL', 4)),
+        max_limit=int(os.getenv('BOOKGPT_CONCURRENCY_MAX', 32)),
+        metrics=metrics,
+    )
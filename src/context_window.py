@@ -0,0 +1,118 @@
+"""Bounded conversation memory for paragraph prompts."""
+
+from __future__ import annotations
+
+import re
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+_SENTENCE = re.compile(r'\S.*?(?:[.!?…]+["\')\]”’]*(?=\s|$)|$)', re.DOTALL)
+
+# Rough characters-per-token ratio shared by the OpenAI and Llama tokenizers for English prose
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def count_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    # Every message carries a few tokens of role/formatting overhead
+    return sum(estimate_tokens(message['content']) + 4 for message in messages)
+
+
+def default_command(chapter_index: int, paragraph_index: int) -> str:
+    return f'!w {chapter_index + 1} {paragraph_index + 1}'
+
+
+class ContextWindow:
+    """Keep the base prompt plus a rolling window of recent paragraphs within a token budget.
+
+    Paragraphs that fall out of the window are replaced by short summaries
+    produced by ``summarize(chapter_index, paragraph_index, text)``. With
+    ``budget`` set to None nothing is evicted, which reproduces the old
+    ever-growing conversation.
+
+    Every eviction changes the prompt right after the base prompt, which
+    throws away the server's cached prefill of everything behind it. Once
+    the budget is exceeded the window therefore shrinks to ``low_water``
+    times the budget, so the prompt grows unchanged for several paragraphs
+    before the next eviction. ``command(chapter_index, paragraph_index)``
+    renders the user turn of each paragraph and should match what was sent.
+    """
+
+    def __init__(
+        self,
+        base_prompt: List[Dict[str, str]],
+        budget: Optional[int],
+        summarize: Callable[[int, int, str], str],
+        low_water: float = 0.75,
+        command: Callable[[int, int], str] = default_command,
+    ):
+        self.base_prompt = base_prompt
+        self.budget = budget
+        self.summarize = summarize
+        self.low_water = low_water
+        self.command = command
+        self.summaries: Deque[str] = deque()
+        self.recent: Deque[Tuple[int, int, str]] = deque()
+        self._base_tokens = count_prompt_tokens(base_prompt)
+        self._summary_tokens = 0
+        self._recent_tokens = 0
+
+    @property
+    def tokens(self) -> int:
+        return self._base_tokens + self._summary_tokens + self._recent_tokens
+
+    def add(self, chapter_index: int, paragraph_index: int, text: str) -> None:
+        self.recent.append((chapter_index, paragraph_index, text))
+        self._recent_tokens += self._paragraph_tokens(chapter_index, paragraph_index, text)
+        self._compact()
+
+    def messages(self) -> List[Dict[str, str]]:
+        messages = list(self.base_prompt)
+        if self.summaries:
+            messages.append({
+                'role': 'system',
+                'content': 'Summary of the earlier paragraphs of this chapter:\n' + '\n'.join(self.summaries),
+            })
+        for chapter_index, paragraph_index, text in self.recent:
+            messages.append({'role': 'user', 'content': self.command(chapter_index, paragraph_index)})
+            messages.append({'role': 'assistant', 'content': text})
+        return messages
+
+    def _compact(self) -> None:
+        if self.budget is None or self.tokens <= self.budget:
+            return
+
+        # The most recent paragraph always stays verbatim so transitions remain smooth
+        target = int(self.budget * self.low_water)
+        while self.tokens > target and len(self.recent) > 1:
+            chapter_index, paragraph_index, text = self.recent.popleft()
+            self._recent_tokens -= self._paragraph_tokens(chapter_index, paragraph_index, text)
+            summary = f'Paragraph {paragraph_index + 1}: {self.summarize(chapter_index, paragraph_index, text).strip()}'
+            self.summaries.append(summary)
+            self._summary_tokens += estimate_tokens(summary) + 1
+
+        # If even the summaries no longer fit, forget the oldest ones first
+        while self.tokens > self.budget and self.summaries:
+            self._summary_tokens -= estimate_tokens(self.summaries.popleft()) + 1
+
+    def _paragraph_tokens(self, chapter_index: int, paragraph_index: int, text: str) -> int:
+        return count_prompt_tokens([
+            {'content': self.command(chapter_index, paragraph_index)},
+            {'content': text},
+        ])
+
+
+def extractive_summary(text: str) -> str:
+    """Cheap fallback summary: the first and last sentence of the paragraph."""
+
+    sentences = [sentence.strip() for sentence in text.replace('\n', ' ').split('. ') if sentence.strip()]
+    if len(sentences) <= 2:
+        return ' '.join(sentences)
+    return f"{sentences[0].rstrip('.')}. {sentences[-1].rstrip('.')}."
+
+
+def split_sentences(text: str) -> List[str]:
+    return _SENTENCE.findall(text)
@@ -0,0 +1,277 @@
+"""Pre-flight token, time and cost estimates for a book, learned from earlier runs."""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import TYPE_CHECKING, Dict, Optional
+
+from context_window import count_prompt_tokens
+from metrics import Metrics
+
+if TYPE_CHECKING:  # pragma: no cover - imports for annotations only
+    from book import Book
+
+_DEFAULT_PATH = '.bookgpt_throughput.json'
+# Weight of the newest run when the learned profile is updated
+_SMOOTHING = 0.3
+# Tokens of the '!w' command, or of a handoff note, added to each paragraph prompt
+_COMMAND_TOKENS = 12
+_HANDOFF_TOKENS = 80
+
+# USD per 1K prompt and completion tokens; BOOKGPT_PRICES='{"model": [prompt, completion]}' adds or overrides
+PRICES = {
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+    'gpt-4': (0.03, 0.06),
+    'gpt-4-turbo': (0.01, 0.03),
+    'gpt-4o': (0.005, 0.015),
+    'gpt-4o-mini': (0.00015, 0.0006),
+}
+
+
+def price_per_1k(model: str) -> Optional[tuple]:
+    prices = dict(PRICES)
+    try:
+        prices.update({name: tuple(value) for name, value in json.loads(os.getenv('BOOKGPT_PRICES', '{}')).items()})
+    except ValueError:
+        pass
+    # Dated snapshots such as gpt-4o-2024-05-13 use the price of their family
+    for name in sorted(prices, key=len, reverse=True):
+        if model == name or model.startswith(name + '-'):
+            return prices[name]
+    return None
+
+
+@dataclass
+class Profile:
+    """Throughput of one backend/model/endpoint, averaged over earlier runs (defaults before the first)."""
+
+    tokens_per_word: float = 1.35
+    # Paragraph requests plus continuations, summaries and smoothing, per paragraph
+    calls_per_paragraph: float = 1.2
+    tokens_per_second: float = 30.0
+    # Prefill, network and queueing per call, on top of generation
+    seconds_per_call: float = 1.0
+    # Measured / predicted prompt tokens; corrects the context-window approximation
+    prompt_ratio: float = 1.0
+    # Fraction of each extra worker that turns into speed-up
+    parallel_efficiency: float = 0.6
+    runs: int = 0
+
+
+@dataclass
+class Estimate:
+    key: str
+    paragraphs: int
+    words: int
+    calls: float
+    # Prompt tokens of one request per paragraph, before the learned corrections
+    paragraph_prompt_tokens: float
+    prompt_tokens: float
+    completion_tokens: float
+    # Sum of the duration of every call, and the expected wall-clock time at `concurrency`
+    call_seconds: float
+    wall_seconds: float
+    concurrency: int
+    cost_usd: Optional[float]
+    runs: int
+
+    def summary(self) -> str:
+        cost = f', about ${self.cost_usd:.2f}' if self.cost_usd is not None else ''
+        basis = f'{self.runs} earlier run(s)' if self.runs else 'default throughput, no earlier runs'
+        return (
+            f'Estimate: {self.paragraphs} paragraphs ({self.words} words), {self.calls:.0f} calls, '
+            f'{self.prompt_tokens:,.0f} prompt and {self.completion_tokens:,.0f} completion tokens, '
+            f'{_duration(self.wall_seconds)} at concurrency {self.concurrency}{cost} (based on {basis}).'
+        )
+
+
+def _duration(seconds: float) -> str:
+    if seconds < 120:
+        return f'{seconds:.0f}s'
+    if seconds < 7200:
+        return f'{seconds / 60:.0f} min'
+    return f'{seconds / 3600:.1f} h'
+
+
+def usage_totals(metrics: Metrics) -> Dict[str, float]:
+    """Counters the estimate is compared with; take one before and one after generation."""
+
+    return {
+        'calls': metrics.total('llm_calls_total'),
+        'prompt_tokens': metrics.total('llm_prompt_tokens'),
+        'completion_tokens': metrics.total('llm_completion_tokens'),
+        'call_seconds': metrics.total('llm_call_seconds'),
+        'generation_seconds': metrics.total('llm_generation_seconds'),
+        'time': time.perf_counter(),
+    }
+
+
+class ThroughputHistory:
+    """Learned :class:`Profile` per ``backend|model|endpoint`` key, stored as JSON.
+
+    The file is rewritten atomically after each run, so several processes
+    may share it; the last writer wins for a key both updated.
+    """
+
+    def __init__(self, path: str = _DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional['ThroughputHistory']:
+        path = os.getenv('BOOKGPT_THROUGHPUT', _DEFAULT_PATH)
+        if path.lower() in {'', '0', 'off', 'none'}:
+            return None
+        return cls(path)
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def profile(self, key: str) -> Profile:
+        known = {field.name for field in fields(Profile)}
+        stored = self._load().get(key, {})
+        return Profile(**{name: value for name, value in stored.items() if name in known})
+
+    def record(self, estimate: Estimate, before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+        """Fold the measured run into the profile and return the relative error of each estimate.
+
+        An error of +0.25 means the run used 25% more than estimated.
+        """
+
+        actual = {name: after[name] - before[name] for name in before}
+        wall = actual.pop('time')
+        errors = {
+            'calls': _error(actual['calls'], estimate.calls),
+            'prompt_tokens': _error(actual['prompt_tokens'], estimate.prompt_tokens),
+            'completion_tokens': _error(actual['completion_tokens'], estimate.completion_tokens),
+            'wall_seconds': _error(wall, estimate.wall_seconds),
+        }
+        # Cached responses make no calls; such a run says nothing about throughput
+        if actual['calls'] < 1 or estimate.paragraphs < 1:
+            return errors
+
+        calls = actual['calls']
+        observed = {
+            'tokens_per_word': actual['completion_tokens'] / max(1, estimate.words),
+            'calls_per_paragraph': calls / estimate.paragraphs,
+            'seconds_per_call': max(0.0, actual['call_seconds'] - actual['generation_seconds']) / calls,
+        }
+        if actual['generation_seconds'] > 0:
+            observed['tokens_per_second'] = actual['completion_tokens'] / actual['generation_seconds']
+        if estimate.paragraph_prompt_tokens > 0:
+            observed['prompt_ratio'] = (
+                actual['prompt_tokens'] / (estimate.paragraph_prompt_tokens * observed['calls_per_paragraph'])
+            )
+        if estimate.concurrency > 1 and wall > 0:
+            speedup = actual['call_seconds'] / wall
+            observed['parallel_efficiency'] = min(1.0, max(0.0, (speedup - 1) / (estimate.concurrency - 1)))
+
+        with self._lock:
+            data = self._load()
+            profile = self.profile(estimate.key)
+            # The first run replaces the defaults outright
+            weight = 1.0 if profile.runs == 0 else _SMOOTHING
+            values = asdict(profile)
+            for name, value in observed.items():
+                values[name] = (1 - weight) * values[name] + weight * value
+            values['runs'] = profile.runs + 1
+            data[estimate.key] = values
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as file:
+                json.dump(data, file, indent=2, sort_keys=True)
+            os.replace(temporary, self.path)
+        return errors
+
+
+def _error(actual: float, estimated: float) -> float:
+    return (actual - estimated) / estimated if estimated else 0.0
+
+
+def format_errors(errors: Dict[str, float]) -> str:
+    return 'Actual vs. estimate: ' + ', '.join(f'{name} {value:+.0%}' for name, value in errors.items()) + '.'
+
+
+def throughput_key(book: 'Book') -> str:
+    endpoint = book.ollama_client.base_url if book.llm_backend == 'ollama' else ''
+    return f'{book.llm_backend}|{book.model_name}|{endpoint}'
+
+
+def estimate_book(book: 'Book', history: Optional[ThroughputHistory] = None) -> Estimate:
+    """Predict what :meth:`Book.get_content` will use, once the outline is known.
+
+    Prompt sizes follow the book's context settings: each paragraph sees the
+    base prompt plus the earlier paragraphs of its chapter, capped at the
+    context budget, or only a handoff note in draft mode.
+    """
+
+    if not hasattr(book, 'chapters'):
+        raise ValueError('Structure not generated yet.')
+
+    key = throughput_key(book)
+    profile = history.profile(key) if history is not None else Profile()
+    base = count_prompt_tokens(book.base_prompt)
+    if not book._base_finished:
+        # finish_base adds the title and structure
+        base += count_prompt_tokens([{'content': book.title}, {'content': book.structure}]) + 8
+
+    # Paragraphs restored from a journal cost nothing, but still fill the context of later ones
+    paragraphs = 0
+    words = 0
+    prompt_tokens = 0.0
+    for chapter_index, chapter in enumerate(book.paragraph_words):
+        context = 0.0
+        for paragraph_index, paragraph_words in enumerate(chapter):
+            if (chapter_index, paragraph_index) not in book._journaled_paragraphs:
+                paragraphs += 1
+                words += paragraph_words
+                if book.paragraph_workers > 1:
+                    prompt = base + _HANDOFF_TOKENS
+                else:
+                    prompt = base + context + _COMMAND_TOKENS
+                    if book.context_budget:
+                        prompt = min(prompt, max(base, book.context_budget))
+                prompt_tokens += prompt
+            context += paragraph_words * profile.tokens_per_word + _COMMAND_TOKENS
+    calls = paragraphs * profile.calls_per_paragraph
+    # Extra calls (continuations, summaries) carry prompts of about the same size
+    total_prompt_tokens = prompt_tokens * profile.calls_per_paragraph * profile.prompt_ratio
+    completion_tokens = words * profile.tokens_per_word
+
+    call_seconds = calls * profile.seconds_per_call + completion_tokens / max(profile.tokens_per_second, 1e-6)
+    chapters = len(book.paragraph_amounts)
+    widest = max(book.paragraph_amounts, default=1)
+    concurrency = max(1, min(book.max_workers, chapters) * min(book.paragraph_workers, widest))
+    limit = book.request_limit()
+    if limit:
+        concurrency = min(concurrency, limit)
+    speedup = 1 + (concurrency - 1) * profile.parallel_efficiency
+
+    prices = price_per_1k(book.model_name) if book.llm_backend == 'openai' else None
+    cost = None
+    if prices is not None:
+        cost = total_prompt_tokens / 1000 * prices[0] + completion_tokens / 1000 * prices[1]
+    elif book.llm_backend != 'openai':
+        cost = 0.0
+
+    return Estimate(
+        key=key,
+        paragraphs=paragraphs,
+        words=words,
+        calls=calls,
+        paragraph_prompt_tokens=prompt_tokens,
+        prompt_tokens=total_prompt_tokens,
+        completion_tokens=completion_tokens,
+        call_seconds=call_seconds,
+        wall_seconds=call_seconds / speedup,
+        concurrency=concurrency,
+        cost_usd=cost,
+        runs=profile.runs,
+    )
@@ -0,0 +1,214 @@
+"""Chunked, parallel HTML and MP3 export of a finished book, with a per-chunk cache."""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Deque, Iterator, List, Optional
+
+from utils import get_html, get_mp3
+
+_DEFAULT_CACHE_DIR = '.bookgpt_export_cache'
+# Stay well below what a TTS request comfortably takes; paragraphs are never split
+_DEFAULT_MAX_CHARS = 3000
+
+# Text-to-speech engine: (text, language) -> MP3 bytes
+TTSEngine = Callable[[str, str], bytes]
+
+_LANGUAGE_CODES = {
+    'english': 'en', 'german': 'de', 'deutsch': 'de', 'french': 'fr', 'spanish': 'es', 'italian': 'it',
+    'portuguese': 'pt', 'dutch': 'nl', 'russian': 'ru', 'chinese': 'zh-CN', 'japanese': 'ja', 'korean': 'ko',
+}
+_MARKUP = re.compile(r'^\s*(?:#+|>)\s*|[*_`]+', re.MULTILINE)
+
+
+def gtts_engine(text: str, language: str) -> bytes:
+    """The default engine: Google Text-to-Speech through ``utils.get_mp3``."""
+
+    buffer = io.BytesIO()
+    get_mp3(text, language).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+def tts_language(language: str) -> str:
+    """Map a book language such as "English" to the code gTTS expects; codes pass through."""
+
+    return _LANGUAGE_CODES.get(language.strip().lower(), language.strip())
+
+
+def speech_text(chunk: str) -> str:
+    # Headings, quotes and emphasis markers would be read out literally
+    return _MARKUP.sub('', chunk).strip()
+
+
+def split_chunks(markdown: str, max_chars: int = _DEFAULT_MAX_CHARS) -> List[str]:
+    """Split a book at blank lines into chunks of whole paragraphs.
+
+    A heading always starts a new chunk, so a chapter never shares a chunk
+    with the one before it, and small paragraphs are merged up to
+    ``max_chars``. Editing one paragraph therefore changes one chunk.
+    """
+
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for block in re.split(r'\n\s*\n', markdown):
+        block = block.strip()
+        if not block:
+            continue
+        if current and (block.startswith('#') or size + len(block) > max_chars):
+            chunks.append('\n\n'.join(current))
+            current, size = [], 0
+        current.append(block)
+        size += len(block) + 2
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+class ChunkCache:
+    """Rendered chunks stored as files named by the hash of their input."""
+
+    def __init__(self, directory: str = _DEFAULT_CACHE_DIR):
+        self.directory = directory
+
+    @staticmethod
+    def make_key(kind: str, *parts: str) -> str:
+        digest = hashlib.sha256(kind.encode('utf-8'))
+        for part in parts:
+            digest.update(b'\0' + part.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename, so an interrupted export never leaves a truncated chunk behind
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+
+@dataclass
+class ExportResult:
+    path: str
+    chunks: int
+    cached: int
+    seconds: float
+
+
+class Exporter:
+    """Render or synthesize a book chunk by chunk on a thread pool.
+
+    Chunks are written to ``<path>.part`` in book order as soon as they and
+    every chunk before them are ready, with at most ``2 * max_workers`` in
+    flight, and the file is renamed to ``path`` at the end. Finished chunks
+    stay in the cache, so an export that fails halfway, or one after a
+    paragraph was edited, only redoes the missing chunks.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        cache: Optional[ChunkCache] = None,
+        tts: Optional[TTSEngine] = None,
+        tts_name: Optional[str] = None,
+        max_chars: int = _DEFAULT_MAX_CHARS,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.cache = cache
+        self.tts = tts or gtts_engine
+        # Part of the cache key, so audio from another engine is never reused
+        self.tts_name = tts_name or getattr(self.tts, '__name__', type(self.tts).__name__)
+        self.max_chars = max_chars
+
+    def export_html(self, markdown: str, path: str) -> ExportResult:
+        def render(chunk: str) -> bytes:
+            return get_html(chunk).encode('utf-8')
+
+        return self._export(markdown, path, 'html', render, separator=b'\n')
+
+    def export_mp3(self, markdown: str, path: str, language: str = 'en') -> ExportResult:
+        language = tts_language(language)
+
+        def synthesize(chunk: str) -> bytes:
+            return self.tts(speech_text(chunk), language)
+
+        # MP3 frames are self-contained, so the chunks can simply be concatenated
+        return self._export(markdown, path, f'mp3:{self.tts_name}:{language}', synthesize)
+
+    def _export(
+        self,
+        markdown: str,
+        path: str,
+        kind: str,
+        convert: Callable[[str], bytes],
+        separator: bytes = b'',
+    ) -> ExportResult:
+        started = time.perf_counter()
+        chunks = split_chunks(markdown, self.max_chars)
+        cached = 0
+        lock = threading.Lock()
+
+        def run(chunk: str) -> bytes:
+            nonlocal cached
+            key = ChunkCache.make_key(kind, chunk)
+            if self.cache is not None:
+                data = self.cache.get(key)
+                if data is not None:
+                    with lock:
+                        cached += 1
+                    return data
+            data = convert(chunk)
+            if self.cache is not None:
+                self.cache.put(key, data)
+            return data
+
+        temporary = f'{path}.part'
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        try:
+            with open(temporary, 'wb') as file:
+                for index, data in enumerate(self._ordered(run, chunks)):
+                    if index and separator:
+                        file.write(separator)
+                    file.write(data)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        os.replace(temporary, path)
+        return ExportResult(path, len(chunks), cached, time.perf_counter() - started)
+
+    def _ordered(self, function: Callable[[str], bytes], chunks: List[str]) -> Iterator[bytes]:
+        """Yield results in input order while keeping a bounded number of chunks in flight."""
+
+        window = 2 * self.max_workers
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='export') as executor:
+            pending: Deque[Future] = deque()
+            try:
+                for chunk in chunks:
+                    pending.append(executor.submit(function, chunk))
+                    if len(pending) >= window:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # On a failure, do not start chunks that were only queued
+                for future in pending:
+                    future.cancel()
@@ -0,0 +1,167 @@
+"""Background book generation on a worker pool shared by every session of the Streamlit app."""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from book import Book
+from book_store import BookStore
+from concurrency import ConcurrencyLimiter
+from estimator import Estimate, ThroughputHistory, estimate_book, usage_totals
+from metrics import Metrics
+from response_cache import ResponseCache
+
+FINISHED = ('done', 'failed')
+
+
+@dataclass
+class GenerationJob:
+    """One book being written in the background; read by the session that submitted it on every rerun."""
+
+    job_id: str
+    kwargs: Dict
+    status: str = 'queued'
+    # Step currently streamed ('title', 'structure' or '<chapter>.<paragraph>') and its text so far
+    step: Optional[str] = None
+    text: str = ''
+    metrics: Metrics = field(default_factory=Metrics)
+    book: Optional[Book] = None
+    markdown: Optional[str] = None
+    error: Optional[str] = None
+    saved_path: Optional[str] = None
+    # Predicted usage once the outline exists, and the relative error of each prediction once the book is done
+    estimate: Optional[Estimate] = None
+    estimate_errors: Optional[Dict[str, float]] = None
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    def on_token(self, step: str, token: str) -> None:
+        # Only the current step is kept; earlier paragraphs are part of the book once it is done
+        if step != self.step:
+            self.step = step
+            self.text = token
+        else:
+            self.text += token
+
+    @property
+    def progress(self) -> Tuple[int, int]:
+        """Paragraphs written and paragraphs planned, (0, 0) until the outline exists."""
+
+        book = self.book
+        if book is None or not getattr(book, 'chapters', None):
+            return 0, 0
+        return book.status, book.calculate_max_status()
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+
+class JobManager:
+    """Run book jobs on ``max_jobs`` worker threads shared by all sessions.
+
+    Every job's requests go through one ``limiter``, so concurrent sessions
+    cannot overload the backend, and share the optional response ``cache``,
+    the throughput ``history`` used for estimates and the book ``store``.
+    Finished jobs are kept until ``keep_finished`` newer ones have finished.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = 2,
+        limiter: Optional[ConcurrencyLimiter] = None,
+        cache: Optional[ResponseCache] = None,
+        keep_finished: int = 50,
+        structure_attempts: int = 3,
+        history: Optional[ThroughputHistory] = None,
+        store: Optional[BookStore] = None,
+    ):
+        self.limiter = limiter
+        self.store = store
+        self.cache = cache
+        self.history = history
+        self.keep_finished = keep_finished
+        self.structure_attempts = structure_attempts
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix='book-job')
+        self._jobs: 'OrderedDict[str, GenerationJob]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kwargs: Dict) -> GenerationJob:
+        job = GenerationJob(uuid.uuid4().hex, dict(kwargs))
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job: GenerationJob) -> int:
+        """Number of jobs submitted earlier that are still waiting for a worker."""
+
+        with self._lock:
+            queued = [other for other in self._jobs.values() if other.status == 'queued']
+        return sum(other.created < job.created for other in queued)
+
+    def jobs(self) -> List[GenerationJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: GenerationJob) -> None:
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            job.book = Book(
+                **job.kwargs,
+                on_token=job.on_token,
+                metrics=job.metrics,
+                limiter=self.limiter,
+                cache=self.cache,
+                store=self.store,
+            )
+            job.book.get_title()
+            job.book.ensure_structure(self.structure_attempts)
+            job.book.finish_base()
+            job.estimate = estimate_book(job.book, self.history)
+            before = usage_totals(job.metrics)
+            job.book.get_content()
+            job.markdown = job.book.to_markdown()
+            if self.history is not None:
+                job.estimate_errors = self.history.record(job.estimate, before, usage_totals(job.metrics))
+        except Exception as exc:  # pragma: no cover - network/runtime failure
+            job.error = str(exc)
+            book = job.book
+            if book is not None and hasattr(book, 'content'):
+                job.markdown = book.to_markdown()
+                job.saved_path = book.last_saved_path
+            job.status = 'failed'
+        else:
+            job.status = 'done'
+        finally:
+            # The server process is long-lived; a finished or failed job must not keep its files open
+            if job.book is not None:
+                job.book.close()
+            job.finished = time.time()
+            with self._lock:
+                self._prune()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if 'ollama_client' in sys.modules:
+            # Jobs share the process-wide Ollama client; stop its sessions and health checks with them
+            sys.modules['ollama_client'].close_default_client()
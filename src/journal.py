@@ -0,0 +1,50 @@
+"""Append-only journal of completed generation steps, used to resume a book."""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+
+class GenerationJournal:
+    """Write one JSON line per completed step and fsync it before returning.
+
+    Record types are ``spec`` (the Book keyword arguments), ``title``,
+    ``structure``, ``part`` (one model response for a paragraph, the first one
+    or a continuation), ``paragraph`` (the finished paragraph), ``summary``
+    (the context-window summary of a paragraph) and ``stall`` (a paragraph
+    that stopped short because its continuations repeated themselves or hit
+    the cap).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, kind: str, **fields) -> None:
+        line = json.dumps({'type': kind, 'time': time.time(), **fields}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    @staticmethod
+    def read(path: str) -> List[Dict]:
+        """Return all intact records; a line cut short by a crash is ignored."""
+
+        records = []
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        return records
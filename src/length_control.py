@@ -0,0 +1,165 @@
+"""Token budgets and stop conditions that steer paragraphs to their target length."""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+# Typical for English prose with the GPT and Llama tokenizers; refined per model as calls complete
+_DEFAULT_WORDS_PER_TOKEN = 0.75
+
+_SENTENCE_END = re.compile(r'[.!?…]["\')\]»”’]*\s*$')
+_WORD = re.compile(r'\S+\s*')
+_NOT_ALPHANUMERIC = re.compile(r'\W+')
+
+# Polynomial rolling hash over per-word hashes, modulo a Mersenne prime
+_HASH_BASE = 1_000_003
+_HASH_MODULUS = (1 << 61) - 1
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+class LengthController:
+    """Translate word targets into max-token limits and decide when a paragraph is long enough.
+
+    The words-per-token ratio is learned per model from the token counts the
+    backend reports, as an exponential moving average. ``headroom`` leaves
+    space for the model to finish its sentence, and streams are cut off at
+    the first sentence end after the target, or at ``overshoot`` times the
+    target at the latest.
+    """
+
+    def __init__(
+        self,
+        headroom: float = 1.25,
+        overshoot: float = 1.15,
+        smoothing: float = 0.2,
+        min_tokens: int = 32,
+    ):
+        self.headroom = headroom
+        self.overshoot = overshoot
+        self.smoothing = smoothing
+        self.min_tokens = min_tokens
+        self._ratios: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def words_per_token(self, model: str) -> float:
+        with self._lock:
+            return self._ratios.get(model, _DEFAULT_WORDS_PER_TOKEN)
+
+    def observe(self, model: str, text: str, completion_tokens: Optional[float]) -> None:
+        """Update the model's ratio from a finished reply and its reported token count."""
+
+        words = count_words(text)
+        if not completion_tokens or words < 20:
+            # Very short replies say more about formatting than about the tokenizer
+            return
+        # Clamp so one odd reply (code, lists, another language) cannot skew every later budget
+        ratio = min(1.5, max(0.3, words / completion_tokens))
+        with self._lock:
+            previous = self._ratios.get(model)
+            self._ratios[model] = ratio if previous is None else previous + self.smoothing * (ratio - previous)
+
+    def max_tokens(self, model: str, words: int) -> int:
+        return max(self.min_tokens, math.ceil(words / self.words_per_token(model) * self.headroom))
+
+    def cutoff(self, words: int) -> 'StreamCutoff':
+        return StreamCutoff(words, self.overshoot)
+
+    @staticmethod
+    def is_underrun(text: str, words: int, tolerance: float) -> bool:
+        return count_words(text) < int(words * tolerance)
+
+
+class StreamCutoff:
+    """Count the words of a streamed reply token by token and tell when to stop reading.
+
+    The stream stops at the first sentence end once ``words`` are written,
+    or at ``overshoot`` times ``words`` regardless of punctuation.
+    """
+
+    def __init__(self, words: int, overshoot: float):
+        self.words = words
+        self.limit = words * overshoot
+        self.written = 0
+        self._in_word = False
+        self._tail = ''
+
+    def feed(self, token: str) -> bool:
+        if not token:
+            return False
+        pieces = token.split()
+        if pieces:
+            # A token that continues the previous word does not start a new one
+            self.written += len(pieces) - (1 if self._in_word and not token[0].isspace() else 0)
+        self._in_word = not token[-1].isspace()
+        self._tail = (self._tail + token)[-16:]
+        if self.written >= self.limit:
+            return True
+        return self.written >= self.words and bool(_SENTENCE_END.search(self._tail))
+
+
+class RepetitionFilter:
+    """Drop text a paragraph already contains, across the first reply and its continuations.
+
+    Every window of ``n`` consecutive words is hashed incrementally with a
+    rolling hash (case and punctuation ignored). A window seen before marks
+    its words as repeated, and :meth:`add` returns the reply without them,
+    so only novel words reach the paragraph and count toward its target.
+    Repeats inside a single reply are caught too. ``n=0`` disables the filter.
+    """
+
+    def __init__(self, n: int = 8):
+        self.n = n
+        self._seen: Set[int] = set()
+        # Word hashes of the last n words, and the hash of the window they form
+        self._window: List[int] = []
+        self._hash = 0
+        self._drop_oldest = pow(_HASH_BASE, max(n - 1, 0), _HASH_MODULUS)
+        self.repeated_words = 0
+
+    def _push(self, word: str) -> Optional[int]:
+        """Slide the window over ``word`` and return its hash once it holds ``n`` words."""
+
+        value = hash(_NOT_ALPHANUMERIC.sub('', word.lower()) or word) % _HASH_MODULUS
+        if len(self._window) == self.n:
+            self._hash = (self._hash - self._window.pop(0) * self._drop_oldest) % _HASH_MODULUS
+        self._window.append(value)
+        self._hash = (self._hash * _HASH_BASE + value) % _HASH_MODULUS
+        return self._hash if len(self._window) == self.n else None
+
+    def add(self, text: str) -> Tuple[str, int]:
+        """Return ``text`` without its repeated spans, and the number of novel words in it."""
+
+        tokens = _WORD.findall(text)
+        if self.n <= 0:
+            return text, len(tokens)
+
+        repeated = [False] * len(tokens)
+        for index, token in enumerate(tokens):
+            window_hash = self._push(token)
+            if window_hash is None:
+                continue
+            if window_hash in self._seen:
+                # Only the words of this reply can be dropped; the window may reach into earlier text
+                for covered in range(max(0, index - self.n + 1), index + 1):
+                    repeated[covered] = True
+            self._seen.add(window_hash)
+
+        kept = [token for token, drop in zip(tokens, repeated) if not drop]
+        self.repeated_words += len(tokens) - len(kept)
+        leading = text[:len(text) - len(text.lstrip())]
+        return leading + ''.join(kept), len(kept)
+
+
+_default_controller = LengthController()
+
+
+def get_default_controller() -> LengthController:
+    """Return the process-wide controller, so every Book shares what it learned about each model."""
+
+    return _default_controller
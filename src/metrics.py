@@ -0,0 +1,227 @@
+"""Per-stage timing spans and token counters with JSON trace and Prometheus export."""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+_PREFIX = 'bookgpt'
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: int
+    parent_id: Optional[int]
+    thread_id: int
+    start: float
+    end: Optional[float] = None
+    attributes: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+
+def _labels(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape_label(value: str) -> str:
+    # The exposition format escapes backslashes, double quotes and line feeds in label values
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels) + '}'
+
+
+class Metrics:
+    """Collect spans, counters, summaries and gauges for one or more books.
+
+    Spans nest per thread, so a ``paragraph`` span opened inside a ``chapter``
+    span on the same worker records it as its parent. Every finished span is
+    also observed as ``bookgpt_span_seconds{name=...}``.
+    """
+
+    def __init__(self, max_spans: int = 100_000):
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.summaries: Dict[str, Dict[LabelKey, List[float]]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        stack = self._stack()
+        span = Span(
+            name=name,
+            span_id=next(self._ids),
+            parent_id=stack[-1].span_id if stack else None,
+            thread_id=threading.get_ident(),
+            start=time.perf_counter(),
+            attributes=attributes,
+        )
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.attributes['error'] = type(exc).__name__
+            raise
+        finally:
+            stack.pop()
+            span.end = time.perf_counter()
+            with self._lock:
+                self.spans.append(span)
+            self.observe('span_seconds', span.duration, name=name)
+
+    def current_span(self) -> Optional[Span]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def inc(self, metric: str, value: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(metric, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, metric: str, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            # [count, sum]
+            series = self.summaries.setdefault(metric, {}).setdefault(key, [0, 0.0])
+            series[0] += 1
+            series[1] += value
+
+    def set_gauge(self, metric: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges.setdefault(metric, {})[_labels(labels)] = value
+
+    def total(self, metric: str, **labels) -> float:
+        """Sum of a counter, or of a summary's observed values, over the label sets matching ``labels``."""
+
+        wanted = set(_labels(labels))
+        with self._lock:
+            if metric in self.counters:
+                values = self.counters[metric].items()
+            else:
+                values = ((key, total) for key, (_, total) in self.summaries.get(metric, {}).items())
+            return sum(value for key, value in values if wanted <= set(key))
+
+    def progress(self) -> Dict[str, float]:
+        """Headline numbers for progress displays (tqdm, Streamlit)."""
+
+        calls = self.total('llm_calls_total')
+        paragraph_calls = self.total('llm_calls_total', kind='paragraph') + self.total('llm_calls_total', kind='continuation')
+        completion = self.total('llm_completion_tokens')
+        generation_seconds = self.total('llm_generation_seconds')
+        paragraphs = self.total('paragraphs_total')
+        return {
+            'calls': calls,
+            'prompt_tokens': self.total('llm_prompt_tokens'),
+            'completion_tokens': completion,
+            'tokens_per_second': completion / generation_seconds if generation_seconds else 0.0,
+            'prefill_seconds': self.total('llm_prefill_seconds'),
+            'calls_per_paragraph': paragraph_calls / paragraphs if paragraphs else 0.0,
+            'retries': self.total('llm_retries_total'),
+            'stalls': self.total('paragraph_stalls_total'),
+            'repeated_words': self.total('repeated_words_total'),
+        }
+
+    def progress_postfix(self) -> Dict[str, str]:
+        progress = self.progress()
+        return {
+            'tok/s': f"{progress['tokens_per_second']:.0f}",
+            'calls/para': f"{progress['calls_per_paragraph']:.2f}",
+            'retries': f"{progress['retries']:.0f}",
+        }
+
+    def trace_events(self) -> List[Dict]:
+        """Spans in the Chrome trace-event format (load in chrome://tracing or Perfetto)."""
+
+        with self._lock:
+            spans = list(self.spans)
+        pid = os.getpid()
+        return [
+            {
+                'name': span.name,
+                'ph': 'X',
+                'ts': round((span.start - self._origin) * 1e6),
+                'dur': round(span.duration * 1e6),
+                'pid': pid,
+                'tid': span.thread_id,
+                'args': {'span_id': span.span_id, 'parent_id': span.parent_id, **span.attributes},
+            }
+            for span in spans
+        ]
+
+    def export_trace(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, file, default=str)
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f'# TYPE {_PREFIX}_{name} counter')
+                for labels, value in series.items():
+                    lines.append(f'{_PREFIX}_{name}{_format_labels(labels)} {value}')
+            for name, series in sorted(self.summaries.items()):
+                lines.append(f'# TYPE {_PREFIX}_{name} summary')
+                for labels, (count, total) in series.items():
+                    lines.append(f'{_PREFIX}_{name}_count{_format_labels(labels)} {count}')
+                    lines.append(f'{_PREFIX}_{name}_sum{_format_labels(labels)} {total}')
+            for name, series in sorted(self.gauges.items()):
+                lines.append(f'# TYPE {_PREFIX}_{name} gauge')
+                for labels, value in series.items():
+                    lines.append(f'{_PREFIX}_{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str) -> None:
+        # Write-then-rename so a node_exporter textfile collector never reads a half-written file
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(self.prometheus_text())
+        os.replace(temporary, path)
+
+    def serve_prometheus(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """Serve ``/metrics`` from a daemon thread and return the server."""
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                found = self.path == '/metrics'
+                body = metrics.prometheus_text().encode('utf-8') if found else b''
+                self.send_response(200 if found else 404)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
@@ -2,19 +2,53 @@
 
 from __future__ import annotations
 
+import asyncio
+import atexit
+import json
 import os
-from typing import Dict, Iterable, Optional
+import threading
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from retry import parse_retry_after
+
+try:
+    import aiohttp  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
 
 
 class OllamaError(RuntimeError):
-    """Raised when the Ollama backend returns an error."""
+    """Raised when the Ollama backend returns an error.
+
+    ``status_code`` and ``body`` are set when the server answered with an HTTP
+    error, and ``retry_after`` when it sent a Retry-After header.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        body: Optional[str] = None,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message if status_code is None else f"{message} (HTTP {status_code})")
+        self.status_code = status_code
+        self.body = body
+        self.retry_after = retry_after
 
 
 _DEFAULT_HOST = "69.142.141.135"
 _DEFAULT_PORT = "11434"
 _DEFAULT_MODEL = "gpt-oss:120b-cloud"
+_DEFAULT_POOL_SIZE = 10
+_DEFAULT_CONNECT_TIMEOUT = 5.0
+_DEFAULT_READ_TIMEOUT = 120.0
+# Long enough to keep the model and the book's prompt cache loaded between chapters
+_DEFAULT_KEEP_ALIVE = "30m"
 
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", _DEFAULT_HOST)
@@ -23,41 +57,91 @@ OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", _DEFAULT_MODEL)
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", f"http://{OLLAMA_HOST}:{OLLAMA_PORT}")
 
 
-def _chat_endpoint() -> str:
-    return f"{OLLAMA_BASE_URL.rstrip('/')}/api/chat"
+@dataclass
+class EndpointConfig:
+    base_url: str
+    weight: float = 1.0
+    model: Optional[str] = None
 
 
-def _tags_endpoint() -> str:
-    return f"{OLLAMA_BASE_URL.rstrip('/')}/api/tags"
+def parse_endpoints(value: str) -> List[EndpointConfig]:
+    """Parse a comma-separated endpoint list such as ``"http://a:11434 weight=2 model=llama3:8b, http://b:11434"``."""
 
+    endpoints = []
+    for entry in value.split(","):
+        parts = entry.split()
+        if not parts:
+            continue
+        endpoint = EndpointConfig(parts[0].rstrip("/"))
+        for option in parts[1:]:
+            key, _, setting = option.partition("=")
+            if key == "weight":
+                endpoint.weight = float(setting)
+            elif key == "model":
+                endpoint.model = setting
+            else:
+                raise ValueError(f"Unknown Ollama endpoint option {option!r} in {entry.strip()!r}")
+        endpoints.append(endpoint)
+    return endpoints
+
+
+def _env_endpoints() -> List[EndpointConfig]:
+    host = os.getenv("OLLAMA_HOST", _DEFAULT_HOST)
+    port = os.getenv("OLLAMA_PORT", _DEFAULT_PORT)
+    return parse_endpoints(os.getenv("OLLAMA_BASE_URL", f"http://{host}:{port}")) or [EndpointConfig(f"http://{host}:{port}")]
+
+
+def _env_base_url() -> str:
+    # A single client talks to the first endpoint; ollama_router.create_client uses all of them
+    return _env_endpoints()[0].base_url
 
-def chat(
-    messages: Iterable[Dict[str, str]],
-    *,
-    timeout: Optional[float] = 120,
-    options: Optional[Dict[str, object]] = None,
-) -> str:
-    """Send a chat completion request to the configured Ollama backend."""
 
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_keep_alive() -> Optional[Union[str, int]]:
+    # Ollama takes a duration ("30m") or seconds (-1 keeps the model loaded); empty uses the server default
+    value = os.getenv("OLLAMA_KEEP_ALIVE", _DEFAULT_KEEP_ALIVE).strip()
+    if not value:
+        return None
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def _build_payload(
+    model: str,
+    messages: Iterable[Dict[str, str]],
+    options: Optional[Dict[str, object]],
+    stream: bool = False,
+    format: Optional[Union[str, Dict[str, Any]]] = None,
+    keep_alive: Optional[Union[str, int]] = None,
+) -> Dict[str, object]:
     payload: Dict[str, object] = {
-        "model": OLLAMA_MODEL,
+        "model": model,
         "messages": list(messages),
-        "stream": False,
+        "stream": stream,
     }
 
     if options:
         payload["options"] = options
+    # "json" or a JSON schema constrains the reply to valid JSON
+    if format:
+        payload["format"] = format
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
 
-    try:
-        response = requests.post(_chat_endpoint(), json=payload, timeout=timeout)
-        response.raise_for_status()
-    except requests.RequestException as exc:  # pragma: no cover - network failure
-        raise OllamaError("Failed to reach the Ollama server") from exc
+    return payload
 
-    try:
-        data = response.json()
-    except ValueError as exc:  # pragma: no cover - unexpected payload
-        raise OllamaError("Ollama returned a non-JSON response") from exc
+
+def _parse_chat_response(data: Any) -> str:
+    if not isinstance(data, dict):
+        raise OllamaError("Unexpected response format from Ollama")
 
     message = data.get("message")
     if isinstance(message, dict):
@@ -71,20 +155,403 @@ def chat(
     raise OllamaError("Unexpected response format from Ollama")
 
 
-def check_connection(timeout: float = 5.0) -> bool:
-    """Return True when the configured model is reachable on the Ollama server."""
+def _parse_usage(data: Any) -> Dict[str, float]:
+    """Extract token counts and timings (reported in nanoseconds) from a final reply."""
+
+    usage: Dict[str, float] = {}
+    if not isinstance(data, dict):
+        return usage
+
+    for source, target in (("prompt_eval_count", "prompt_tokens"), ("eval_count", "completion_tokens")):
+        if isinstance(data.get(source), int):
+            usage[target] = data[source]
+
+    for source, target in (
+        ("prompt_eval_duration", "prompt_eval_seconds"),
+        ("eval_duration", "eval_seconds"),
+        ("load_duration", "load_seconds"),
+        ("total_duration", "total_seconds"),
+    ):
+        if isinstance(data.get(source), (int, float)):
+            usage[target] = data[source] / 1e9
+
+    return usage
+
+
+def _parse_stream_line(line: bytes) -> Tuple[str, bool, Any]:
+    """Decode one NDJSON line of a streamed reply into ``(token, done, data)``."""
 
     try:
-        response = requests.get(_tags_endpoint(), timeout=timeout)
-        response.raise_for_status()
-        body = response.json()
-    except (requests.RequestException, ValueError):  # pragma: no cover - network failure
-        return False
+        data = json.loads(line)
+    except ValueError as exc:  # pragma: no cover - unexpected payload
+        raise OllamaError("Ollama returned a non-JSON stream chunk") from exc
+
+    if isinstance(data, dict) and data.get("error"):
+        raise OllamaError(f"Ollama stream failed: {data['error']}")
+
+    done = bool(data.get("done")) if isinstance(data, dict) else False
+    message = data.get("message") if isinstance(data, dict) else None
+    if isinstance(message, dict) and isinstance(message.get("content"), str):
+        return message["content"], done, data
+    if isinstance(data, dict) and isinstance(data.get("response"), str):
+        return data["response"], done, data
+    if done:
+        return "", True, data
+
+    raise OllamaError("Unexpected stream chunk format from Ollama")
 
-    models = body.get("models")
+
+def _http_error(response: "requests.Response") -> OllamaError:
+    return OllamaError(
+        "Ollama returned an error",
+        status_code=response.status_code,
+        body=response.text[:2000],
+        retry_after=parse_retry_after(response.headers.get("Retry-After")),
+    )
+
+
+async def _async_http_error(response: "aiohttp.ClientResponse") -> OllamaError:
+    return OllamaError(
+        "Ollama returned an error",
+        status_code=response.status,
+        body=(await response.text())[:2000],
+        retry_after=parse_retry_after(response.headers.get("Retry-After")),
+    )
+
+
+def _has_model(body: Any, model: str) -> bool:
+    models = body.get("models") if isinstance(body, dict) else None
     if isinstance(models, list):
         for entry in models:
-            if isinstance(entry, dict) and entry.get("name") == OLLAMA_MODEL:
+            if isinstance(entry, dict) and entry.get("name") == model:
                 return True
 
     return False
+
+
+class OllamaClient:
+    """Synchronous Ollama client holding a pooled keep-alive HTTP session.
+
+    Configuration is resolved when the client is created, so environment
+    changes after import are picked up by new clients.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None,
+        *,
+        pool_size: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        keep_alive: Optional[Union[str, int]] = None,
+    ):
+        self.base_url = (base_url or _env_base_url()).rstrip('/')
+        self.model = model or os.getenv("OLLAMA_MODEL", _DEFAULT_MODEL)
+        self.pool_size = pool_size or _env_int("OLLAMA_POOL_SIZE", _DEFAULT_POOL_SIZE)
+        self.connect_timeout = connect_timeout or _env_float("OLLAMA_CONNECT_TIMEOUT", _DEFAULT_CONNECT_TIMEOUT)
+        self.read_timeout = read_timeout or _env_float("OLLAMA_READ_TIMEOUT", _DEFAULT_READ_TIMEOUT)
+        self.keep_alive = keep_alive if keep_alive is not None else _env_keep_alive()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @property
+    def chat_endpoint(self) -> str:
+        return f"{self.base_url}/api/chat"
+
+    @property
+    def tags_endpoint(self) -> str:
+        return f"{self.base_url}/api/tags"
+
+    def _timeout(self, read_timeout: Optional[float] = None) -> Tuple[float, float]:
+        return self.connect_timeout, read_timeout or self.read_timeout
+
+    def _post(self, endpoint: str, payload: Dict[str, object], timeout: Optional[float]) -> Dict[str, Any]:
+        try:
+            response = self.session.post(endpoint, json=payload, timeout=self._timeout(timeout))
+        except requests.RequestException as exc:  # pragma: no cover - network failure
+            raise OllamaError("Failed to reach the Ollama server") from exc
+        if not response.ok:
+            raise _http_error(response)
+
+        try:
+            return response.json()
+        except ValueError as exc:  # pragma: no cover - unexpected payload
+            raise OllamaError("Ollama returned a non-JSON response") from exc
+
+    def _post_stream(
+        self,
+        endpoint: str,
+        payload: Dict[str, object],
+        timeout: Optional[float],
+        usage: Optional[Dict[str, float]],
+    ) -> Iterator[str]:
+        try:
+            with self.session.post(endpoint, json=payload, timeout=self._timeout(timeout), stream=True) as response:
+                if not response.ok:
+                    raise _http_error(response)
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    token, done, data = _parse_stream_line(line)
+                    if token:
+                        yield token
+                    if done:
+                        if usage is not None:
+                            usage.update(_parse_usage(data))
+                        return
+        except requests.RequestException as exc:  # pragma: no cover - network failure
+            raise OllamaError("Failed to reach the Ollama server") from exc
+
+    def chat(
+        self,
+        messages: Iterable[Dict[str, str]],
+        *,
+        options: Optional[Dict[str, object]] = None,
+        timeout: Optional[float] = None,
+        usage: Optional[Dict[str, float]] = None,
+        format: Optional[Union[str, Dict[str, Any]]] = None,
+    ) -> str:
+        """Send a chat completion request and return the assistant message.
+
+        When ``usage`` is given it is filled with the token counts and timings
+        Ollama reports for the request.
+        """
+
+        payload = _build_payload(self.model, messages, options, format=format, keep_alive=self.keep_alive)
+        data = self._post(self.chat_endpoint, payload, timeout)
+        if usage is not None:
+            usage.update(_parse_usage(data))
+        return _parse_chat_response(data)
+
+    def chat_stream(
+        self,
+        messages: Iterable[Dict[str, str]],
+        *,
+        options: Optional[Dict[str, object]] = None,
+        timeout: Optional[float] = None,
+        usage: Optional[Dict[str, float]] = None,
+        format: Optional[Union[str, Dict[str, Any]]] = None,
+    ) -> Iterator[str]:
+        """Stream a chat completion, yielding content tokens as they arrive.
+
+        ``usage`` is filled from the final chunk once the stream is exhausted.
+        """
+
+        payload = _build_payload(self.model, messages, options, stream=True, format=format, keep_alive=self.keep_alive)
+        yield from self._post_stream(self.chat_endpoint, payload, timeout, usage)
+
+    def check_connection(self, timeout: Optional[float] = None) -> bool:
+        """Return True when the configured model is reachable on the server."""
+
+        try:
+            response = self.session.get(self.tags_endpoint, timeout=self._timeout(timeout or self.connect_timeout))
+            response.raise_for_status()
+            body = response.json()
+        except (requests.RequestException, ValueError):  # pragma: no cover - network failure
+            return False
+
+        return _has_model(body, self.model)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "OllamaClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class AsyncOllamaClient:
+    """asyncio counterpart of :class:`OllamaClient` built on ``aiohttp``.
+
+    The underlying session is created lazily inside the running event loop and
+    keeps up to ``pool_size`` connections alive between requests.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None,
+        *,
+        pool_size: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        keep_alive: Optional[Union[str, int]] = None,
+    ):
+        if aiohttp is None:  # pragma: no cover - dependency guard
+            raise RuntimeError('aiohttp package is not installed')
+
+        self.base_url = (base_url or _env_base_url()).rstrip('/')
+        self.model = model or os.getenv("OLLAMA_MODEL", _DEFAULT_MODEL)
+        self.pool_size = pool_size or _env_int("OLLAMA_POOL_SIZE", _DEFAULT_POOL_SIZE)
+        self.connect_timeout = connect_timeout or _env_float("OLLAMA_CONNECT_TIMEOUT", _DEFAULT_CONNECT_TIMEOUT)
+        self.read_timeout = read_timeout or _env_float("OLLAMA_READ_TIMEOUT", _DEFAULT_READ_TIMEOUT)
+        self.keep_alive = keep_alive if keep_alive is not None else _env_keep_alive()
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    @property
+    def chat_endpoint(self) -> str:
+        return f"{self.base_url}/api/chat"
+
+    @property
+    def tags_endpoint(self) -> str:
+        return f"{self.base_url}/api/tags"
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _timeout(self, read_timeout: Optional[float] = None) -> "aiohttp.ClientTimeout":
+        return aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=read_timeout or self.read_timeout)
+
+    async def chat(
+        self,
+        messages: Iterable[Dict[str, str]],
+        *,
+        options: Optional[Dict[str, object]] = None,
+        timeout: Optional[float] = None,
+        usage: Optional[Dict[str, float]] = None,
+        format: Optional[Union[str, Dict[str, Any]]] = None,
+    ) -> str:
+        """Send a chat completion request and return the assistant message.
+
+        When ``usage`` is given it is filled with the token counts and timings
+        Ollama reports for the request.
+        """
+
+        payload = _build_payload(self.model, messages, options, format=format, keep_alive=self.keep_alive)
+
+        try:
+            async with self._get_session().post(self.chat_endpoint, json=payload, timeout=self._timeout(timeout)) as response:
+                if response.status >= 400:
+                    raise await _async_http_error(response)
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError as exc:  # pragma: no cover - unexpected payload
+                    raise OllamaError("Ollama returned a non-JSON response") from exc
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:  # pragma: no cover - network failure
+            raise OllamaError("Failed to reach the Ollama server") from exc
+
+        if usage is not None:
+            usage.update(_parse_usage(data))
+        return _parse_chat_response(data)
+
+    async def chat_stream(
+        self,
+        messages: Iterable[Dict[str, str]],
+        *,
+        options: Optional[Dict[str, object]] = None,
+        timeout: Optional[float] = None,
+        usage: Optional[Dict[str, float]] = None,
+        format: Optional[Union[str, Dict[str, Any]]] = None,
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion, yielding content tokens as they arrive."""
+
+        payload = _build_payload(self.model, messages, options, stream=True, format=format, keep_alive=self.keep_alive)
+
+        try:
+            async with self._get_session().post(self.chat_endpoint, json=payload, timeout=self._timeout(timeout)) as response:
+                if response.status >= 400:
+                    raise await _async_http_error(response)
+                async for line in response.content:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    token, done, data = _parse_stream_line(line)
+                    if token:
+                        yield token
+                    if done:
+                        if usage is not None:
+                            usage.update(_parse_usage(data))
+                        return
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:  # pragma: no cover - network failure
+            raise OllamaError("Failed to reach the Ollama server") from exc
+
+    async def check_connection(self, timeout: Optional[float] = None) -> bool:
+        """Return True when the configured model is reachable on the server."""
+
+        try:
+            async with self._get_session().get(self.tags_endpoint, timeout=self._timeout(timeout or self.connect_timeout)) as response:
+                response.raise_for_status()
+                body = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):  # pragma: no cover - network failure
+            return False
+
+        return _has_model(body, self.model)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "AsyncOllamaClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+_default_client: Optional[OllamaClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client(pool_size: Optional[int] = None) -> OllamaClient:
+    """Return the process-wide client (or router) shared by every Book and by :func:`chat`.
+
+    ``pool_size`` only applies when the client is created by this call. The
+    client is closed at exit, or earlier with :func:`close_default_client`.
+    """
+
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            # Imported here because the router module builds on this one
+            from ollama_router import create_client
+            _default_client = create_client(pool_size=pool_size)
+            atexit.register(close_default_client)
+        return _default_client
+
+
+def close_default_client() -> None:
+    """Close the process-wide client, stopping a router's health checks; the next use opens a new one."""
+
+    global _default_client
+    with _default_client_lock:
+        client, _default_client = _default_client, None
+    if client is not None:
+        client.close()
+
+
+def chat(
+    messages: Iterable[Dict[str, str]],
+    *,
+    timeout: Optional[float] = 120,
+    options: Optional[Dict[str, object]] = None,
+) -> str:
+    """Send a chat completion request to the configured Ollama backend."""
+
+    return get_default_client().chat(messages, options=options, timeout=timeout)
+
+
+def chat_stream(
+    messages: Iterable[Dict[str, str]],
+    *,
+    timeout: Optional[float] = 120,
+    options: Optional[Dict[str, object]] = None,
+) -> Iterator[str]:
+    """Stream a chat completion from the configured Ollama backend token by token."""
+
+    return get_default_client().chat_stream(messages, options=options, timeout=timeout)
+
+
+def check_connection(timeout: float = 5.0) -> bool:
+    """Return True when the configured model is reachable on the Ollama server."""
+
+    return get_default_client().check_connection(timeout=timeout)
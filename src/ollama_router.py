@@ -0,0 +1,309 @@
+"""Route Ollama requests across several hosts with health checks and failover."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, ContextManager, Dict, Iterable, Iterator, List, Optional, Set, Union
+
+from concurrency import CallOutcome
+from context_window import estimate_tokens
+from ollama_client import (
+    EndpointConfig,
+    OllamaClient,
+    OllamaError,
+    _DEFAULT_MODEL,
+    _env_endpoints,
+    _env_float,
+)
+from retry import RetryPolicy
+
+if TYPE_CHECKING:  # pragma: no cover - imports for annotations only
+    from concurrency import ConcurrencyLimiter
+
+_DEFAULT_HEALTH_INTERVAL = 15.0
+
+
+class Endpoint:
+    """One Ollama host with its own client, health flag and request counters."""
+
+    def __init__(self, config: EndpointConfig, client: OllamaClient):
+        self.config = config
+        self.client = client
+        self.healthy = True
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.last_error: Optional[str] = None
+        self.last_checked: Optional[float] = None
+
+    @property
+    def base_url(self) -> str:
+        return self.client.base_url
+
+    @property
+    def weight(self) -> float:
+        return max(self.config.weight, 0.001)
+
+    def stats(self) -> Dict[str, Any]:
+        completed = self.requests - self.in_flight
+        return {
+            'base_url': self.base_url,
+            'model': self.client.model,
+            'weight': self.config.weight,
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'failures': self.failures,
+            'average_seconds': round(self.seconds / completed, 3) if completed else 0.0,
+            'last_error': self.last_error,
+        }
+
+
+class OllamaRouter:
+    """Drop-in replacement for :class:`OllamaClient` that spreads requests over several hosts.
+
+    Each request goes to the healthy endpoint with the fewest in-flight
+    requests relative to its weight. Retryable failures (connection errors,
+    rate limits, server errors) fail over to the next endpoint; permanent
+    ones are raised straight away. A background thread probes every
+    endpoint's ``/api/tags`` each ``health_interval`` seconds, and endpoints
+    that drop connections are skipped until they pass a probe again.
+
+    With a ``limiter``, each request also takes a slot keyed by the host it
+    was routed to (``'ollama:<base_url>'``), so an adaptive limiter tunes
+    every host on its own latency, and hosts with more free slots get more
+    of the traffic.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[EndpointConfig],
+        model: Optional[str] = None,
+        *,
+        pool_size: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        keep_alive: Optional[Union[str, int]] = None,
+        health_interval: Optional[float] = None,
+        limiter: Optional['ConcurrencyLimiter'] = None,
+    ):
+        if not endpoints:
+            raise ValueError('OllamaRouter needs at least one endpoint')
+
+        self.model = model or os.getenv('OLLAMA_MODEL', _DEFAULT_MODEL)
+        self.endpoints = [
+            Endpoint(config, OllamaClient(
+                config.base_url,
+                config.model or self.model,
+                pool_size=pool_size,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                keep_alive=keep_alive,
+            ))
+            for config in endpoints
+        ]
+        first = self.endpoints[0].client
+        self.pool_size = first.pool_size
+        self.connect_timeout = first.connect_timeout
+        self.read_timeout = first.read_timeout
+        self.keep_alive = first.keep_alive
+        self.health_interval = (
+            health_interval if health_interval is not None
+            else _env_float('OLLAMA_HEALTH_INTERVAL', _DEFAULT_HEALTH_INTERVAL)
+        )
+
+        self.limiter = limiter
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        if self.health_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, name='ollama-health', daemon=True)
+            self._health_thread.start()
+
+    @property
+    def base_url(self) -> str:
+        # Identifies the whole pool, e.g. as the circuit breaker key
+        return ','.join(endpoint.base_url for endpoint in self.endpoints)
+
+    def _acquire(self, tried: Set[str]) -> Optional[Endpoint]:
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints if endpoint.base_url not in tried]
+            # When every remaining host looks down, trying one beats failing without a request
+            healthy = [endpoint for endpoint in candidates if endpoint.healthy] or candidates
+            if not healthy:
+                return None
+            endpoint = min(healthy, key=lambda item: (item.in_flight / self._capacity(item), item.requests / item.weight))
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _capacity(self, endpoint: Endpoint) -> float:
+        limit = self.limiter.limit(self.limiter_key(endpoint)) if self.limiter is not None else None
+        return endpoint.weight * (limit or 1)
+
+    @staticmethod
+    def limiter_key(endpoint: Endpoint) -> str:
+        return f'ollama:{endpoint.base_url}'
+
+    def _slot(self, endpoint: Endpoint) -> ContextManager[CallOutcome]:
+        if self.limiter is None:
+            return nullcontext(CallOutcome())
+        return self.limiter.slot(self.limiter_key(endpoint))
+
+    def limit(self) -> Optional[int]:
+        """Requests the limiter currently allows in flight over all healthy hosts (None: unlimited)."""
+
+        if self.limiter is None:
+            return None
+        limits = [self.limiter.limit(self.limiter_key(endpoint)) for endpoint in self.endpoints if endpoint.healthy]
+        if not limits or None in limits:
+            return None
+        return sum(limits)
+
+    def _release(self, endpoint: Endpoint, started: float, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.seconds += time.perf_counter() - started
+            if error is not None:
+                endpoint.failures += 1
+                endpoint.last_error = str(error)
+                # No HTTP status means the host could not be reached at all
+                if getattr(error, 'status_code', None) is None:
+                    endpoint.healthy = False
+
+    def chat(
+        self,
+        messages: Iterable[Dict[str, str]],
+        *,
+        usage: Optional[Dict[str, Any]] = None,
+        **kwargs,
+    ) -> str:
+        """Send a chat request to the least loaded healthy endpoint, failing over on retryable errors."""
+
+        messages = list(messages)
+        tried: Set[str] = set()
+        last_error: Optional[OllamaError] = None
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise last_error or OllamaError('No Ollama endpoint is available')
+
+            started = time.perf_counter()
+            try:
+                with self._slot(endpoint) as outcome:
+                    self._record_queue_wait(usage, started)
+                    reply = endpoint.client.chat(messages, usage=usage, **kwargs)
+                    outcome.tokens = (usage or {}).get('completion_tokens') or estimate_tokens(reply)
+            except OllamaError as exc:
+                self._release(endpoint, started, exc)
+                if not RetryPolicy.is_retryable(exc):
+                    raise
+                tried.add(endpoint.base_url)
+                last_error = exc
+                continue
+
+            self._release(endpoint, started)
+            if usage is not None:
+                usage['endpoint'] = endpoint.base_url
+            return reply
+
+    def chat_stream(
+        self,
+        messages: Iterable[Dict[str, str]],
+        *,
+        usage: Optional[Dict[str, Any]] = None,
+        **kwargs,
+    ) -> Iterator[str]:
+        """Stream from the least loaded healthy endpoint; fails over only until the first token arrives."""
+
+        messages = list(messages)
+        tried: Set[str] = set()
+        last_error: Optional[OllamaError] = None
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise last_error or OllamaError('No Ollama endpoint is available')
+            if usage is not None:
+                usage['endpoint'] = endpoint.base_url
+
+            started = time.perf_counter()
+            streamed = 0
+            error: Optional[OllamaError] = None
+            try:
+                with self._slot(endpoint) as outcome:
+                    self._record_queue_wait(usage, started)
+                    try:
+                        for token in endpoint.client.chat_stream(messages, usage=usage, **kwargs):
+                            streamed += 1
+                            yield token
+                    except GeneratorExit:
+                        # The caller stopped reading, e.g. at its length target; the call still ended normally
+                        pass
+                    outcome.tokens = (usage or {}).get('completion_tokens') or streamed
+            except OllamaError as exc:
+                error = exc
+                # Tokens already handed to the caller cannot be taken back, so only fail over before the first one
+                if streamed or not RetryPolicy.is_retryable(exc):
+                    raise
+            finally:
+                self._release(endpoint, started, error)
+
+            if error is None:
+                return
+            tried.add(endpoint.base_url)
+            last_error = error
+
+    @staticmethod
+    def _record_queue_wait(usage: Optional[Dict[str, Any]], started: float) -> None:
+        # Time spent waiting for the endpoint's slot, reported like the wait for a Book's own limiter
+        if usage is not None:
+            usage['queue_wait_seconds'] = round(time.perf_counter() - started, 6)
+
+    def check_health(self, timeout: Optional[float] = None) -> bool:
+        """Probe every endpoint now and return True when at least one is usable."""
+
+        for endpoint in self.endpoints:
+            healthy = endpoint.client.check_connection(timeout)
+            with self._lock:
+                endpoint.healthy = healthy
+                endpoint.last_checked = time.time()
+        return any(endpoint.healthy for endpoint in self.endpoints)
+
+    def check_connection(self, timeout: Optional[float] = None) -> bool:
+        return self.check_health(timeout)
+
+    def _health_loop(self) -> None:
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def close(self) -> None:
+        self._stop.set()
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+
+    def __enter__(self) -> 'OllamaRouter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def create_client(**kwargs) -> Union[OllamaClient, OllamaRouter]:
+    """Build a client from OLLAMA_BASE_URL: a plain client for one host, a router for several.
+
+    Keyword arguments are passed through, e.g. ``pool_size``.
+    """
+
+    endpoints = _env_endpoints()
+    if len(endpoints) == 1:
+        kwargs.pop('health_interval', None)
+        return OllamaClient(endpoints[0].base_url, endpoints[0].model, **kwargs)
+    return OllamaRouter(endpoints, **kwargs)
@@ -0,0 +1,285 @@
+"""Typed book outline with JSON and tolerant free-text parsing plus local repairs."""
+
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# JSON schema sent to Ollama's ``format`` field; OpenAI's JSON mode gets the same shape via the prompt
+OUTLINE_SCHEMA: Dict[str, Any] = {
+    'type': 'object',
+    'properties': {
+        'chapters': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'title': {'type': 'string'},
+                    'paragraphs': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'title': {'type': 'string'},
+                                'words': {'type': 'integer'},
+                            },
+                            'required': ['title', 'words'],
+                        },
+                    },
+                },
+                'required': ['title', 'paragraphs'],
+            },
+        },
+    },
+    'required': ['chapters'],
+}
+
+# Shortest paragraph a repair may leave behind
+_MIN_PARAGRAPH_WORDS = 20
+
+_CHAPTER_LINE = re.compile(
+    r'^[\s#*|>\-]*(?:chapter\b|chap\.|ch\.)\s*(?:\d+|[ivxlc]+(?=\s*[:.(]))?\s*(?P<rest>.*)$', re.IGNORECASE,
+)
+_PARAGRAPH_LINE = re.compile(
+    r'^[\s#*|>\-]*(?:paragraph\b|para\.|section\b|scene\b)\s*(?:\d+)?\s*(?P<rest>.*)$', re.IGNORECASE,
+)
+# Two or more cell separators; a single '|' may still separate a chapter number from its title
+_TABLE_ROW = re.compile(r'^(?:[^|]*\|){2,}')
+_NUMBERED_LINE = re.compile(r'^[\s>|]*(?:\d+[.)]|[-*•])\s+(?P<rest>.+)$')
+_WORDS = re.compile(r'(\d[\d,.]*)\s*(?:-\s*\d[\d,.]*\s*)?(?:words?|w)\b', re.IGNORECASE)
+_PARAGRAPH_COUNT = re.compile(r'\(\s*\d+\s*(?:paragraphs?)?\s*\)', re.IGNORECASE)
+_TITLE_SEPARATORS = ' \t:.-–—|*"\''
+
+
+class OutlineError(ValueError):
+    """Raised when a reply does not contain a usable outline."""
+
+
+@dataclass
+class ParagraphOutline:
+    title: str
+    words: int = 0
+
+
+@dataclass
+class ChapterOutline:
+    title: str
+    paragraphs: List[ParagraphOutline] = field(default_factory=list)
+
+    @property
+    def words(self) -> int:
+        return sum(paragraph.words for paragraph in self.paragraphs)
+
+
+@dataclass
+class Outline:
+    chapters: List[ChapterOutline] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Any) -> 'Outline':
+        """Build an outline from decoded JSON, accepting common variations in key names."""
+
+        chapters = data.get('chapters', data.get('outline')) if isinstance(data, dict) else data
+        if not isinstance(chapters, list):
+            raise OutlineError('The outline JSON has no list of chapters.')
+
+        outline = cls()
+        for index, chapter in enumerate(chapters, start=1):
+            if not isinstance(chapter, dict):
+                continue
+            paragraphs = chapter.get('paragraphs') or chapter.get('sections') or []
+            outline.chapters.append(ChapterOutline(
+                title=_text(chapter, 'title', 'name', 'heading') or f'Chapter {index}',
+                paragraphs=[
+                    ParagraphOutline(
+                        title=_text(paragraph, 'title', 'name', 'heading', 'summary') or f'Part {position}',
+                        words=_words(paragraph.get('words', paragraph.get('word_count', 0))),
+                    )
+                    for position, paragraph in enumerate(paragraphs, start=1)
+                    if isinstance(paragraph, dict)
+                ],
+            ))
+        return outline
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'chapters': [
+                {
+                    'title': chapter.title,
+                    'paragraphs': [{'title': paragraph.title, 'words': paragraph.words} for paragraph in chapter.paragraphs],
+                }
+                for chapter in self.chapters
+            ],
+        }
+
+    def to_chapters(self) -> List[Dict[str, Any]]:
+        """The list-of-dicts layout used by ``Book.chapters``."""
+
+        return self.to_dict()['chapters']
+
+    def to_text(self) -> str:
+        """Render the table format the paragraph prompts and the journal use."""
+
+        lines = []
+        for chapter_index, chapter in enumerate(self.chapters, start=1):
+            lines.append(f'Chapter {chapter_index} ({len(chapter.paragraphs)} paragraphs): {chapter.title}')
+            for paragraph_index, paragraph in enumerate(chapter.paragraphs, start=1):
+                lines.append(f'\tParagraph {paragraph_index} ({paragraph.words} words): {paragraph.title}')
+        return '\n'.join(lines)
+
+    def repair(self, words_per_chapter: Optional[int] = None, chapters: Optional[int] = None) -> List[str]:
+        """Fix small defects in place and return a description of each fix.
+
+        Chapters beyond ``chapters`` are dropped, empty chapters get a single
+        paragraph, missing word counts get an even share and every chapter is
+        rescaled to sum to ``words_per_chapter``.
+        """
+
+        fixes = []
+        if chapters and len(self.chapters) > chapters:
+            fixes.append(f'dropped {len(self.chapters) - chapters} extra chapters')
+            del self.chapters[chapters:]
+
+        for index, chapter in enumerate(self.chapters, start=1):
+            if not chapter.paragraphs:
+                chapter.paragraphs.append(ParagraphOutline(chapter.title, words_per_chapter or 0))
+                fixes.append(f'chapter {index} had no paragraphs')
+
+            missing = [paragraph for paragraph in chapter.paragraphs if paragraph.words <= 0]
+            if missing:
+                known = chapter.words
+                budget = words_per_chapter or max(known, _MIN_PARAGRAPH_WORDS * len(chapter.paragraphs))
+                share = max(_MIN_PARAGRAPH_WORDS, (budget - known) // len(missing))
+                for paragraph in missing:
+                    paragraph.words = share
+                fixes.append(f'chapter {index} had {len(missing)} paragraphs without a word count')
+
+            if words_per_chapter and chapter.words != words_per_chapter:
+                fixes.append(f'chapter {index} had {chapter.words} words instead of {words_per_chapter}')
+                _rescale(chapter.paragraphs, words_per_chapter)
+
+        return fixes
+
+
+def _text(data: Any, *keys: str) -> str:
+    if not isinstance(data, dict):
+        return ''
+    for key in keys:
+        value = data.get(key)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    return ''
+
+
+def _words(value: Any) -> int:
+    if isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return max(0, int(value))
+    match = re.search(r'\d[\d,]*', str(value))
+    return int(match.group(0).replace(',', '')) if match else 0
+
+
+def _rescale(paragraphs: List[ParagraphOutline], total: int) -> None:
+    """Scale word counts proportionally so they sum to ``total`` (largest remainder rounding)."""
+
+    current = sum(paragraph.words for paragraph in paragraphs)
+    floor = min(_MIN_PARAGRAPH_WORDS, total // len(paragraphs))
+    spare = total - floor * len(paragraphs)
+    weights = [max(paragraph.words - floor, 1) if current else 1 for paragraph in paragraphs]
+    exact = [spare * weight / sum(weights) for weight in weights]
+    shares = [int(value) for value in exact]
+    by_remainder = sorted(range(len(paragraphs)), key=lambda index: exact[index] - shares[index], reverse=True)
+    for index in by_remainder[:spare - sum(shares)]:
+        shares[index] += 1
+    for paragraph, share in zip(paragraphs, shares):
+        paragraph.words = floor + share
+
+
+def parse_outline_json(text: str) -> Outline:
+    """Parse a JSON outline, tolerating code fences and text around the object.
+
+    Decoding starts at each ``{`` or ``[`` in turn and stops at the end of
+    the first complete value, so remarks after the outline (even ones with
+    braces in them) are ignored.
+    """
+
+    decoder = json.JSONDecoder()
+    error: Optional[Exception] = None
+    for start in re.finditer(r'[{\[]', text):
+        try:
+            data, _ = decoder.raw_decode(text, start.start())
+            return Outline.from_dict(data)
+        except ValueError as exc:
+            # The first failure is reported, as it comes from the outermost candidate
+            error = error or exc
+    if error is None:
+        raise OutlineError('The reply contains no JSON.')
+    raise OutlineError(f'The outline is not valid JSON: {error}') from error
+
+
+def parse_outline_text(text: str) -> Outline:
+    """Parse a free-text outline line by line.
+
+    Chapter lines start with "Chapter"/"Ch." (optionally behind markdown
+    markers) and paragraph lines with "Paragraph", "Section", "Scene" or a
+    list marker; word counts are taken from anything like "(300 words)".
+    Paragraphs listed before the first chapter heading open an untitled chapter.
+    Markdown table rows are skipped, since their cells cannot be told apart
+    reliably; a reply that is only a table therefore has no chapters.
+    """
+
+    outline = Outline()
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or _TABLE_ROW.match(line):
+            continue
+
+        chapter = _CHAPTER_LINE.match(line)
+        if chapter:
+            title = _clean_title(_PARAGRAPH_COUNT.sub('', chapter.group('rest')))
+            outline.chapters.append(ChapterOutline(title or f'Chapter {len(outline.chapters) + 1}'))
+            continue
+
+        paragraph = _PARAGRAPH_LINE.match(line) or _NUMBERED_LINE.match(line)
+        if paragraph is None:
+            continue
+        rest = paragraph.group('rest')
+        words = _WORDS.search(rest)
+        if paragraph.re is _NUMBERED_LINE and words is None and outline.chapters and not outline.chapters[-1].paragraphs:
+            # A numbered line without a word count under a fresh chapter is more likely prose than an entry
+            continue
+        if not outline.chapters:
+            outline.chapters.append(ChapterOutline('Chapter 1'))
+        title = _clean_title(_WORDS.sub('', rest))
+        outline.chapters[-1].paragraphs.append(ParagraphOutline(
+            title or f'Part {len(outline.chapters[-1].paragraphs) + 1}',
+            _words(words.group(1)) if words else 0,
+        ))
+
+    return outline
+
+
+def _clean_title(text: str) -> str:
+    # Drop leftovers such as "()" or "(words)" once the numbers have been taken out
+    text = re.sub(r'\(\s*(?:words?|paragraphs?)?\s*\)', '', text, flags=re.IGNORECASE)
+    return text.strip(_TITLE_SEPARATORS).strip()
+
+
+def parse_outline(text: str) -> Outline:
+    """Parse a JSON or free-text outline and raise OutlineError when nothing usable is found."""
+
+    stripped = text.strip()
+    outline: Optional[Outline] = None
+    if '{' in stripped or stripped.startswith('['):
+        try:
+            outline = parse_outline_json(stripped)
+        except OutlineError:
+            outline = None
+    if outline is None or not outline.chapters:
+        outline = parse_outline_text(stripped)
+    if not outline.chapters:
+        raise OutlineError('No chapters found in the outline.')
+    return outline
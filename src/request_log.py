@@ -0,0 +1,171 @@
+"""Buffered, structured log of LLM requests written by a background thread."""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+LEVELS = ('off', 'metadata', 'full')
+
+_DEFAULT_PATH = 'log.jsonl'
+_DEFAULT_MAX_MB = 50
+
+
+def message_hash(message: Dict[str, str]) -> str:
+    digest = hashlib.sha1(f"{message.get('role')}\0{message.get('content')}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class RequestLog:
+    """JSON-lines request log with batching, size-based rotation and levels.
+
+    ``off`` drops everything, ``metadata`` writes one record per request
+    (backend, model, step, sizes and timing), and ``full`` also writes the
+    messages. Every distinct message is written once per file as a
+    ``message`` record, and requests refer to messages by hash, so the log
+    grows with the amount of new text, not with the prompt length.
+    """
+
+    def __init__(
+        self,
+        path: str = _DEFAULT_PATH,
+        level: str = 'metadata',
+        max_bytes: int = _DEFAULT_MAX_MB * 1024 * 1024,
+        backups: int = 3,
+        batch_size: int = 64,
+        flush_interval: float = 1.0,
+    ):
+        if level not in LEVELS:
+            raise ValueError(f'Unknown log level {level!r}; expected one of {", ".join(LEVELS)}')
+
+        self.path = path
+        self.level = level
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self._seen: Set[str] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'RequestLog':
+        return cls(
+            os.getenv('BOOKGPT_LOG_PATH', _DEFAULT_PATH),
+            level=os.getenv('BOOKGPT_LOG_LEVEL', 'metadata').lower(),
+            max_bytes=int(float(os.getenv('BOOKGPT_LOG_MAX_MB', _DEFAULT_MAX_MB)) * 1024 * 1024),
+        )
+
+    def log(self, prompt: List[Dict[str, str]], response: str, **metadata) -> None:
+        """Queue a request record; never blocks on file I/O."""
+
+        if self.level == 'off':
+            return
+
+        self._ensure_started()
+        # Callers keep appending to their prompt list, so hand the writer a snapshot
+        self._queue.put({'time': time.time(), 'prompt': list(prompt), 'response': response, **metadata})
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-log', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._write(batch)
+
+    def _write(self, batch: List[Dict]) -> None:
+        self._rotate_if_needed()
+        lines = []
+        for entry in batch:
+            prompt = entry.pop('prompt')
+            response = entry.pop('response')
+            record = {
+                'type': 'request',
+                **entry,
+                'prompt_messages': len(prompt),
+                'prompt_chars': sum(len(message['content']) for message in prompt),
+                'response_chars': len(response),
+            }
+            if self.level == 'full':
+                response_message = {'role': 'assistant', 'content': response}
+                record['messages'] = [self._reference(message, lines) for message in prompt]
+                record['response'] = self._reference(response_message, lines)
+            lines.append(json.dumps(record, ensure_ascii=False))
+
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+    def _reference(self, message: Dict[str, str], lines: List[str]) -> str:
+        digest = message_hash(message)
+        if digest not in self._seen:
+            self._seen.add(digest)
+            lines.append(json.dumps(
+                {'type': 'message', 'hash': digest, 'role': message['role'], 'content': message['content']},
+                ensure_ascii=False,
+            ))
+        return digest
+
+    def _rotate_if_needed(self) -> None:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size < self.max_bytes:
+            return
+
+        for index in range(self.backups - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        # Each file has to be readable on its own, so messages are written again after a rotation
+        self._seen.clear()
+
+
+_default_log: Optional[RequestLog] = None
+_default_log_lock = threading.Lock()
+
+
+def get_default_log() -> RequestLog:
+    """Return the process-wide log configured by BOOKGPT_LOG_PATH / _LEVEL / _MAX_MB."""
+
+    global _default_log
+    with _default_log_lock:
+        if _default_log is None:
+            _default_log = RequestLog.from_env()
+        return _default_log
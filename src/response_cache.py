@@ -0,0 +1,137 @@
+"""Persistent, content-addressed cache for LLM responses."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+_DEFAULT_PATH = ".bookgpt_cache.sqlite3"
+_DEFAULT_MAX_MB = 256
+
+
+class ResponseCache:
+    """SQLite-backed response cache with size-bounded LRU eviction.
+
+    Entries are keyed by a hash of the backend, model, options and exact
+    message list. SQLite's file locking makes one cache file safe to share
+    between threads and between processes on the same machine.
+    """
+
+    def __init__(self, path: str = _DEFAULT_PATH, max_bytes: int = _DEFAULT_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+        self._local = threading.local()
+
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """Build the cache configured by BOOKGPT_CACHE / BOOKGPT_CACHE_MAX_MB, or None when disabled."""
+
+        path = os.getenv("BOOKGPT_CACHE", _DEFAULT_PATH)
+        if path.lower() in {"", "0", "off", "none"}:
+            return None
+        max_mb = float(os.getenv("BOOKGPT_CACHE_MAX_MB", _DEFAULT_MAX_MB))
+        return cls(path, max_bytes=int(max_mb * 1024 * 1024))
+
+    @staticmethod
+    def make_key(
+        backend: str,
+        model: str,
+        options: Optional[Dict[str, object]],
+        messages: Iterable[Dict[str, str]],
+    ) -> str:
+        payload = json.dumps(
+            {"backend": backend, "model": model, "options": options or {}, "messages": list(messages)},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[str]:
+        connection = self._connection()
+        row = connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        with self._counter_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return None
+
+        connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._evict(connection)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Walk entries from least to most recently used until enough space is freed
+        expired = []
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+            if total <= self.max_bytes:
+                break
+            expired.append((key,))
+            total -= size
+        connection.executemany("DELETE FROM responses WHERE key = ?", expired)
+
+    def stats(self) -> Dict[str, float]:
+        entries, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        with self._counter_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM responses")
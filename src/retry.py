@@ -0,0 +1,189 @@
+"""Retry policy with exponential backoff, Retry-After support and a circuit breaker."""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+# Status codes worth retrying: request timeout, rate limiting and server-side failures
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class PermanentError(RuntimeError):
+    """Raised for failures that retrying cannot fix, e.g. a misconfigured backend."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose circuit breaker is open."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    # OllamaError exposes status_code, openai<1 errors expose http_status
+    status = getattr(exc, 'status_code', None) or getattr(exc, 'http_status', None)
+    return int(status) if status else None
+
+
+class CircuitBreaker:
+    """Open after ``failure_threshold`` consecutive failures and fail fast for ``reset_timeout`` seconds.
+
+    Once the timeout has passed a single trial call is let through (half-open)
+    and other callers wait for its outcome: a success closes the circuit and
+    lets them through, a failure re-opens it and they fail fast again. A
+    trial that reports nothing within ``reset_timeout`` is replaced by the
+    next caller.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self._trial_done = threading.Condition(self._lock)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self) -> None:
+        with self._trial_done:
+            while True:
+                if self.opened_at is None:
+                    return
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError('Circuit breaker is open; backend is failing', remaining)
+                if not self._trial_running:
+                    self._trial_running = True
+                    return
+                # Half-open with a trial in flight: its outcome decides for everyone
+                if not self._trial_done.wait(self.reset_timeout):
+                    self._trial_running = False
+
+    def record_success(self) -> None:
+        with self._trial_done:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+            self._trial_done.notify_all()
+
+    def record_failure(self) -> None:
+        with self._trial_done:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+            self._trial_done.notify_all()
+
+
+class RetryPolicy:
+    """Decide whether and when a failed backend call is retried.
+
+    Delays grow exponentially from ``base_delay`` up to ``max_delay`` with full
+    jitter, unless the backend sent a Retry-After header. Errors are classified
+    so that permanent ones (authentication, bad requests, unsupported
+    backends) fail immediately. Circuit breakers are kept per backend key and
+    shared by every Book that uses the same policy.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        multiplier: float = 2.0,
+        jitter: bool = True,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        with self._breakers_lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[key]
+
+    @staticmethod
+    def is_retryable(exc: BaseException) -> bool:
+        if isinstance(exc, PermanentError):
+            return False
+        if isinstance(exc, CircuitOpenError):
+            return True
+
+        status = _status_code(exc)
+        if status is not None:
+            return status in RETRYABLE_STATUS
+
+        # openai<1 raises these without an HTTP status when the request itself is invalid
+        if type(exc).__name__ in {'AuthenticationError', 'PermissionError', 'InvalidRequestError', 'InvalidAPIType'}:
+            return False
+
+        # Connection errors, timeouts and malformed replies are usually transient
+        return True
+
+    @staticmethod
+    def retry_after(exc: BaseException) -> Optional[float]:
+        retry_after = getattr(exc, 'retry_after', None)
+        if retry_after is not None:
+            return float(retry_after)
+
+        headers = getattr(exc, 'headers', None)
+        if headers:
+            return parse_retry_after(headers.get('Retry-After') or headers.get('retry-after'))
+        return None
+
+    def delay(self, attempt: int, exc: BaseException) -> float:
+        """Seconds to wait before retry number ``attempt + 1``."""
+
+        retry_after = self.retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** attempt)
+        return random.uniform(0, ceiling) if self.jitter else ceiling
+
+
+_default_policy = RetryPolicy()
+
+
+def get_default_policy() -> RetryPolicy:
+    """Return the process-wide policy, so all Books share circuit breakers per backend."""
+
+    return _default_policy
@@ -1,12 +1,26 @@
 # Imports
+import argparse
+import glob
+import json
 import os
+import sqlite3
+import sys
+from datetime import datetime
+from typing import List, Optional, Tuple
+
 from pyfiglet import Figlet
+from backends import available, import_openai
+from batch import BatchRunner, load_jobs, parse_limits
 from book import Book
-
-try:
-    import openai  # type: ignore
-except ImportError:  # pragma: no cover - optional dependency
-    openai = None
+from book_store import BookStore
+from book_writer import BookWriter, write_atomically
+from concurrency import limiter_from_env
+from estimator import ThroughputHistory, estimate_book, format_errors, usage_totals
+from export import ChunkCache, Exporter
+from journal import GenerationJournal
+from metrics import Metrics
+from outline import Outline
+from response_cache import ResponseCache
 
 # Draw the given text in a figlet
 def draw(text):
@@ -45,10 +59,11 @@ def get_option(options):
 
 def select_backend() -> str:
     backend = os.getenv('BOOKGPT_BACKEND', 'ollama').lower()
-    if backend not in {'openai', 'ollama'}:
+    if backend not in available():
         backend = 'ollama'
 
     if backend == 'openai':
+        openai = import_openai()
         if openai is None:
             print('openai package is not installed. Falling back to Ollama backend.')
             return 'ollama'
@@ -60,12 +75,143 @@ def select_backend() -> str:
 
         openai.api_key = api_key
         print('Using OpenAI backend for generation.')
+    elif backend == 'fake':
+        print('Using the offline fake backend; the text is filler.')
     else:
         print('Using Ollama backend for generation.')
 
     return backend
 
 
+class StreamPrinter:
+    """Render streamed tokens on the terminal and optionally mirror them into a file."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.step: Optional[str] = None
+        self.file = open(path, 'a', encoding='utf-8') if path else None
+
+    def __call__(self, step: str, token: str) -> None:
+        if step != self.step:
+            self.step = step
+            self.write(self.heading(step))
+        self.write(token)
+
+    @staticmethod
+    def heading(step: str) -> str:
+        if step == 'title':
+            return '\nTitle: '
+        if step == 'structure':
+            return '\n'
+        chapter, paragraph = step.split('.')
+        return f'\n\n[Chapter {chapter}, paragraph {paragraph}]\n'
+
+    def write(self, text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        if self.file is not None:
+            self.file.write(text)
+            self.file.flush()
+
+    def finish(self) -> None:
+        # A new heading is printed even when the same step is streamed again (e.g. a regenerated title)
+        self.step = None
+        self.write('\n')
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+def report_first_token_latency(book: Book) -> None:
+    latencies = book.first_token_latencies
+    if latencies:
+        average = sum(latencies) / len(latencies)
+        print(f'Time to first token: {average:.2f}s average, {max(latencies):.2f}s worst over {len(latencies)} calls.')
+
+
+def report_endpoints(book: Book) -> None:
+    if book.llm_backend != 'ollama' or book._ollama_client is None:
+        return
+    from ollama_router import OllamaRouter
+
+    if not isinstance(book._ollama_client, OllamaRouter):
+        return
+    for stats in book._ollama_client.stats():
+        state = 'healthy' if stats['healthy'] else f"down ({stats['last_error']})"
+        print(
+            f"{stats['base_url']} [{stats['model']}]: {stats['requests']} requests, {stats['failures']} failed, "
+            f"{stats['average_seconds']:.2f}s average, {state}."
+        )
+
+
+def make_metrics() -> Metrics:
+    metrics = Metrics()
+    port = os.getenv('BOOKGPT_METRICS_PORT')
+    if port:
+        metrics.serve_prometheus(int(port))
+        print(f'Prometheus metrics served on http://127.0.0.1:{port}/metrics')
+    return metrics
+
+
+def report_side_effects(
+    cache: Optional[ResponseCache],
+    summaries: Optional[str] = None,
+    store: Optional[BookStore] = None,
+) -> None:
+    # Defaults that write files or add model calls are announced, so they never come as a surprise
+    if cache is not None:
+        print(f'Caching responses in {cache.path} (BOOKGPT_CACHE=off to disable).')
+    if store is not None:
+        print(f'Recording books in {store.path} (BOOKGPT_STORE=off to disable).')
+    if summaries == 'llm':
+        print('Paragraphs beyond the context budget are summarized by the model (BOOKGPT_SUMMARIES=extractive avoids the extra calls).')
+
+
+def export_metrics(metrics: Metrics, trace_path: Optional[str] = None, prometheus_path: Optional[str] = None) -> None:
+    progress = metrics.progress()
+    print(
+        f"{progress['prompt_tokens']:.0f} prompt and {progress['completion_tokens']:.0f} completion tokens at "
+        f"{progress['tokens_per_second']:.1f} tok/s, {progress['prefill_seconds']:.1f}s prefill, "
+        f"{progress['calls_per_paragraph']:.2f} calls per paragraph, "
+        f"{progress['retries']:.0f} retries, {progress['stalls']:.0f} stalled paragraphs, "
+        f"{progress['repeated_words']:.0f} repeated words dropped."
+    )
+    trace_path = trace_path or os.getenv('BOOKGPT_TRACE')
+    if trace_path:
+        metrics.export_trace(trace_path)
+        print(f'Trace written to {trace_path}.')
+    prometheus_path = prometheus_path or os.getenv('BOOKGPT_METRICS')
+    if prometheus_path:
+        metrics.write_prometheus(prometheus_path)
+        print(f'Metrics written to {prometheus_path}.')
+
+
+def export_book(markdown: str, path: str) -> None:
+    """Write the HTML and/or MP3 versions listed in BOOKGPT_EXPORT (e.g. "html,mp3") next to ``path``."""
+
+    formats = [item.strip().lower() for item in os.getenv('BOOKGPT_EXPORT', '').split(',') if item.strip()]
+    if not formats:
+        return
+    exporter = Exporter(
+        max_workers=int(os.getenv('BOOKGPT_EXPORT_WORKERS', 4)),
+        cache=ChunkCache(os.getenv('BOOKGPT_EXPORT_CACHE', '.bookgpt_export_cache')),
+    )
+    base = os.path.splitext(path)[0]
+    for name in formats:
+        try:
+            if name == 'html':
+                result = exporter.export_html(markdown, f'{base}.html')
+            elif name == 'mp3':
+                result = exporter.export_mp3(markdown, f'{base}.mp3', os.getenv('BOOKGPT_EXPORT_LANGUAGE', 'en'))
+            else:
+                print(f'Unknown export format: {name}')
+                continue
+        except Exception as exc:  # pragma: no cover - network/runtime failure
+            print(f'Failed to export {name}: {exc}')
+            continue
+        print(f'Exported {result.path} ({result.chunks} chunks, {result.cached} cached, {result.seconds:.1f}s).')
+
+
 def get_default_book_kwargs(backend: str) -> dict:
     data = {
         'chapters': int(os.getenv('BOOKGPT_CHAPTERS', 5)),
@@ -74,6 +220,15 @@ def get_default_book_kwargs(backend: str) -> dict:
         'topic': os.getenv('BOOKGPT_TOPIC', """William a 27-year-old boy moves to an unfamiliar city and rents a house, where he will begin a new life. He is quiet, socially awkward, and dislikes interacting with people, Nevertheless, he will inevitably encounter various situations requiring social interaction in the future, as well as many moments where friends will be needed, whether for problem-solving or emotional support. Despite his quirky personality, this also makes it easier for him to find genuine friends. These friends, while tolerating his rationality and sharpness, care about him and try their best to help him resolve the problems he encounters. His life is simple. He lives frugally, spending only the necessary money on essential daily necessities. When it comes to interpersonal relationships, he highly values "choice" and "necessity." He believes that no friend or person has any obligation to do anything for him, and he himself has no justification to demand that anyone must do anything for him. If someone tells the protagonist, "You are very important to me," he would feel flustered and overwhelmed. He takes commitments seriously and will always do his utmost to fulfill promises he has made. However, he is usually cautious and tends to avoid making promises altogether. 未自华为备意录"""),
         'tolerance': float(os.getenv('BOOKGPT_TOLERANCE', 0.6)),
         'llm_backend': backend,
+        'max_workers': int(os.getenv('BOOKGPT_WORKERS', 1)),
+        # Above 1, paragraphs of a chapter are drafted concurrently and smoothed afterwards
+        'paragraph_workers': int(os.getenv('BOOKGPT_PARAGRAPH_WORKERS', 1)),
+        # 0 disables the budget and resends every earlier paragraph of the chapter
+        'context_budget': int(os.getenv('BOOKGPT_CONTEXT_TOKENS', 4096)) or None,
+        # 'json', 'schema' (Ollama JSON schema) or 'text' (the original table format)
+        'outline_format': os.getenv('BOOKGPT_OUTLINE_FORMAT', 'json').lower(),
+        # How paragraphs beyond the budget are condensed: 'llm' (an extra call each) or 'extractive'
+        'context_summaries': os.getenv('BOOKGPT_SUMMARIES', 'llm').lower(),
     }
 
     if backend == 'openai':
@@ -123,6 +278,11 @@ def collect_book_preferences(defaults: dict) -> dict:
         'topic': topic,
         'tolerance': defaults['tolerance'],
         'llm_backend': defaults['llm_backend'],
+        'max_workers': defaults['max_workers'],
+        'paragraph_workers': defaults['paragraph_workers'],
+        'context_budget': defaults['context_budget'],
+        'outline_format': defaults['outline_format'],
+        'context_summaries': defaults['context_summaries'],
     }
 
     if defaults.get('openai_model'):
@@ -131,46 +291,208 @@ def collect_book_preferences(defaults: dict) -> dict:
     return data
 
 
-def main():
-    backend = select_backend()
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Generate a book with BookGPT.')
+    parser.add_argument('--resume', metavar='JOURNAL', help='continue an interrupted book from its journal file')
+    commands = parser.add_subparsers(dest='command')
 
-    # Draw the title
-    draw('BookGPT')
+    batch = commands.add_parser('batch', help='generate every book in a JSON-lines spec file without prompts')
+    batch.add_argument('specs', help='file with one JSON object of Book arguments per line')
+    batch.add_argument('--output-dir', default='books', help='directory for the generated books (default: books)')
+    batch.add_argument('--books', type=int, default=4, help='books generated at the same time (default: 4)')
+    batch.add_argument(
+        '--limit', action='append', metavar='BACKEND=N',
+        help='maximum requests in flight per backend endpoint, e.g. --limit ollama=4; the adaptive limiter '
+             'stays below it (BOOKGPT_CONCURRENCY=fixed: exactly this, default 4)',
+    )
 
-    if get_option(['Generate a book', 'Exit']) - 1:
-        return
+    store = commands.add_parser('store', help='search, list, export and import the books in the SQLite book store')
+    store.add_argument('--db', help='store file (default: BOOKGPT_STORE or .bookgpt_books.sqlite3)')
+    actions = store.add_subparsers(dest='action', required=True)
+    search = actions.add_parser('search', help='full-text search over paragraphs, e.g. "mars AND habitat"')
+    search.add_argument('query', help='FTS5 query')
+    search.add_argument('--limit', type=int, default=20)
+    listing = actions.add_parser('list', help='list stored books, newest first')
+    listing.add_argument('--status', help='only books with this status (running, done, partial, failed, imported)')
+    listing.add_argument('--spec', metavar='BOOK_ID', type=int, help='only books generated from the same spec')
+    export = actions.add_parser('export', help='write a stored book as markdown')
+    export.add_argument('book_id', type=int)
+    export.add_argument('--output', help='markdown file (default: standard output)')
+    importing = actions.add_parser('import', help='add markdown books, e.g. the examples/ directory')
+    importing.add_argument('paths', nargs='+', help='markdown files or directories searched for *.md')
+    return parser.parse_args(argv)
+
+
+def run_batch(args: argparse.Namespace) -> None:
+    openai = import_openai() if os.getenv('OPENAI_KEY') else None
+    if openai is not None:
+        openai.api_key = os.getenv('OPENAI_KEY')
+
+    jobs = load_jobs(args.specs, args.output_dir)
+    metrics = make_metrics()
+    runner = BatchRunner(
+        jobs,
+        max_books=args.books,
+        limiter=limiter_from_env(parse_limits(args.limit), metrics=metrics),
+        cache=ResponseCache.from_env(),
+        metrics=metrics,
+        store=BookStore.from_env(),
+    )
+    report_side_effects(runner.cache, store=runner.store)
+    summary = runner.run()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary_path = os.path.join(args.output_dir, 'summary.json')
+    with open(summary_path, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, indent=2)
+
+    print(
+        f"{summary['done']} done, {summary['failed']} failed, {summary['skipped']} skipped in "
+        f"{summary['elapsed_seconds']}s: {summary['books_per_hour']} books/hour, "
+        f"{summary['words_per_minute']} words/minute."
+    )
+    print(f'Summary written to {summary_path}.')
+    export_metrics(
+        runner.metrics,
+        os.getenv('BOOKGPT_TRACE') or os.path.join(args.output_dir, 'trace.json'),
+        os.getenv('BOOKGPT_METRICS') or os.path.join(args.output_dir, 'metrics.prom'),
+    )
 
-    defaults = get_default_book_kwargs(backend)
-    book_kwargs = collect_book_preferences(defaults)
-    book = Book(**book_kwargs)
 
-    title = book.get_title()
-    print(f'Title: {title}')
+def open_store(path: Optional[str] = None) -> BookStore:
+    store = BookStore(path) if path else BookStore.from_env()
+    if store is None:
+        raise SystemExit('The book store is disabled (BOOKGPT_STORE=off); pass --db to use one.')
+    return store
 
-    while True:
-        print('Do you want to generate a new title?')
-        if get_option(['No', 'Yes']) - 1:
-            title = book.get_title()
-            print(f'Title: {title}')
+
+def markdown_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '**', '*.md'), recursive=True)))
         else:
-            break
+            files.append(path)
+    return files
 
-    print('Structure of the book:')
-    structure = book.get_structure()
-    print(structure)
 
-    while True:
-        print('Do you want to generate a new structure?')
-        if get_option(['No', 'Yes']) - 1:
-            print('Structure of the book:')
-            structure = book.get_structure()
-            print(structure)
+def run_store(args: argparse.Namespace) -> None:
+    store = open_store(args.db)
+    if args.action == 'search':
+        try:
+            results = store.search(args.query, args.limit)
+        except sqlite3.OperationalError as exc:
+            raise SystemExit(f'Invalid search query: {exc}')
+        for result in results:
+            location = f"chapter {result['chapter']}, paragraph {result['paragraph']}"
+            print(f"[{result['book_id']}] {result['book']} ({location}): {result['snippet']}")
+        if not results:
+            print('No matching paragraphs.')
+    elif args.action == 'list':
+        spec = None
+        if args.spec is not None:
+            book = store.book(args.spec)
+            if book is None:
+                raise SystemExit(f'No book with id {args.spec}.')
+            spec = json.loads(book['spec'])
+        for book in store.books(status=args.status, spec=spec):
+            print(f"[{book['id']}] {book['status']:<8} {book['paragraphs']:>4} paragraphs {book['words']:>7} words  "
+                  f"{book['title']}")
+    elif args.action == 'export':
+        try:
+            markdown = store.to_markdown(args.book_id)
+        except KeyError as exc:
+            raise SystemExit(exc.args[0])
+        if args.output:
+            write_atomically(args.output, markdown)
+            print(f'Book {args.book_id} written to {args.output}.')
         else:
-            break
+            sys.stdout.write(markdown)
+    elif args.action == 'import':
+        added = 0
+        for path in markdown_files(args.paths):
+            book_id, new = store.import_markdown(path)
+            added += new
+            print(f"[{book_id}] {'imported' if new else 'already stored'}: {path}")
+        print(f'{added} book(s) added to {store.path}.')
+
+
+def candidate_counts() -> Tuple[int, int]:
+    # Titles and outlines requested per round; the user picks one of them
+    return (
+        max(1, int(os.getenv('BOOKGPT_TITLE_CANDIDATES', 3))),
+        max(1, int(os.getenv('BOOKGPT_OUTLINE_CANDIDATES', 2))),
+    )
 
-    print('Generating book...')
+
+def pick_title(book: Book, count: int) -> str:
+    fresh = False
+    while True:
+        titles = book.title_candidates(count, fresh=fresh)
+        print('Choose a title:')
+        selection = get_option(titles + ['Generate new titles'])
+        if selection <= len(titles):
+            return book.use_title(titles[selection - 1])
+        fresh = True
+
+
+def pick_structure(book: Book, count: int) -> Optional[str]:
+    def choose(outlines: List[Outline]) -> Optional[Outline]:
+        for index, outline in enumerate(outlines, start=1):
+            print(f'Structure {index}:')
+            print(outline.to_text())
+            print()
+        print('Choose a structure:')
+        selection = get_option([f'Structure {index}' for index in range(1, len(outlines) + 1)] + ['Generate new structures'])
+        return outlines[selection - 1] if selection <= len(outlines) else None
+
+    try:
+        return book.ensure_structure(candidates=count, choose=choose)
+    except RuntimeError:
+        return None
+
+
+def make_stream_printer(max_workers: int, paragraph_workers: int = 1) -> Optional[StreamPrinter]:
+    # Streaming output only makes sense while one paragraph is written at a time
+    if os.getenv('BOOKGPT_STREAM', '1') != '0' and max_workers == 1 and paragraph_workers == 1:
+        return StreamPrinter(os.getenv('BOOKGPT_STREAM_FILE'))
+    return None
+
+
+def new_journal_path() -> str:
+    return os.getenv('BOOKGPT_JOURNAL') or f"book_{datetime.now():%Y%m%d-%H%M%S}.journal.jsonl"
+
+
+def make_writer() -> BookWriter:
+    # The book is written to <name>.md.part as paragraphs finish and renamed when it is complete
+    return BookWriter(
+        directory=os.getenv('BOOKGPT_OUTPUT_DIR', '.'),
+        flush_interval=float(os.getenv('BOOKGPT_FLUSH_SECONDS', 1.0)),
+    )
+
+
+def write_book(book: Book, printer: Optional[StreamPrinter]) -> None:
+    report_side_effects(book.cache, book.context_summaries if book.context_budget else None, book.store)
+
+    title_count, outline_count = candidate_counts()
+    if not hasattr(book, 'title'):
+        print(f'Title: {pick_title(book, title_count)}')
+
+    # A resumed book keeps the structure it has
+    if pick_structure(book, outline_count) is None:
+        print('The model did not return a usable book structure.')
+        return
 
     book.finish_base()
+    # Learned from earlier runs with the same backend, model and endpoint, and updated after this one
+    history = ThroughputHistory.from_env()
+    estimate = estimate_book(book, history)
+    print(estimate.summary())
+    if get_option(['Generate the book', 'Exit']) - 1:
+        return
+
+    print('Generating book...')
+    before = usage_totals(book.metrics)
     try:
         book.get_content()
     except Exception as exc:
@@ -180,9 +502,75 @@ def main():
         else:
             print(f'Failed to generate the book: {exc}')
         return
+    finally:
+        if printer is not None:
+            printer.finish()
+            printer.close()
+        report_first_token_latency(book)
+        report_endpoints(book)
+        export_metrics(book.metrics)
+        if book.cache is not None:
+            stats = book.cache.stats()
+            print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate).")
+
+    if history is not None:
+        print(format_errors(history.record(estimate, before, usage_totals(book.metrics))))
 
     path = book.save_book()
     print(f'Book saved to {path}.')
+    export_book(book.to_markdown(), path)
+
+
+def main():
+    args = parse_args()
+    if args.command == 'batch':
+        run_batch(args)
+        return
+    if args.command == 'store':
+        run_store(args)
+        return
+
+    backend = select_backend()
+
+    # Draw the title
+    draw('BookGPT')
+    metrics = make_metrics()
+    # Tunes the requests in flight from the backend's latency, up to the number of workers
+    limiter = limiter_from_env(metrics=metrics)
+    store = BookStore.from_env()
+
+    if args.resume:
+        max_workers = int(os.getenv('BOOKGPT_WORKERS', 1))
+        paragraph_workers = int(os.getenv('BOOKGPT_PARAGRAPH_WORKERS', 1))
+        printer = make_stream_printer(max_workers, paragraph_workers)
+        book = Book.resume(
+            args.resume, max_workers=max_workers, paragraph_workers=paragraph_workers, on_token=printer, cache=ResponseCache.from_env(), metrics=metrics,
+            limiter=limiter, writer=make_writer(), store=store,
+        )
+    else:
+        if get_option(['Generate a book', 'Exit']) - 1:
+            return
+
+        defaults = get_default_book_kwargs(backend)
+        book_kwargs = collect_book_preferences(defaults)
+        printer = make_stream_printer(book_kwargs['max_workers'], book_kwargs['paragraph_workers'])
+        journal_path = new_journal_path()
+        print(f'Progress is journaled to {journal_path}; continue an interrupted run with --resume {journal_path}')
+        journal = GenerationJournal(journal_path)
+        try:
+            book = Book(
+                **book_kwargs, on_token=printer, cache=ResponseCache.from_env(), metrics=metrics, limiter=limiter,
+                journal=journal, writer=make_writer(), store=store,
+            )
+        except BaseException:
+            journal.close()
+            raise
+
+    try:
+        write_book(book, printer)
+    finally:
+        # Also after an exit from a menu or an error, so the journal and an unfinished .part file are closed
+        book.close()
 
 # Run the main function
 if __name__ == "__main__":
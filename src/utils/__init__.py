@@ -1,3 +1,5 @@
 from .utils import draw_data_structure
 from .utils import get_python_files
 from .utils import get_categories
+from .utils import get_html
+from .utils import get_mp3
@@ -1,6 +1,4 @@
 import os
-import markdown
-from gtts import gTTS
 
 
 def draw_data_structure(data, indent=0):
@@ -12,11 +10,16 @@ def draw_data_structure(data, indent=0):
             print(' ' * (indent + 2) + str(value))
 
 
+# markdown and gtts are imported on first use, so importing utils stays cheap
 def get_html(markdown_file):
+    import markdown
+
     return markdown.markdown(markdown_file)
 
 
 def get_mp3(markdown_file, language):
+    from gtts import gTTS
+
     return gTTS(markdown_file, lang=language)
 
 
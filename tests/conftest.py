@@ -0,0 +1,31 @@
+"""Make the flat modules in ``src/`` and ``benchmarks/`` importable the way the CLI and benchmarks import them."""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import request_log  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_files(tmp_path, monkeypatch):
+    """Keep the request log, caches, book store and throughput history of every test under its tmp_path."""
+
+    for name, filename in (
+        ('BOOKGPT_LOG_PATH', 'log.jsonl'),
+        ('BOOKGPT_CACHE', 'cache.sqlite3'),
+        ('BOOKGPT_STORE', 'books.sqlite3'),
+        ('BOOKGPT_THROUGHPUT', 'throughput.json'),
+        ('BOOKGPT_EXPORT_CACHE', 'export_cache'),
+    ):
+        monkeypatch.setenv(name, str(tmp_path / filename))
+    # The process-wide log reads its path once, so each test starts a fresh one
+    monkeypatch.setattr(request_log, '_default_log', None)
+    yield
+    if request_log._default_log is not None:
+        request_log._default_log.close()
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+import backends
+import ollama_client
+from book import Book
+
+
+class _AsyncChat:
+    def __init__(self):
+        self.calls = []
+
+    async def chat(self, messages, **kwargs):
+        self.calls.append(kwargs)
+        return '{"ok": true}'
+
+
+def test_async_requests_forward_format_and_token_limit():
+    # Regression: the async Ollama path dropped the output format and the max-token limit
+    client = ollama_client.OllamaClient('http://localhost:1', 'model')
+    book = Book(llm_backend='ollama', ollama_client=client, ollama_options={'temperature': 0.5})
+    book._async_ollama_client = _AsyncChat()
+    reply = asyncio.run(book.aget_response([book.get_message('user', 'hi')], target_words=100, output_format='json'))
+
+    assert reply == '{"ok": true}'
+    call = book._async_ollama_client.calls[0]
+    assert call['format'] == 'json'
+    assert call['options']['temperature'] == 0.5
+    assert call['options']['num_predict'] > 100
+    client.close()
+
+
+class _MinimalProvider(backends.Provider):
+    name = 'minimal'
+
+    def __init__(self):
+        self.calls = 0
+
+    def model_name(self, book):
+        return 'minimal'
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        self.calls += 1
+        usage.update({'prompt_tokens': 10, 'completion_tokens': 2, 'host': 'local'})
+        return f'reply {self.calls}'
+
+
+def test_provider_requires_model_name_and_request():
+    class Incomplete(backends.Provider):
+        def model_name(self, book):
+            return 'incomplete'
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_request_samples_defaults_to_one_request_per_reply():
+    provider = _MinimalProvider()
+    usage = {}
+    assert provider.request_samples(None, [], usage, 3) == ['reply 1', 'reply 2', 'reply 3']
+    assert usage == {'prompt_tokens': 30, 'completion_tokens': 6, 'host': 'local'}
+
+
+def test_registered_provider_with_only_the_abstract_methods_writes_candidates():
+    backends.register('minimal', _MinimalProvider)
+    book = Book(llm_backend='minimal', cache=None)
+    assert sorted(book.get_responses([book.get_message('user', 'title?')], 2, fresh=True)) == ['reply 1', 'reply 2']
+    assert list(book.provider.stream(book, [])) == ['reply 3']
@@ -0,0 +1,43 @@
+import os
+
+import batch
+from batch import BatchJob, BatchRunner, output_path_for
+
+
+class _Journal(batch.GenerationJournal):
+    opened = []
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.opened.append(self)
+
+
+def _jobs(tmp_path, *specs):
+    return [BatchJob(index, spec, output_path_for(spec, index, str(tmp_path))) for index, spec in enumerate(specs)]
+
+
+def test_jobs_close_their_journal_and_writer(tmp_path, monkeypatch):
+    # Regression: every job left its journal (and, on failure, its .part file) open until exit
+    monkeypatch.setattr(batch, 'GenerationJournal', _Journal)
+    _Journal.opened.clear()
+    jobs = _jobs(
+        tmp_path,
+        {'topic': 'Mars', 'category': 'SF', 'chapters': 1, 'words_per_chapter': 200, 'backend': 'fake',
+         'context_summaries': 'extractive'},
+        {'topic': 'Rome', 'category': 'History', 'chapters': 1, 'words_per_chapter': 200, 'backend': 'missing'},
+    )
+    runner = BatchRunner(jobs, max_books=2)
+    summary = runner.run()
+
+    assert [job.status for job in jobs] == ['done', 'failed']
+    assert summary['done'] == 1
+    assert os.path.exists(jobs[0].output_path)
+    assert len(_Journal.opened) == 2
+    assert all(journal._file.closed for journal in _Journal.opened)
+
+
+def test_finished_outputs_are_skipped(tmp_path):
+    jobs = _jobs(tmp_path, {'topic': 'Mars', 'backend': 'fake'})
+    with open(jobs[0].output_path, 'w', encoding='utf-8') as file:
+        file.write('# Done\n')
+    assert BatchRunner(jobs).run()['skipped'] == 1
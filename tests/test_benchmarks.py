@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+import requests
+
+import bench_book
+from mock_server import MockConfig, MockServer, canned_structure
+from outline import parse_outline
+
+BENCH_BOOK = os.path.join(os.path.dirname(os.path.abspath(bench_book.__file__)), 'bench_book.py')
+
+
+@pytest.fixture
+def server():
+    def start(**config):
+        started.append(MockServer(MockConfig(latency=0.0, **config)).start())
+        return started[-1]
+
+    started = []
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def _chat(server, messages, **request):
+    return requests.post(f'{server.base_url}/api/chat', json={'messages': messages, **request}, timeout=5)
+
+
+@pytest.mark.parametrize('json_mode', [False, True])
+def test_canned_structure_matches_the_requested_book(json_mode):
+    outline = parse_outline(canned_structure('chapters: 3; words_per_chapter: 800', json_mode=json_mode))
+    assert len(outline.chapters) == 3
+    assert [chapter.words for chapter in outline.chapters] == [800, 800, 800]
+
+
+def test_mock_server_writes_the_requested_length_and_honours_num_predict(server):
+    mock = server(length_accuracy=1.0)
+    messages = [{'role': 'system', 'content': 'You are a writer.'}, {'role': 'user', 'content': '!w 1 1 (40 words)'}]
+    reply = _chat(mock, messages).json()
+    assert len(reply['message']['content'].split()) == 40
+    assert reply['eval_count'] == 40
+    truncated = _chat(mock, messages, options={'num_predict': 10}).json()
+    assert len(truncated['message']['content'].split()) == 10
+    assert mock.requests == 2
+
+
+def test_mock_server_injects_failures_with_retry_after(server):
+    response = _chat(server(error_rate=1.0), [{'role': 'user', 'content': 'hi'}])
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '0'
+
+
+def test_compare_flags_regressions(tmp_path, capsys):
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'metrics': {'latency_p50': 1.0, 'peak_rss_mb': 100.0}}), encoding='utf-8')
+    assert bench_book.compare({'metrics': {'latency_p50': 1.1, 'peak_rss_mb': 90.0}}, str(baseline), 0.15)
+    assert not bench_book.compare({'metrics': {'latency_p50': 1.2, 'peak_rss_mb': 90.0}}, str(baseline), 0.15)
+    assert 'REGRESSION' in capsys.readouterr().out
+    assert bench_book.percentile([3.0, 1.0, 2.0], 0.5) == 2.0
+
+
+def test_book_benchmark_runs_end_to_end(tmp_path):
+    output = tmp_path / 'result.json'
+    result = subprocess.run(
+        [sys.executable, BENCH_BOOK, '--books', '1', '--chapters', '1', '--words', '200', '--latency', '0',
+         '--output', str(output)],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    metrics = json.loads(output.read_text(encoding='utf-8'))['metrics']
+    assert metrics['books'] == 1
+    assert metrics['paragraphs'] == 4
+    assert metrics['calls'] >= 6
@@ -0,0 +1,238 @@
+import threading
+import time
+
+import pytest
+
+import backends
+from book import Book
+from journal import GenerationJournal
+from response_cache import ResponseCache
+from retry import PermanentError
+
+SPEC = {'topic': 'Mars', 'category': 'Science', 'language': 'English', 'words_per_chapter': 200,
+        'context_summaries': 'extractive'}
+
+
+class _TrackingProvider(backends.FakeProvider):
+    """Fake replies, slowed down, counting calls and how many run at once."""
+
+    def __init__(self):
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.01)
+            return super().request(book, prompt, usage, max_tokens, output_format)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _book(**kwargs):
+    backends.register('tracking', _TrackingProvider)
+    book = Book(**{**SPEC, 'llm_backend': 'tracking', **kwargs})
+    book.get_title()
+    book.ensure_structure()
+    return book
+
+
+def test_chapters_are_written_concurrently_in_order():
+    sequential = _book(chapters=4).get_content()
+    book = _book(chapters=4, max_workers=2)
+    assert book.get_content() == sequential
+    assert book.provider.peak == 2
+    assert book.status == 16
+
+
+def test_tokens_are_streamed_to_on_token_per_step():
+    tokens = {}
+    book = _book(chapters=1, on_token=lambda step, token: tokens.setdefault(step, []).append(token))
+    content = book.get_content()
+
+    assert ''.join(tokens['title']) == book.title
+    # JSON outlines are not streamed; the rendered structure is shown instead
+    assert tokens['structure'] == [book.structure]
+    for index, paragraph in enumerate(content[0], start=1):
+        assert len(tokens[f'1.{index}']) > 1
+        assert ''.join(tokens[f'1.{index}']).strip() == paragraph.strip()
+
+
+class _FlakyProvider(_TrackingProvider):
+    """Fails every paragraph call once ``paragraphs_left`` reaches zero; None never fails."""
+
+    paragraphs_left = None
+    paragraph_calls = 0
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        if prompt[-1]['content'].startswith('!w'):
+            if _FlakyProvider.paragraphs_left == 0:
+                raise PermanentError('the model went away')
+            if _FlakyProvider.paragraphs_left is not None:
+                _FlakyProvider.paragraphs_left -= 1
+            _FlakyProvider.paragraph_calls += 1
+        return super().request(book, prompt, usage, max_tokens, output_format)
+
+
+def test_an_interrupted_book_resumes_from_its_journal(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    backends.register('flaky', _FlakyProvider)
+    expected = _book(chapters=2).get_content()
+
+    path = str(tmp_path / 'book.journal.jsonl')
+    _FlakyProvider.paragraphs_left = 5
+    book = _book(chapters=2, llm_backend='flaky', journal=GenerationJournal(path))
+    with pytest.raises(RuntimeError):
+        book.get_content()
+    book.close()
+
+    _FlakyProvider.paragraphs_left = None
+    _FlakyProvider.paragraph_calls = 0
+    resumed = Book.resume(path)
+    assert (resumed.title, resumed.structure) == (book.title, book.structure)
+    assert resumed.status == 5
+    resumed.ensure_structure()
+    assert resumed.get_content() == expected
+    # Only the three paragraphs missing from the journal were requested
+    assert _FlakyProvider.paragraph_calls == 3
+    resumed.close()
+
+
+def test_a_line_cut_short_by_a_crash_ends_the_journal(tmp_path):
+    path = str(tmp_path / 'book.journal.jsonl')
+    journal = GenerationJournal(path)
+    journal.record('spec', kwargs={'topic': 'Mars'})
+    journal.record('title', title='Red Dust')
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write('{"type": "structure", "struct')
+
+    assert [record['type'] for record in GenerationJournal.read(path)] == ['spec', 'title']
+    assert Book.resume(path, llm_backend='fake').title == 'Red Dust'
+
+
+class _DraftingProvider(_TrackingProvider):
+    """Records paragraph prompts and rewrites every opening it is asked to smooth."""
+
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        if prompt[0]['content'].startswith('You are an editing'):
+            return 'Then, continuing the story.'
+        if prompt[-1]['content'].startswith('!w'):
+            self.prompts.append(list(prompt))
+        return super().request(book, prompt, usage, max_tokens, output_format)
+
+
+def test_paragraphs_are_drafted_concurrently_from_the_outline(tmp_path):
+    backends.register('drafting', _DraftingProvider)
+    path = str(tmp_path / 'book.journal.jsonl')
+    book = _book(chapters=1, paragraph_workers=4, llm_backend='drafting', journal=GenerationJournal(path))
+    paragraphs = book.get_content()[0]
+    book.close()
+    provider = book.provider
+
+    assert len(paragraphs) == 4 and book.status == 4
+    assert provider.peak > 1
+    # Each draft sees the outline and a handoff note instead of the paragraphs before it
+    for prompt in provider.prompts:
+        assert prompt[-2]['content'].startswith('Handoff: you are writing paragraph')
+        assert not any(message['role'] == 'assistant' and message['content'] in paragraphs for message in prompt)
+    # Every opening after the first is smoothed, in order, and journaled
+    assert not paragraphs[0].startswith('Then, continuing')
+    assert all(paragraph.startswith('Then, continuing the story.') for paragraph in paragraphs[1:])
+    assert sum(record.get('smoothed', False) for record in GenerationJournal.read(path)) == 3
+
+
+def test_smoothed_chapters_resume_without_a_new_smoothing_pass(tmp_path):
+    backends.register('drafting', _DraftingProvider)
+    path = str(tmp_path / 'book.journal.jsonl')
+    book = _book(chapters=1, paragraph_workers=4, llm_backend='drafting', journal=GenerationJournal(path))
+    paragraphs = book.get_content()[0]
+    book.close()
+
+    resumed = Book.resume(path)
+    calls = resumed.provider.calls
+    assert resumed.get_content()[0] == paragraphs
+    assert resumed.provider.calls == calls
+    resumed.close()
+
+
+class _SamplingProvider(_TrackingProvider):
+    """Numbers every title and records each structure prompt, so candidates differ and can be compared."""
+
+    def __init__(self):
+        super().__init__()
+        self.titles = 0
+        self.structure_prompts = []
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        reply = super().request(book, prompt, usage, max_tokens, output_format)
+        if prompt[0]['content'].startswith('You are a title'):
+            with self._lock:
+                self.titles += 1
+                return f'"Title {self.titles}"'
+        if prompt[0]['content'].startswith('You are a book structure'):
+            self.structure_prompts.append(list(prompt))
+        return reply
+
+
+class _MultiSampleProvider(_SamplingProvider):
+    supports_samples = True
+
+    def request_samples(self, book, prompt, usage, n, output_format=None):
+        self.sample_calls = getattr(self, 'sample_calls', 0) + 1
+        return [f'"Sample {index}"' for index in range(n)]
+
+
+def test_title_candidates_are_requested_at_once_and_cached_as_a_set(tmp_path):
+    backends.register('sampling', _SamplingProvider)
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'))
+    book = Book(**SPEC, llm_backend='sampling', cache=cache)
+    titles = book.title_candidates(3)
+    assert len(titles) == 3 and len(set(titles)) == 3
+    assert book.provider.peak == 3
+
+    calls = book.provider.calls
+    assert book.title_candidates(3) == titles
+    assert book.provider.calls == calls
+    fresh = book.title_candidates(3, fresh=True)
+    assert book.provider.calls == calls + 3
+    assert not set(fresh) & set(titles)
+    assert book.use_title(fresh[1]) == book.title == fresh[1]
+
+
+def test_backends_with_samples_answer_all_candidates_in_one_call():
+    backends.register('multi', _MultiSampleProvider)
+    book = Book(**SPEC, llm_backend='multi')
+    assert book.title_candidates(3) == ['"Sample 0"', '"Sample 1"', '"Sample 2"']
+    assert book.provider.sample_calls == 1
+    assert book.provider.calls == 0
+
+
+def test_structure_rounds_send_the_same_prompt_and_choose_picks_one():
+    backends.register('sampling', _SamplingProvider)
+    book = Book(**SPEC, chapters=2, llm_backend='sampling')
+    book.get_title()
+    rounds = []
+
+    def choose(outlines):
+        rounds.append(outlines)
+        # Reject the first round, as a user asking for new structures would
+        return outlines[-1] if len(rounds) == 2 else None
+
+    structure = book.ensure_structure(candidates=2, choose=choose)
+    assert [len(outlines) for outlines in rounds] == [2, 2]
+    assert structure == str(book.structure) and len(book.chapters) == 2
+    # Regenerations start from the fixed prompt instead of one that grows every round
+    prompts = book.provider.structure_prompts
+    assert len(prompts) == 4
+    assert all(prompt == prompts[0] for prompt in prompts)
@@ -0,0 +1,76 @@
+from book import Book
+from book_store import BookStore, parse_book_markdown
+
+OLD_LAYOUT = """# Life On Mars
+
+## Information:
+- Chapters: 2
+- Runtime: 1.5 min
+
+## 1. Arrival
+
+The habitat hummed as the crew stepped inside.
+
+Dust covered every window.
+
+## 2. Storms
+
+A storm rolled over the crater for three days.
+"""
+
+
+def _write(tmp_path, name, text, encoding='utf-8'):
+    path = tmp_path / name
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+
+def test_parse_older_markdown_layout():
+    parsed = parse_book_markdown(OLD_LAYOUT)
+    assert parsed['title'] == 'Life On Mars'
+    assert [chapter['title'] for chapter in parsed['chapters']] == ['Arrival', 'Storms']
+    assert [len(chapter['paragraphs']) for chapter in parsed['chapters']] == [2, 1]
+
+
+def test_import_search_and_export(tmp_path):
+    store = BookStore(str(tmp_path / 'books.sqlite3'))
+    book_id, new = store.import_markdown(_write(tmp_path, 'mars.md', OLD_LAYOUT.replace('\n', '\r\n'), 'cp1252'))
+    assert new
+    assert store.import_markdown(_write(tmp_path, 'copy.md', OLD_LAYOUT.replace('\n', '\r\n'), 'cp1252')) == (book_id, False)
+
+    results = store.search('habitat AND crew')
+    assert [(result['chapter'], result['paragraph']) for result in results] == [(1, 1)]
+    assert '[habitat]' in results[0]['snippet']
+
+    listed = store.books(status='imported')
+    assert listed[0]['paragraphs'] == 3 and listed[0]['seconds'] == 90
+    markdown = store.to_markdown(book_id)
+    assert markdown.startswith('# Life On Mars\n\n## Chapter 1: Arrival\n')
+    assert 'Dust covered every window.' in markdown
+
+
+def test_paragraph_updates_replace_the_indexed_text(tmp_path):
+    store = BookStore(str(tmp_path / 'books.sqlite3'))
+    book_id = store.start_book({'topic': 'Mars'}, 'Mars', None, [{'title': 'One'}])
+    store.add_paragraphs(book_id, [(0, 0, 'Start', 'An old draft about rovers.', 100, 1)])
+    store.add_paragraphs(book_id, [(0, 0, 'Start', 'A final text about habitats.', 100, 2)])
+    assert store.search('rovers') == []
+    assert len(store.search('habitats')) == 1
+    assert store.books(spec={'topic': 'Mars'})[0]['calls'] == 2
+
+
+def test_generated_book_is_recorded(tmp_path):
+    store = BookStore(str(tmp_path / 'books.sqlite3'))
+    book = Book(
+        llm_backend='fake', topic='Mars', category='SF', chapters=2, words_per_chapter=200,
+        context_summaries='extractive', store=store,
+    )
+    book.get_title()
+    book.get_structure()
+    book.finish_base()
+    content = book.get_content()
+
+    recorded = store.books()[0]
+    assert recorded['status'] == 'done'
+    assert recorded['paragraphs'] == sum(len(chapter) for chapter in content)
+    assert store.to_markdown(book.store_book_id) == book.to_markdown()
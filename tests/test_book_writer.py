@@ -0,0 +1,105 @@
+import os
+from datetime import datetime
+
+from book import Book
+from book_writer import PARTIAL_NOTE, BookWriter, book_filename, write_atomically
+
+CHAPTERS = [
+    {'title': 'Landing', 'paragraphs': [{'title': 'Descent'}, {'title': 'Touchdown'}]},
+    {'title': 'Base', 'paragraphs': [{'title': 'Shelter'}]},
+]
+
+
+def test_the_book_is_renamed_into_place_only_when_finished(tmp_path):
+    path = str(tmp_path / 'book.md')
+    writer = BookWriter(path, flush_interval=0)
+    writer.open('Red Dust', CHAPTERS)
+    writer.add(0, 0, 'The lander fell.')
+    assert not os.path.exists(path)
+    with open(f'{path}.part', encoding='utf-8') as file:
+        assert 'The lander fell.' in file.read()
+
+    writer.add(0, 1, 'It landed.')
+    writer.add(1, 0, 'They dug in.  ')
+    assert writer.finish() == path
+    assert not os.path.exists(f'{path}.part')
+    with open(path, encoding='utf-8') as file:
+        assert file.read() == (
+            '# Red Dust\n\n## Chapter 1: Landing\n\n### Descent\n\nThe lander fell.\n\n### Touchdown\n\nIt landed.\n'
+            '\n\n## Chapter 2: Base\n\n### Shelter\n\nThey dug in.\n'
+        )
+
+
+def test_paragraphs_out_of_order_wait_for_the_gap(tmp_path):
+    path = str(tmp_path / 'book.md')
+    writer = BookWriter(path, flush_interval=0)
+    writer.open('Red Dust', CHAPTERS)
+    writer.add(1, 0, 'They dug in.')
+    with open(f'{path}.part', encoding='utf-8') as file:
+        assert 'They dug in.' not in file.read()
+    writer.add(0, 1, 'It landed.')
+    writer.add(0, 0, 'The lander fell.')
+    writer.finish()
+    with open(path, encoding='utf-8') as file:
+        text = file.read()
+    assert text.index('The lander fell.') < text.index('It landed.') < text.index('They dug in.')
+
+
+def test_a_partial_book_gets_its_own_name_and_a_note(tmp_path):
+    path = str(tmp_path / 'book.md')
+    writer = BookWriter(path, flush_interval=0)
+    writer.open('Red Dust', CHAPTERS)
+    writer.add(0, 0, 'The lander fell.')
+    writer.add(1, 0, 'They dug in.')
+    target = writer.finish(partial=True)
+
+    assert target == str(tmp_path / 'book_partial.md')
+    assert not os.path.exists(path) and not os.path.exists(f'{path}.part')
+    with open(target, encoding='utf-8') as file:
+        text = file.read()
+    assert text.startswith(f'# Red Dust\n\n{PARTIAL_NOTE}\n')
+    assert 'The lander fell.' in text and 'They dug in.' in text
+
+
+def test_close_keeps_the_part_file(tmp_path):
+    path = str(tmp_path / 'book.md')
+    writer = BookWriter(path)
+    writer.open('Red Dust', CHAPTERS)
+    writer.add(0, 0, 'The lander fell.')
+    writer.close()
+    assert not os.path.exists(path)
+    with open(f'{path}.part', encoding='utf-8') as file:
+        assert 'The lander fell.' in file.read()
+
+
+def test_book_filenames_never_collide(tmp_path):
+    when = datetime(2026, 1, 2, 3, 4, 5)
+    first = book_filename('Red Dust!', str(tmp_path), when=when)
+    assert os.path.basename(first) == 'book_20260102-030405_red-dust.md'
+    write_atomically(first, '# Red Dust\n')
+    second = book_filename('Red Dust!', str(tmp_path), when=when)
+    assert os.path.basename(second) == 'book_20260102-030405_red-dust-2.md'
+    assert not os.path.exists(f'{first}.part')
+
+
+def test_a_streamed_book_matches_its_markdown(tmp_path):
+    path = str(tmp_path / 'book.md')
+    book = Book(topic='Mars', category='Science', chapters=2, words_per_chapter=200, llm_backend='fake',
+                context_summaries='extractive', max_workers=2, writer=BookWriter(path))
+    book.get_title()
+    book.ensure_structure()
+    book.get_content()
+    assert book.save_book() == path
+    with open(path, encoding='utf-8') as file:
+        assert file.read() == book.to_markdown()
+
+
+def test_without_retained_content_the_book_only_lives_in_the_file(tmp_path):
+    path = str(tmp_path / 'book.md')
+    book = Book(topic='Mars', category='Science', chapters=2, words_per_chapter=200, llm_backend='fake',
+                context_summaries='extractive', writer=BookWriter(path), retain_content=False)
+    book.get_title()
+    book.ensure_structure()
+    assert book.get_content() == [[], []]
+    with open(book.save_book(), encoding='utf-8') as file:
+        assert file.read().count('### ') == 8
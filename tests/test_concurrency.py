@@ -0,0 +1,183 @@
+import threading
+import time
+
+from book import Book
+from concurrency import AdaptiveLimiter, ConcurrencyLimiter, limiter_from_env
+from metrics import Metrics
+from ollama_client import EndpointConfig, OllamaError
+from ollama_router import OllamaRouter
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+
+
+def test_fixed_limits_fall_back_to_the_backend():
+    limiter = ConcurrencyLimiter({'ollama': 2}, default=5)
+    assert limiter.limit('ollama:http://gpu1:11434') == 2
+    assert limiter.limit('openai') == 5
+
+
+def test_limiter_from_env(monkeypatch):
+    monkeypatch.setenv('BOOKGPT_CONCURRENCY', 'fixed')
+    limiter = limiter_from_env()
+    assert type(limiter) is ConcurrencyLimiter and limiter.limit('ollama') == 4
+    monkeypatch.setenv('BOOKGPT_CONCURRENCY', 'adaptive')
+    monkeypatch.setenv('BOOKGPT_CONCURRENCY_INITIAL', '3')
+    assert limiter_from_env().limit('ollama') == 3
+
+
+def test_adaptive_limit_starts_below_the_configured_ceiling():
+    limiter = AdaptiveLimiter({'ollama': 2}, initial=4)
+    assert limiter.limit('ollama:http://gpu1:11434') == 2
+    assert limiter.limit('openai') == 4
+
+
+def _saturate(limiter, key, seconds, tokens=100, calls=1):
+    # Complete calls while the limit is fully in use, so the limiter may grow
+    for _ in range(calls):
+        limit = limiter.limit(key)
+        for _ in range(limit):
+            limiter.acquire(key)
+        for _ in range(limit):
+            limiter.release(key, seconds, tokens)
+
+
+def test_healthy_saturated_calls_raise_the_limit():
+    limiter = AdaptiveLimiter(initial=2, max_limit=8)
+    _saturate(limiter, 'ollama', 0.2, calls=10)
+    assert 2 < limiter.limit('ollama') <= 8
+
+
+def test_idle_limit_does_not_grow():
+    limiter = AdaptiveLimiter(initial=2)
+    for _ in range(20):
+        limiter.acquire('ollama')
+        limiter.release('ollama', 0.2, 100)
+    assert limiter.limit('ollama') == 2
+
+
+def test_overload_errors_back_off_once_per_window():
+    metrics = Metrics()
+    limiter = AdaptiveLimiter(initial=10, backoff=0.5, metrics=metrics)
+    for _ in range(3):
+        limiter.acquire('ollama')
+    for _ in range(3):
+        limiter.release('ollama', error=HTTPError(503))
+    assert limiter.limit('ollama') == 5
+    assert metrics.total('llm_concurrency_decreases_total', key='ollama', reason='error') == 1
+
+
+def test_bad_requests_do_not_lower_the_limit():
+    limiter = AdaptiveLimiter(initial=10)
+    limiter.acquire('ollama')
+    limiter.release('ollama', error=HTTPError(400))
+    assert limiter.limit('ollama') == 10
+
+
+def test_rising_latency_lowers_the_limit():
+    limiter = AdaptiveLimiter(initial=8, smoothing=1.0)
+    limiter.acquire('ollama')
+    limiter.release('ollama', 0.2, 100)
+    limiter.acquire('ollama')
+    limiter.release('ollama', 0.8, 100)
+    assert limiter.limit('ollama') < 8
+
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = AdaptiveLimiter(initial=1)
+    limiter.acquire('ollama')
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (limiter.acquire('ollama'), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.05)
+    limiter.release('ollama', 0.01)
+    assert acquired.wait(1)
+    waiter.join()
+
+
+class _Host:
+    """Stands in for the OllamaClient of one routed host."""
+
+    def __init__(self, base_url, seconds=0.0):
+        self.base_url = base_url
+        self.model = 'model'
+        self.seconds = seconds
+        self.calls = 0
+
+    def chat(self, messages, usage=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.seconds)
+        if usage is not None:
+            usage['completion_tokens'] = 10
+        return 'reply'
+
+    def chat_stream(self, messages, usage=None, **kwargs):
+        self.calls += 1
+        yield from ['a', ' b', ' c']
+
+    def close(self):
+        pass
+
+
+def _router(limiter, *hosts):
+    router = OllamaRouter([EndpointConfig(host.base_url) for host in hosts], 'model', health_interval=0, limiter=limiter)
+    for endpoint, host in zip(router.endpoints, hosts):
+        endpoint.client = host
+    return router
+
+
+def test_router_takes_a_slot_per_host():
+    # Regression: all routed hosts shared the limiter key of the whole pool
+    limiter = AdaptiveLimiter(initial=2)
+    router = _router(limiter, _Host('http://gpu1:11434'), _Host('http://gpu2:11434'))
+    for _ in range(4):
+        router.chat([{'role': 'user', 'content': 'hi'}])
+    list(router.chat_stream([{'role': 'user', 'content': 'hi'}]))
+    assert set(limiter._states) == {'ollama:http://gpu1:11434', 'ollama:http://gpu2:11434'}
+    assert router.limit() == 4
+
+
+def test_router_releases_a_stream_the_caller_stops_reading():
+    limiter = AdaptiveLimiter(initial=1)
+    router = _router(limiter, _Host('http://gpu1:11434'))
+    stream = router.chat_stream([{'role': 'user', 'content': 'hi'}])
+    next(stream)
+    stream.close()
+    assert limiter._states['ollama:http://gpu1:11434'].in_flight == 0
+
+
+def test_router_prefers_the_host_with_free_slots():
+    limiter = AdaptiveLimiter({'ollama:http://gpu1:11434': 1, 'ollama:http://gpu2:11434': 4}, initial=4)
+    slow, fast = _Host('http://gpu1:11434', 0.05), _Host('http://gpu2:11434', 0.05)
+    router = _router(limiter, slow, fast)
+    threads = [threading.Thread(target=router.chat, args=([{'role': 'user', 'content': 'hi'}],)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fast.calls > slow.calls
+
+
+def test_books_on_a_router_leave_the_slot_to_it():
+    limiter = AdaptiveLimiter(initial=2)
+    router = _router(None, _Host('http://gpu1:11434'), _Host('http://gpu2:11434'))
+    book = Book(llm_backend='ollama', ollama_client=router, limiter=limiter, context_summaries='extractive')
+    book.get_response([book.get_message('user', 'hi')], use_cache=False, stream=False)
+    assert router.limiter is limiter
+    assert book._limiter_key() is None
+    assert set(limiter._states) == {'ollama:http://gpu1:11434', 'ollama:http://gpu2:11434'}
+    assert book.request_limit() == 4
+
+
+def test_router_failover_still_reports_errors():
+    class Down(_Host):
+        def chat(self, messages, usage=None, **kwargs):
+            raise OllamaError('connection refused')
+
+    limiter = AdaptiveLimiter(initial=4)
+    router = _router(limiter, Down('http://gpu1:11434'), _Host('http://gpu2:11434'))
+    assert router.chat([{'role': 'user', 'content': 'hi'}]) == 'reply'
+    assert limiter.limit('ollama:http://gpu1:11434') < 4
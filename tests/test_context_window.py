@@ -0,0 +1,81 @@
+import backends
+from book import Book
+from context_window import ContextWindow, count_prompt_tokens, extractive_summary
+
+BASE = [{'role': 'system', 'content': 'You write books.'}]
+PARAGRAPH = 'The rover crossed the plain. ' * 20
+
+
+def _window(budget):
+    summarized = []
+
+    def summarize(chapter_index, paragraph_index, text):
+        summarized.append(paragraph_index)
+        return f'summary {paragraph_index + 1}'
+
+    return ContextWindow(BASE, budget, summarize), summarized
+
+
+def test_without_a_budget_every_paragraph_stays_verbatim():
+    window, summarized = _window(None)
+    for index in range(10):
+        window.add(0, index, PARAGRAPH)
+    assert summarized == []
+    assert len(window.messages()) == 1 + 2 * 10
+
+
+def test_evicted_paragraphs_are_summarized_within_the_budget():
+    window, summarized = _window(600)
+    for index in range(10):
+        window.add(0, index, f'{index} {PARAGRAPH}')
+        assert window.tokens <= 600
+        assert count_prompt_tokens(window.messages()) <= 600
+
+    messages = window.messages()
+    assert summarized == list(range(len(summarized))) and summarized
+    assert messages[1]['role'] == 'system' and 'Paragraph 1: summary 1' in messages[1]['content']
+    # The latest paragraph always stays verbatim, after the command that asked for it
+    assert messages[-2:] == [{'role': 'user', 'content': '!w 1 10'}, {'role': 'assistant', 'content': f'9 {PARAGRAPH}'}]
+
+
+def test_eviction_shrinks_to_the_low_water_mark():
+    window, summarized = _window(1000)
+    evictions = 0
+    for index in range(20):
+        before = len(summarized)
+        window.add(0, index, PARAGRAPH)
+        if len(summarized) > before:
+            evictions += 1
+            assert window.tokens <= 750
+    # Several paragraphs are added between evictions, so the prompt prefix stays cacheable
+    assert 1 < evictions < len(summarized)
+
+
+def test_extractive_summary_keeps_the_first_and_last_sentence():
+    assert extractive_summary('One. Two. Three. Four.') == 'One. Four.'
+    assert extractive_summary('Only one sentence') == 'Only one sentence'
+
+
+class _PromptSizes(backends.FakeProvider):
+    sizes = []
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        if any(message['content'].startswith('!w') for message in prompt):
+            self.sizes.append(count_prompt_tokens(prompt))
+        return super().request(book, prompt, usage, max_tokens, output_format)
+
+
+def test_paragraph_prompts_stay_bounded_in_a_long_chapter():
+    backends.register('prompt-sizes', _PromptSizes)
+    sizes = {}
+    for budget in (None, 1500):
+        _PromptSizes.sizes = []
+        book = Book(topic='Mars', category='Science', chapters=1, words_per_chapter=2000, llm_backend='prompt-sizes',
+                    context_budget=budget, context_summaries='extractive')
+        book.get_title()
+        book.ensure_structure()
+        book.get_content()
+        sizes[budget] = list(_PromptSizes.sizes)
+
+    assert max(sizes[None]) > 1500
+    assert max(sizes[1500]) <= 1500
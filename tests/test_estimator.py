@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from book import Book
+from estimator import Profile, ThroughputHistory, estimate_book, format_errors, price_per_1k, usage_totals
+
+SPEC = dict(topic='Mars', category='Science', chapters=2, words_per_chapter=400, llm_backend='fake',
+            context_summaries='extractive')
+
+
+def _book(**kwargs):
+    book = Book(**{**SPEC, **kwargs})
+    book.get_title()
+    book.ensure_structure()
+    return book
+
+
+def test_estimate_needs_a_structure():
+    with pytest.raises(ValueError):
+        estimate_book(Book(**SPEC))
+
+
+def test_estimate_from_the_default_profile():
+    book = _book()
+    estimate = estimate_book(book)
+    assert estimate.paragraphs == 8
+    assert estimate.words == 800
+    assert estimate.calls == pytest.approx(8 * Profile().calls_per_paragraph)
+    assert estimate.completion_tokens == pytest.approx(800 * Profile().tokens_per_word)
+    assert estimate.cost_usd == 0.0
+    assert estimate.key == 'fake|fake|'
+    assert 'default throughput' in estimate.summary()
+
+
+def test_concurrency_follows_the_workers():
+    assert estimate_book(_book()).concurrency == 1
+    assert estimate_book(_book(max_workers=2)).concurrency == 2
+
+
+def test_history_learns_from_a_run_and_the_next_estimate_uses_it(tmp_path):
+    history = ThroughputHistory(str(tmp_path / 'throughput.json'))
+    book = _book()
+    estimate = estimate_book(book, history)
+    before = usage_totals(book.metrics)
+    book.get_content()
+    after = usage_totals(book.metrics)
+    errors = history.record(estimate, before, after)
+
+    assert set(errors) == {'calls', 'prompt_tokens', 'completion_tokens', 'wall_seconds'}
+    assert format_errors(errors).startswith('Actual vs. estimate: calls ')
+    stored = json.loads((tmp_path / 'throughput.json').read_text())
+    assert stored[estimate.key]['runs'] == 1
+
+    learned = history.profile(estimate.key)
+    calls = after['calls'] - before['calls']
+    completion = after['completion_tokens'] - before['completion_tokens']
+    assert learned.calls_per_paragraph == pytest.approx(calls / 8)
+    assert learned.tokens_per_word == pytest.approx(completion / 800)
+
+    again = estimate_book(_book(), history)
+    assert again.runs == 1
+    assert 'based on 1 earlier run(s)' in again.summary()
+    # The same book on the same backend is now predicted from what the first run measured
+    assert again.calls == pytest.approx(calls)
+    assert again.completion_tokens == pytest.approx(completion)
+
+
+def test_later_runs_are_smoothed(tmp_path):
+    history = ThroughputHistory(str(tmp_path / 'throughput.json'))
+    estimate = estimate_book(_book(), history)
+    before = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'call_seconds': 0,
+              'generation_seconds': 0, 'time': 0}
+    history.record(estimate, before, {**before, 'calls': 8, 'completion_tokens': 800, 'time': 1})
+    history.record(estimate, before, {**before, 'calls': 16, 'completion_tokens': 800, 'time': 1})
+    profile = history.profile(estimate.key)
+    assert profile.runs == 2
+    assert profile.calls_per_paragraph == pytest.approx(0.7 * 1 + 0.3 * 2)
+
+
+def test_runs_served_from_the_cache_are_not_learned(tmp_path):
+    history = ThroughputHistory(str(tmp_path / 'throughput.json'))
+    estimate = estimate_book(_book(), history)
+    totals = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'call_seconds': 0,
+              'generation_seconds': 0, 'time': 0}
+    assert history.record(estimate, totals, totals)['calls'] == -1.0
+    assert history.profile(estimate.key).runs == 0
+    assert not (tmp_path / 'throughput.json').exists()
+
+
+def test_from_env_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv('BOOKGPT_THROUGHPUT', 'off')
+    assert ThroughputHistory.from_env() is None
+
+
+def test_prices_match_dated_snapshots_and_overrides(monkeypatch):
+    assert price_per_1k('gpt-4o-2024-05-13') == price_per_1k('gpt-4o')
+    assert price_per_1k('gpt-4o-mini') != price_per_1k('gpt-4o')
+    assert price_per_1k('unknown') is None
+    monkeypatch.setenv('BOOKGPT_PRICES', '{"local": [0.001, 0.002]}')
+    assert price_per_1k('local') == (0.001, 0.002)
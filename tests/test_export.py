@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+from export import ChunkCache, Exporter, speech_text, split_chunks, tts_language
+
+BOOK = '# Title\n\nFirst paragraph.\n\nSecond paragraph.\n\n## Chapter 2\n\n**Third** paragraph.'
+
+
+class FakeTTS:
+    """Records what would be read out, and returns it as the 'audio'."""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+        self._lock = threading.Lock()
+
+    def __call__(self, text, language):
+        if self.fail_on and self.fail_on in text:
+            raise RuntimeError('engine failed')
+        with self._lock:
+            self.calls.append((text, language))
+        return f'[{language}:{text}]'.encode('utf-8')
+
+
+def test_split_chunks_starts_a_chunk_at_each_heading():
+    assert split_chunks(BOOK) == [
+        '# Title\n\nFirst paragraph.\n\nSecond paragraph.',
+        '## Chapter 2\n\n**Third** paragraph.',
+    ]
+
+
+def test_split_chunks_respects_max_chars_without_splitting_paragraphs():
+    assert split_chunks('a' * 10 + '\n\n' + 'b' * 10 + '\n\n' + 'c' * 30, max_chars=25) == ['a' * 10 + '\n\n' + 'b' * 10, 'c' * 30]
+
+
+def test_speech_text_and_language():
+    assert speech_text('## Chapter 2\n> **Third** _para_ `code`') == 'Chapter 2\nThird para code'
+    assert tts_language(' English ') == 'en'
+    assert tts_language('pt-BR') == 'pt-BR'
+
+
+def test_chunk_cache_round_trip(tmp_path):
+    cache = ChunkCache(str(tmp_path))
+    key = ChunkCache.make_key('html', 'text')
+    assert key != ChunkCache.make_key('mp3', 'text')
+    assert ChunkCache.make_key('html', 'a', 'b') != ChunkCache.make_key('html', 'ab')
+    assert cache.get(key) is None
+    cache.put(key, b'data')
+    assert cache.get(key) == b'data'
+
+
+def test_export_mp3_uses_the_injected_engine_and_caches_chunks(tmp_path):
+    engine = FakeTTS()
+    exporter = Exporter(max_workers=2, cache=ChunkCache(str(tmp_path / 'cache')), tts=engine, tts_name='fake')
+    path = str(tmp_path / 'out' / 'book.mp3')
+
+    result = exporter.export_mp3(BOOK, path, language='German')
+    assert (result.path, result.chunks, result.cached) == (path, 2, 0)
+    with open(path, 'rb') as file:
+        assert file.read() == b'[de:Title\n\nFirst paragraph.\n\nSecond paragraph.][de:Chapter 2\n\nThird paragraph.]'
+
+    # Only the edited chunk is synthesized again
+    engine.calls.clear()
+    result = exporter.export_mp3(BOOK.replace('Third', 'Last'), path, language='German')
+    assert (result.chunks, result.cached) == (2, 1)
+    assert engine.calls == [('Chapter 2\n\nLast paragraph.', 'de')]
+
+
+def test_audio_from_another_engine_is_not_reused(tmp_path):
+    cache = ChunkCache(str(tmp_path / 'cache'))
+    Exporter(cache=cache, tts=FakeTTS(), tts_name='one').export_mp3(BOOK, str(tmp_path / 'a.mp3'))
+    result = Exporter(cache=cache, tts=FakeTTS(), tts_name='two').export_mp3(BOOK, str(tmp_path / 'b.mp3'))
+    assert result.cached == 0
+
+
+def test_export_html_keeps_chunk_order(tmp_path):
+    path = str(tmp_path / 'book.html')
+    result = Exporter(max_workers=1).export_html(BOOK, path)
+    assert result.chunks == 2
+    with open(path, encoding='utf-8') as file:
+        html = file.read()
+    assert html.index('<h1>Title</h1>') < html.index('<h2>Chapter 2</h2>')
+
+
+def test_failed_export_leaves_no_file_but_keeps_finished_chunks(tmp_path):
+    cache = ChunkCache(str(tmp_path / 'cache'))
+    path = tmp_path / 'book.mp3'
+    with pytest.raises(RuntimeError):
+        Exporter(max_workers=1, cache=cache, tts=FakeTTS(fail_on='Chapter 2'), tts_name='fake').export_mp3(BOOK, str(path))
+    assert not path.exists()
+    assert not (tmp_path / 'book.mp3.part').exists()
+
+    result = Exporter(cache=cache, tts=FakeTTS(), tts_name='fake').export_mp3(BOOK, str(path))
+    assert result.cached == 1
@@ -0,0 +1,10 @@
+import os
+import subprocess
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'import_budget.py')
+
+
+def test_cli_startup_stays_within_the_import_budget():
+    result = subprocess.run([sys.executable, SCRIPT], capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from book import Book
+from jobs import JobManager
+from journal import GenerationJournal
+
+SPEC = {'topic': 'Mars', 'category': 'Science', 'language': 'English', 'chapters': 1, 'words_per_chapter': 200,
+        'context_summaries': 'extractive'}
+
+
+def _wait(job, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not job.done and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.done
+
+
+@pytest.mark.parametrize('backend, status', [('fake', 'done'), ('missing', 'failed')])
+def test_jobs_close_their_journal(tmp_path, backend, status):
+    # Regression: a job, in particular a failed one, kept its journal open in the long-lived server process
+    manager = JobManager(max_jobs=1)
+    journal = GenerationJournal(str(tmp_path / 'book.journal.jsonl'))
+    job = manager.submit({**SPEC, 'llm_backend': backend, 'journal': journal})
+    _wait(job)
+    manager.shutdown()
+
+    assert job.status == status
+    assert journal._file.closed
+
+
+def test_ensure_structure_keeps_a_resumed_outline(tmp_path):
+    # Regression: the job manager asked for a new outline although the journal already held one
+    path = str(tmp_path / 'book.journal.jsonl')
+    book = Book(**SPEC, llm_backend='fake', journal=GenerationJournal(path))
+    book.get_title()
+    structure = book.ensure_structure()
+    book.close()
+
+    resumed = Book.resume(path)
+    resumed.get_structure = lambda fresh=False: pytest.fail('the outline was requested again')
+    assert resumed.ensure_structure() == structure
+    resumed.close()
+
+
+def test_ensure_structure_lets_the_caller_choose_and_ask_again():
+    book = Book(**SPEC, llm_backend='fake', outline_format='text')
+    book.get_title()
+    rounds = []
+
+    def choose(outlines):
+        rounds.append(len(outlines))
+        return outlines[-1] if len(rounds) == 2 else None
+
+    assert book.ensure_structure(candidates=2, choose=choose).startswith('Chapter 1')
+    assert rounds == [2, 2]
+
+
+def test_ensure_structure_gives_up_after_unreadable_replies():
+    book = Book(**SPEC, llm_backend='fake')
+    book.get_title()
+    book.get_response = lambda *args, **kwargs: 'no outline here'
+    with pytest.raises(RuntimeError):
+        book.ensure_structure(attempts=2)
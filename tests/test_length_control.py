@@ -0,0 +1,112 @@
+import re
+
+import backends
+from book import Book
+from length_control import LengthController, RepetitionFilter, StreamCutoff, count_words
+
+PROSE = ' '.join(f'word{index}' for index in range(40))
+
+
+def test_words_per_token_is_learned_per_model():
+    controller = LengthController(smoothing=0.5)
+    assert controller.words_per_token('a') == 0.75
+    controller.observe('a', PROSE, 40)
+    assert controller.words_per_token('a') == 1.0
+    controller.observe('a', PROSE, 80)
+    assert controller.words_per_token('a') == 0.75
+    assert controller.words_per_token('b') == 0.75
+
+
+def test_observe_ignores_short_replies_and_clamps_odd_ones():
+    controller = LengthController()
+    controller.observe('a', 'too short', 2)
+    controller.observe('a', PROSE, None)
+    assert controller.words_per_token('a') == 0.75
+    controller.observe('a', PROSE, 1)
+    assert controller.words_per_token('a') == 1.5
+
+
+def test_max_tokens_adds_headroom_and_has_a_floor():
+    controller = LengthController(headroom=1.25, min_tokens=32)
+    assert controller.max_tokens('a', 300) == 500
+    assert controller.max_tokens('a', 5) == 32
+
+
+def test_is_underrun():
+    assert LengthController.is_underrun('one two three', 10, 0.5)
+    assert not LengthController.is_underrun('one two three four five', 10, 0.5)
+    assert count_words('  one\ttwo\nthree ') == 3
+
+
+def test_cutoff_waits_for_the_sentence_end():
+    cutoff = StreamCutoff(words=3, overshoot=2.0)
+    assert not any(cutoff.feed(token) for token in ['One', ' two', ' thr', 'ee'])
+    assert cutoff.written == 3
+    assert not cutoff.feed(' four')
+    assert cutoff.feed('.')
+
+
+def test_cutoff_stops_at_the_overshoot_without_punctuation():
+    cutoff = StreamCutoff(words=4, overshoot=1.5)
+    stops = [cutoff.feed(token) for token in ['a ', 'b ', 'c ', 'd ', 'e ', 'f ']]
+    assert stops == [False, False, False, False, False, True]
+    assert not cutoff.feed('')
+
+
+def test_repetition_filter_drops_repeats_across_continuations():
+    repeats = RepetitionFilter(n=4)
+    first = 'The rover landed near the crater rim at dawn.'
+    assert repeats.add(first) == (first, 9)
+    text, novel = repeats.add(' Near the crater rim, at dawn! Then it drove north.')
+    assert text == ' Then it drove north.'
+    assert novel == 4
+    assert repeats.repeated_words == 6
+
+
+def test_repetition_filter_catches_repeats_within_one_reply():
+    repeats = RepetitionFilter(n=3)
+    text, novel = repeats.add('one two three four one two three five')
+    assert text == 'one two three four five'
+    assert novel == 5
+
+
+def test_repetition_filter_disabled():
+    repeats = RepetitionFilter(n=0)
+    assert repeats.add('a b a b') == ('a b a b', 4)
+    assert repeats.add('a b a b') == ('a b a b', 4)
+
+
+class _VerboseProvider(backends.FakeProvider):
+    """Writes three times the requested words, in ten-word sentences, unless max_tokens cuts it short."""
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        target = re.search(r'\((\d+) (?:more )?words\)', prompt[-1]['content'])
+        if target is None:
+            return super().request(book, prompt, usage, max_tokens, output_format)
+        words = [f'w{index}.' if index % 10 == 9 else f'w{index}' for index in range(3 * int(target.group(1)))]
+        reply = ' '.join(words[:max_tokens])
+        usage.update({'completion_tokens': len(reply.split())})
+        return reply
+
+
+def _verbose_book(**kwargs):
+    backends.register('verbose', _VerboseProvider)
+    book = Book(topic='Mars', category='Science', chapters=1, words_per_chapter=400, llm_backend='verbose',
+                context_summaries='extractive', **kwargs)
+    book.get_title()
+    book.ensure_structure()
+    return book
+
+
+def test_paragraphs_get_a_token_limit_from_their_target():
+    book = _verbose_book(length_controller=LengthController())
+    for paragraph, target in zip(book.get_content()[0], book.paragraph_words[0]):
+        assert target <= count_words(paragraph) <= book.length_controller.max_tokens('fake', target)
+    assert book.metrics.progress()['calls_per_paragraph'] == 1.0
+
+
+def test_streamed_paragraphs_stop_at_the_first_sentence_end_after_the_target():
+    book = _verbose_book(length_controller=LengthController(), on_token=lambda step, token: None)
+    for paragraph, target in zip(book.get_content()[0], book.paragraph_words[0]):
+        assert target <= count_words(paragraph) < target + 10
+        assert paragraph.rstrip().endswith('.')
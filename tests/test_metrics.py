@@ -0,0 +1,29 @@
+from metrics import Metrics
+
+
+def test_prometheus_label_values_are_escaped():
+    # Regression: quotes, backslashes and line feeds in label values broke the exposition format
+    metrics = Metrics()
+    metrics.inc('llm_retries_total', error='Bad "reply"\nC:\\path')
+    line = [line for line in metrics.prometheus_text().splitlines() if not line.startswith('#')][0]
+    assert line == 'bookgpt_llm_retries_total{error="Bad \\"reply\\"\\nC:\\\\path"} 1'
+
+
+def test_prometheus_series_types():
+    metrics = Metrics()
+    metrics.inc('llm_calls_total', 2, backend='fake')
+    metrics.observe('llm_call_seconds', 0.5, backend='fake')
+    metrics.observe('llm_call_seconds', 1.5, backend='fake')
+    metrics.set_gauge('llm_queue_depth', 3, key='fake')
+    text = metrics.prometheus_text()
+    assert '# TYPE bookgpt_llm_calls_total counter\nbookgpt_llm_calls_total{backend="fake"} 2\n' in text
+    assert 'bookgpt_llm_call_seconds_count{backend="fake"} 2\nbookgpt_llm_call_seconds_sum{backend="fake"} 2.0\n' in text
+    assert 'bookgpt_llm_queue_depth{key="fake"} 3\n' in text
+
+
+def test_totals_match_label_subsets():
+    metrics = Metrics()
+    metrics.inc('llm_calls_total', kind='paragraph', backend='fake')
+    metrics.inc('llm_calls_total', kind='summary', backend='fake')
+    assert metrics.total('llm_calls_total') == 2
+    assert metrics.total('llm_calls_total', kind='summary') == 1
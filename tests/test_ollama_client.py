@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import ollama_client
+from book import Book
+from mock_server import MockConfig, MockServer
+
+
+def _health_threads():
+    return [thread for thread in threading.enumerate() if thread.name == 'ollama-health' and thread.is_alive()]
+
+
+@pytest.fixture
+def routed_hosts(monkeypatch):
+    monkeypatch.setenv('OLLAMA_BASE_URL', 'http://gpu1:11434,http://gpu2:11434')
+    monkeypatch.setenv('OLLAMA_HEALTH_INTERVAL', '3600')
+    ollama_client.close_default_client()
+    yield
+    ollama_client.close_default_client()
+
+
+class _CountingServer(MockServer):
+    """Mock server that counts the TCP connections its clients open."""
+
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+@pytest.fixture
+def server():
+    server = _CountingServer(MockConfig(latency=0.02, paragraph_words=30)).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+MESSAGES = [{'role': 'system', 'content': 'You are a writer.'}, {'role': 'user', 'content': '!w 1 1'}]
+
+
+def test_sync_client_reuses_its_pooled_connection(server):
+    with ollama_client.OllamaClient(server.base_url, 'mock-model') as client:
+        assert client.check_connection()
+        usage = {}
+        replies = [client.chat(MESSAGES, usage=usage) for _ in range(5)]
+        streamed = ''.join(client.chat_stream(MESSAGES))
+
+    assert all(replies) and streamed
+    assert usage['completion_tokens'] > 0
+    assert server.requests == 6
+    assert server.connections == 1
+
+
+def test_async_client_keeps_connections_within_the_pool(server):
+    client = ollama_client.AsyncOllamaClient(server.base_url, 'mock-model', pool_size=2)
+
+    async def run():
+        try:
+            return await asyncio.gather(*(client.chat(MESSAGES) for _ in range(6)))
+        finally:
+            await client.close()
+
+    replies = asyncio.run(run())
+    assert len(replies) == 6 and all(replies)
+    assert server.connections == 2
+
+
+def test_books_share_one_router(routed_hosts):
+    # Regression: every Book built its own router, leaking a health thread and balancing only its own requests
+    before = len(_health_threads())
+    books = [Book(llm_backend='ollama') for _ in range(3)]
+    clients = {id(book.ollama_client) for book in books}
+    assert len(clients) == 1
+    assert len(_health_threads()) == before + 1
+
+
+def test_close_default_client_stops_health_checks(routed_hosts):
+    router = Book(llm_backend='ollama').ollama_client
+    ollama_client.close_default_client()
+    router._health_thread.join(1)
+    assert not router._health_thread.is_alive()
+    assert ollama_client.get_default_client() is not router
+
+
+def test_injected_client_is_kept(routed_hosts):
+    client = ollama_client.OllamaClient('http://localhost:1', 'model')
+    assert Book(llm_backend='ollama', ollama_client=client).ollama_client is client
+    client.close()
+
+
+
+def test_concurrent_first_calls_build_one_async_client(monkeypatch):
+    # Regression: the async client was created without the client lock, so racing callers each built one
+    created = []
+
+    class SlowAsyncClient:
+        def __init__(self, *args, **kwargs):
+            time.sleep(0.05)
+            created.append(self)
+
+    monkeypatch.setattr(ollama_client, 'AsyncOllamaClient', SlowAsyncClient)
+    client = ollama_client.OllamaClient('http://localhost:1', 'model')
+    book = Book(llm_backend='ollama', ollama_client=client)
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(book.async_ollama_client)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(item is created[0] for item in clients)
+    client.close()
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from outline import Outline, OutlineError, parse_outline, parse_outline_json, parse_outline_text
+
+OUTLINE = {
+    'chapters': [
+        {'title': 'Arrival', 'paragraphs': [{'title': 'The bus', 'words': 300}, {'title': 'The flat', 'words': 300}]},
+        {'title': 'Neighbours', 'paragraphs': [{'title': 'A knock', 'words': 600}]},
+    ],
+}
+
+
+def test_json_in_code_fences():
+    outline = parse_outline_json('```json\n' + json.dumps(OUTLINE) + '\n```')
+    assert outline.to_dict() == OUTLINE
+
+
+def test_json_followed_by_remarks_with_braces():
+    # Regression: the object ran to the last closing brace, so trailing remarks broke the parse
+    outline = parse_outline_json('Sure! ' + json.dumps(OUTLINE) + ' Note: {ok}')
+    assert outline.to_dict() == OUTLINE
+
+
+def test_json_after_brackets_in_the_preamble():
+    outline = parse_outline_json('Here is the outline [draft]: ' + json.dumps(OUTLINE))
+    assert [chapter.title for chapter in outline.chapters] == ['Arrival', 'Neighbours']
+
+
+def test_json_key_variations():
+    outline = Outline.from_dict({'outline': [
+        {'name': 'One', 'sections': [{'summary': 'Start', 'word_count': '1,200 words'}]},
+    ]})
+    assert outline.to_dict() == {'chapters': [{'title': 'One', 'paragraphs': [{'title': 'Start', 'words': 1200}]}]}
+
+
+def test_invalid_json_is_an_outline_error():
+    with pytest.raises(OutlineError):
+        parse_outline_json('{"chapters": [')
+    with pytest.raises(OutlineError):
+        parse_outline_json('no json here')
+
+
+def test_text_outline():
+    text = (
+        '## Chapter 1 (2 paragraphs): Arrival\n'
+        '\tParagraph 1 (300 words): The bus\n'
+        '\tParagraph 2 (300 words): The flat\n'
+        '**Chapter II: Neighbours**\n'
+        '- A knock (600 words)\n'
+    )
+    assert parse_outline_text(text).to_dict() == OUTLINE
+
+
+def test_numbered_prose_under_a_chapter_is_ignored():
+    outline = parse_outline_text('Chapter 1: Arrival\n1. He arrives late.\nScene 1 (300 words): The bus\n')
+    assert [paragraph.title for paragraph in outline.chapters[0].paragraphs] == ['The bus']
+
+
+def test_markdown_table_rows_are_not_chapters():
+    # Regression: table rows became chapters without paragraphs, which repair then filled silently
+    table = (
+        '| Chapter | Paragraph | Words |\n'
+        '|---|---|---|\n'
+        '| Chapter 1: Arrival | Paragraph 1: The bus | 300 |\n'
+        '| Chapter 2: Neighbours | Paragraph 1: A knock | 600 |\n'
+    )
+    assert parse_outline_text(table).chapters == []
+    with pytest.raises(OutlineError):
+        parse_outline(table)
+
+
+def test_single_separator_is_still_a_title():
+    outline = parse_outline_text('Chapter 1 | Arrival\nParagraph 1 (300 words): The bus\n')
+    assert outline.chapters[0].title == 'Arrival'
+
+
+def test_parse_outline_falls_back_to_text():
+    outline = parse_outline('Chapter 1: Arrival {draft}\nParagraph 1 (300 words): The bus\n')
+    assert outline.chapters[0].paragraphs[0].words == 300
+
+
+def test_repair_fills_and_rescales():
+    outline = Outline.from_dict({'chapters': [
+        {'title': 'One', 'paragraphs': [{'title': 'a', 'words': 100}, {'title': 'b', 'words': 0}]},
+        {'title': 'Two', 'paragraphs': []},
+        {'title': 'Three', 'paragraphs': [{'title': 'c', 'words': 50}]},
+    ]})
+    fixes = outline.repair(words_per_chapter=1000, chapters=2)
+    assert len(outline.chapters) == 2
+    assert [chapter.words for chapter in outline.chapters] == [1000, 1000]
+    assert all(paragraph.words >= 20 for chapter in outline.chapters for paragraph in chapter.paragraphs)
+    assert 'dropped 1 extra chapters' in fixes
+    assert 'chapter 2 had no paragraphs' in fixes
+
+
+def test_rescale_keeps_proportions():
+    outline = Outline.from_dict({'chapters': [
+        {'title': 'One', 'paragraphs': [{'title': 'a', 'words': 220}, {'title': 'b', 'words': 420}, {'title': 'c', 'words': 20}]},
+    ]})
+    outline.repair(words_per_chapter=1320)
+    words = [paragraph.words for paragraph in outline.chapters[0].paragraphs]
+    assert sum(words) == 1320
+    assert words[2] < words[0] < words[1]
+
+
+def test_repair_leaves_a_good_outline_alone():
+    outline = Outline.from_dict(OUTLINE)
+    assert outline.repair(chapters=2) == []
+    assert outline.to_dict() == OUTLINE
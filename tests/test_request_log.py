@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+import request_log
+from book import Book
+from request_log import RequestLog, message_hash
+
+PROMPT = [{'role': 'system', 'content': 'You write books.'}, {'role': 'user', 'content': '!w 1 1'}]
+
+
+def _records(path):
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def test_metadata_level_writes_one_record_per_request(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    log = RequestLog(path, level='metadata')
+    log.log(PROMPT, 'The rover.', backend='fake', step='1.1')
+    log.log(PROMPT, 'It drove on.', backend='fake', step='1.2')
+    log.close()
+
+    records = _records(path)
+    assert [record['type'] for record in records] == ['request', 'request']
+    assert records[0]['step'] == '1.1'
+    assert records[0]['prompt_messages'] == 2
+    assert records[0]['prompt_chars'] == len('You write books.') + len('!w 1 1')
+    assert records[1]['response_chars'] == len('It drove on.')
+    assert 'messages' not in records[0]
+
+
+def test_full_level_writes_each_message_once(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    log = RequestLog(path, level='full')
+    log.log(PROMPT, 'The rover.')
+    log.log(PROMPT + [{'role': 'assistant', 'content': 'The rover.'}, {'role': 'user', 'content': '!w 1 2'}], 'It drove on.')
+    log.close()
+
+    records = _records(path)
+    messages = [record for record in records if record['type'] == 'message']
+    assert len(messages) == 5
+    assert len({record['hash'] for record in messages}) == 5
+    requests = [record for record in records if record['type'] == 'request']
+    assert requests[1]['messages'][:3] == [message_hash(message) for message in PROMPT] + [requests[0]['response']]
+
+
+def test_off_level_writes_nothing(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    log = RequestLog(path, level='off')
+    log.log(PROMPT, 'The rover.')
+    log.close()
+    assert not os.path.exists(path)
+
+
+def test_unknown_level_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        RequestLog(str(tmp_path / 'log.jsonl'), level='verbose')
+
+
+def test_log_rotates_and_repeats_messages_in_the_new_file(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    log = RequestLog(path, level='full', max_bytes=200, backups=2, batch_size=1)
+    for index in range(6):
+        log.log(PROMPT, f'Reply {index}.')
+        log.close()
+
+    assert os.path.exists(f'{path}.1') and os.path.exists(f'{path}.2')
+    assert not os.path.exists(f'{path}.3')
+    # Every file can be read on its own
+    for name in (path, f'{path}.1', f'{path}.2'):
+        records = _records(name)
+        known = {record['hash'] for record in records if record['type'] == 'message'}
+        for record in records:
+            if record['type'] == 'request':
+                assert set(record['messages']) <= known
+
+
+def test_books_log_to_the_configured_path(tmp_path, monkeypatch):
+    path = tmp_path / 'requests.jsonl'
+    monkeypatch.setenv('BOOKGPT_LOG_PATH', str(path))
+    monkeypatch.setattr(request_log, '_default_log', None)
+    book = Book(topic='Mars', llm_backend='fake')
+    book.get_title()
+    book.request_log.close()
+
+    records = _records(path)
+    assert [record['step'] for record in records] == ['title']
+    assert records[0]['backend'] == 'fake'
@@ -0,0 +1,71 @@
+import time
+
+import backends
+from book import Book
+from response_cache import ResponseCache
+
+
+class _CountingProvider(backends.FakeProvider):
+    calls = 0
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        type(self).calls += 1
+        return super().request(book, prompt, usage, max_tokens, output_format)
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'))
+    key = ResponseCache.make_key('fake', 'model', None, [{'role': 'user', 'content': 'hi'}])
+    assert cache.get(key) is None
+    cache.put(key, 'hello')
+    assert cache.get(key) == 'hello'
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+
+def test_key_covers_backend_model_options_and_messages():
+    messages = [{'role': 'user', 'content': 'hi'}]
+    key = ResponseCache.make_key('ollama', 'llama', {'temperature': 0.5}, messages)
+    assert key == ResponseCache.make_key('ollama', 'llama', {'temperature': 0.5}, list(messages))
+    assert key != ResponseCache.make_key('openai', 'llama', {'temperature': 0.5}, messages)
+    assert key != ResponseCache.make_key('ollama', 'mistral', {'temperature': 0.5}, messages)
+    assert key != ResponseCache.make_key('ollama', 'llama', {'temperature': 0.7}, messages)
+    assert key != ResponseCache.make_key('ollama', 'llama', {'temperature': 0.5}, [{'role': 'user', 'content': 'Hi'}])
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), max_bytes=20)
+    cache.put('a', 'x' * 8)
+    time.sleep(0.01)
+    cache.put('b', 'y' * 8)
+    time.sleep(0.01)
+    cache.get('a')
+    cache.put('c', 'z' * 8)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'x' * 8
+    assert cache.get('c') == 'z' * 8
+
+
+def test_a_repeated_book_is_served_from_the_cache(tmp_path):
+    backends.register('counting', _CountingProvider)
+    _CountingProvider.calls = 0
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'))
+    spec = {'topic': 'Mars', 'category': 'Science', 'chapters': 1, 'words_per_chapter': 100,
+            'context_summaries': 'extractive', 'llm_backend': 'counting', 'cache': cache}
+
+    first = Book(**spec)
+    first.get_title()
+    first.ensure_structure()
+    content = first.get_content()
+    calls = _CountingProvider.calls
+    assert calls > 0
+
+    second = Book(**spec)
+    assert second.get_title() == first.title
+    second.ensure_structure()
+    assert second.get_content() == content
+    assert _CountingProvider.calls == calls
+
+    second.get_title(fresh=True)
+    assert _CountingProvider.calls == calls + 1
@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+import backends
+from book import Book
+from retry import CircuitBreaker, CircuitOpenError, PermanentError, RetryPolicy
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+        self.headers = headers
+
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError) as info:
+        breaker.before_call()
+    assert 59 < info.value.retry_after <= 60
+
+
+def test_half_open_trial_success_closes_and_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == 'half-open'
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+
+
+def test_half_open_callers_wait_for_the_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()  # this caller runs the trial
+
+    passed = []
+    waiters = [threading.Thread(target=lambda: (breaker.before_call(), passed.append(True))) for _ in range(2)]
+    for waiter in waiters:
+        waiter.start()
+    time.sleep(0.03)
+    assert passed == []  # blocked, not failing fast
+    breaker.record_success()
+    for waiter in waiters:
+        waiter.join(1)
+    assert passed == [True, True]
+
+
+def test_waiters_fail_fast_with_the_real_timeout_when_the_trial_fails():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+
+    errors = []
+
+    def wait():
+        try:
+            breaker.before_call()
+        except CircuitOpenError as exc:
+            errors.append(exc)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.01)
+    breaker.record_failure()
+    waiter.join(1)
+    assert len(errors) == 1 and errors[0].retry_after > 0.03
+
+
+def test_stuck_trial_is_replaced_after_the_reset_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()  # never reports back
+    started = time.monotonic()
+    breaker.before_call()
+    assert time.monotonic() - started < 1
+
+
+def test_retry_policy_classifies_errors():
+    assert RetryPolicy.is_retryable(HTTPError(503))
+    assert RetryPolicy.is_retryable(HTTPError(429))
+    assert not RetryPolicy.is_retryable(HTTPError(400))
+    assert not RetryPolicy.is_retryable(PermanentError('misconfigured'))
+    assert RetryPolicy.is_retryable(ConnectionError())
+    assert RetryPolicy.is_retryable(CircuitOpenError('open', 1.0))
+
+
+def test_retry_policy_delays():
+    policy = RetryPolicy(base_delay=1, max_delay=10, jitter=False)
+    assert [policy.delay(attempt, ConnectionError()) for attempt in range(5)] == [1, 2, 4, 8, 10]
+    assert policy.delay(0, HTTPError(429, {'Retry-After': '3'})) == 3
+    assert policy.delay(0, HTTPError(429, {'Retry-After': '600'})) == 10
+    assert policy.delay(0, CircuitOpenError('open', 2.5)) == 2.5
+
+
+class _RecoveringProvider(backends.FakeProvider):
+    """Fails until the backend 'recovers', then answers slowly, like a model being reloaded."""
+
+    name = 'recovering'
+
+    def __init__(self):
+        self.failures_left = 1
+
+    def backend_key(self, book):
+        return 'recovering'
+
+    def request(self, book, prompt, usage, max_tokens=None, output_format=None):
+        if self.failures_left:
+            self.failures_left -= 1
+            raise HTTPError(503)
+        time.sleep(0.8)
+        return 'ok'
+
+
+def test_concurrent_calls_survive_a_slow_trial(capsys):
+    # Regression: callers arriving while the trial ran spun through their retries and gave up
+    backends.register('recovering', _RecoveringProvider)
+    policy = RetryPolicy(max_retries=5, base_delay=0.01, jitter=False, failure_threshold=1, reset_timeout=0.05)
+    book = Book(llm_backend='recovering', retry_policy=policy, context_summaries='extractive')
+    prompt = [book.get_message('user', 'hello')]
+
+    with pytest.raises(RuntimeError):
+        book.get_response(prompt, use_cache=False, stream=False, max_retries=1)
+    assert policy.breaker('recovering').state == 'open'
+    time.sleep(0.06)
+
+    replies, errors = [], []
+
+    def call():
+        try:
+            replies.append(book.get_response(prompt, use_cache=False, stream=False))
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert errors == []
+    assert replies == ['ok', 'ok', 'ok']
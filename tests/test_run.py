@@ -0,0 +1,63 @@
+import builtins
+import sys
+
+import pytest
+
+import run
+from book import Book
+from run import collect_book_preferences, get_default_book_kwargs
+
+
+def test_preferences_keep_every_default_setting(monkeypatch):
+    # Regression: settings read from the environment were lost when the interactive prompts ran
+    monkeypatch.setattr(builtins, 'input', lambda prompt: '')
+    for backend in ('ollama', 'openai'):
+        defaults = get_default_book_kwargs(backend)
+        assert collect_book_preferences(defaults) == defaults
+
+
+def test_dropped_settings_from_old_journals_stay_out_of_the_prompt():
+    book = Book(llm_backend='fake', topic='Mars', ollama_context=True)
+    assert book.arguments == 'topic: Mars'
+
+
+class _Journal(run.GenerationJournal):
+    opened = []
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.opened.append(self)
+
+
+@pytest.mark.parametrize('estimate_choice', ['2', '1'])
+def test_cli_closes_the_book_journal(tmp_path, monkeypatch, estimate_choice):
+    # Regression: the CLI left the journal (and an unfinished .part file) to interpreter teardown
+    answers = iter(['1', '', '', '', '', '', '', '', '', '', '', '1', '1', estimate_choice])
+    monkeypatch.setattr(builtins, 'input', lambda prompt='': next(answers))
+    monkeypatch.setattr(run, 'GenerationJournal', _Journal)
+    monkeypatch.setattr(sys, 'argv', ['run.py'])
+    for name, value in {'BOOKGPT_BACKEND': 'fake', 'BOOKGPT_CHAPTERS': '1', 'BOOKGPT_WORDS_PER_CHAPTER': '100',
+                        'BOOKGPT_SUMMARIES': 'extractive', 'BOOKGPT_STREAM': '0',
+                        'BOOKGPT_OUTPUT_DIR': str(tmp_path), 'BOOKGPT_STORE': 'off', 'BOOKGPT_CACHE': 'off',
+                        'BOOKGPT_JOURNAL': str(tmp_path / 'book.journal.jsonl')}.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.chdir(tmp_path)
+    _Journal.opened.clear()
+
+    run.main()
+
+    assert len(_Journal.opened) == 1
+    assert _Journal.opened[0]._file.closed
+
+
+def test_stream_printer_mirrors_tokens_under_step_headings(tmp_path, capsys):
+    path = tmp_path / 'stream.txt'
+    printer = run.StreamPrinter(str(path))
+    for step, token in [('title', 'Red'), ('title', ' Dust'), ('1.1', 'The'), ('1.1', ' rover.')]:
+        printer(step, token)
+    printer.finish()
+    printer.close()
+
+    expected = '\nTitle: Red Dust\n\n[Chapter 1, paragraph 1]\nThe rover.\n'
+    assert capsys.readouterr().out == expected
+    assert path.read_text(encoding='utf-8') == expected